@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from accounting.models import Accounting_Account
+
+# role -> Accounting_Account, filled on first use and kept for the life of the process
+_accounts = {}
+
+
+def get_ledger_account(role):
+    """
+    Counter account configured for a role in settings.LEDGER_ACCOUNTS
+    All roles are loaded with one query the first time any of them is needed.
+    :param role: e.g. 'revenue', 'purchase' or 'payable'
+    """
+    if role not in _accounts:
+        configured = settings.LEDGER_ACCOUNTS
+        if role not in configured:
+            raise ImproperlyConfigured(f"LEDGER_ACCOUNTS has no account for {role!r}")
+
+        accounts = Accounting_Account.objects.select_related('category').in_bulk(configured.values())
+        for name, pk in configured.items():
+            if pk not in accounts:
+                raise ImproperlyConfigured(f"LEDGER_ACCOUNTS[{name!r}] points to missing account {pk}")
+            _accounts[name] = accounts[pk]
+    return _accounts[role]
+
+
+def clear_ledger_accounts():
+    """Forget the loaded accounts, e.g. after the account map changed"""
+    _accounts.clear()
+
+
+@receiver(setting_changed)
+def reload_ledger_accounts(setting, **kwargs):
+    if setting == 'LEDGER_ACCOUNTS':
+        clear_ledger_accounts()
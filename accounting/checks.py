@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_report_cache(app_configs, **kwargs):
+    """The ledger version counters only invalidate cached reports in every worker when the cache is shared"""
+    if settings.CACHES['default']['BACKEND'] == 'django.core.cache.backends.locmem.LocMemCache':
+        return [Warning(
+            'The default cache is a per-process LocMemCache, so a worker serves cached reports that '
+            'postings handled by other workers have made stale.',
+            hint='Set CACHE_BACKEND to redis, memcached or database when running more than one worker.',
+            id='accounting.W001',
+        )]
+    return []
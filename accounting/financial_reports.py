@@ -1,8 +1,76 @@
-from accounting.models import Accounting_Account
+import logging
+
+from accounting.models import Accounting_Account, Journal, local_day, start_of_day
+from accounting.balances import get_account_balances
+from dataclasses import dataclass
 from decimal import Decimal
-from datetime import datetime
-import calendar
+from datetime import date, datetime, timedelta
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth, TruncQuarter, TruncYear
+from normerp.metrics import report_timer
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class TrialBalanceRow:
+    """One fully computed trial balance line, safe to render without touching the database"""
+    code: str
+    name: str
+    side: str  # normal balance side of the account, 'debit' or 'credit'
+    debit: Decimal
+    credit: Decimal
+
+    @classmethod
+    def from_balance(cls, row, debit, credit):
+        account = row['account']
+        return cls(
+            code=account.code,
+            name=account.name,
+            side='debit' if row['is_debit_side'] else 'credit',
+            debit=debit,
+            credit=credit,
+        )
+
+
+def _split_by_category(balances):
+    """Group bulk balance rows by category type"""
+    grouped = {'A': [], 'L': [], 'E': [], 'I': [], 'X': []}
+    for row in balances:
+        grouped.setdefault(row['category_type'], []).append(row)
+    return grouped
+
+
+def _income_statement_totals(grouped):
+    """Build the income and expense sections from grouped balance rows"""
+    income_data = []
+    total_income = Decimal('0')
+
+    for row in grouped['I']:
+        balance = row['balance']
+        if balance != 0:
+            income_data.append({
+                'account': row['account'],
+                'amount': balance
+            })
+            total_income += balance
+
+    expense_data = []
+    total_expenses = Decimal('0')
+
+    for row in grouped['X']:
+        balance = row['balance']
+        if balance != 0:
+            expense_data.append({
+                'account': row['account'],
+                'amount': balance
+            })
+            total_expenses += balance
+
+    return income_data, total_income, expense_data, total_expenses
+
 
+@report_timer
 def generate_income_statement(from_date, to_date, method='accrual'):
     """
     Generate an income statement for the given period
@@ -11,33 +79,11 @@ def generate_income_statement(from_date, to_date, method='accrual'):
     :param method: 'accrual' or 'cash' accounting method
     :return: Dictionary with income statement data
     """
-    # Filter accounts by type
-    income_accounts = Accounting_Account.objects.filter(
-        category__category_type='I',
-        is_active=True
+    # Cash and accrual currently read the same period balances
+    balances = get_account_balances(from_date=from_date, to_date=to_date, category_types=['I', 'X'])
+    income_data, total_income, expense_data, total_expenses = _income_statement_totals(
+        _split_by_category(balances)
     )
-    expense_accounts = Accounting_Account.objects.filter(
-        category__category_type='X',
-        is_active=True
-    )
-
-    # Calculate totals
-    income_data = []
-    total_income = Decimal('0')
-
-    for account in income_accounts:
-        if method == 'cash':
-            # For cash method, only consider transactions where cash was received/paid
-            balance = account.get_period_balance(from_date, to_date)['balance']
-        else:
-            balance = account.get_period_balance(from_date, to_date)['balance']
-
-        if balance != 0:
-            income_data.append({
-                'account': account,
-                'amount': balance
-            })
-            total_income += balance
 
     # if method === "cash":
     #     account = Accounting_Account.objects.filter(code="cash").first()
@@ -47,22 +93,6 @@ def generate_income_statement(from_date, to_date, method='accrual'):
     #         'account': account,
     #         'amount': account['balance']
     #     })
-    expense_data = []
-    total_expenses = Decimal('0')
-
-    for account in expense_accounts:
-        if method == 'cash':
-            # For cash method, only consider transactions where cash was received/paid
-            balance = account.get_period_balance(from_date, to_date)['balance']
-        else:  # accrual
-            balance = account.get_period_balance(from_date, to_date)['balance']
-
-        if balance != 0:
-            expense_data.append({
-                'account': account,
-                'amount': balance
-            })
-            total_expenses += balance
 
     net_income = total_income - total_expenses
 
@@ -78,37 +108,24 @@ def generate_income_statement(from_date, to_date, method='accrual'):
     }
 
 
+@report_timer
 def generate_balance_sheet(as_of_date):
     """
     Generate a balance sheet as of a specific date
     :param as_of_date: The date to generate the balance sheet for
     :return: Dictionary with balance sheet data
     """
-    # Get all active accounts grouped by category type
-    asset_accounts = Accounting_Account.objects.filter(
-        category__category_type='A',
-        is_active=True
-    ).order_by('code')
-
-    liability_accounts = Accounting_Account.objects.filter(
-        category__category_type='L',
-        is_active=True
-    ).order_by('code')
-
-    equity_accounts = Accounting_Account.objects.filter(
-        category__category_type='E',
-        is_active=True
-    ).order_by('code')
+    # One query for every active account, income and expenses included for net income
+    grouped = _split_by_category(get_account_balances(to_date=as_of_date))
 
     # Calculate totals
     assets_data = []
     total_assets = Decimal('0')
 
-    for account in asset_accounts:
-        balance = account.get_balance_as_of(as_of_date)['balance']
-        print(balance)
+    for row in grouped['A']:
+        balance = row['balance']
         assets_data.append({
-            'account': account,
+            'account': row['account'],
             'balance': balance
         })
         total_assets += balance
@@ -116,10 +133,10 @@ def generate_balance_sheet(as_of_date):
     liabilities_data = []
     total_liabilities = Decimal('0')
 
-    for account in liability_accounts:
-        balance = account.get_balance_as_of(as_of_date)['balance']
+    for row in grouped['L']:
+        balance = row['balance']
         liabilities_data.append({
-            'account': account,
+            'account': row['account'],
             'balance': balance
         })
         total_liabilities += balance
@@ -127,23 +144,26 @@ def generate_balance_sheet(as_of_date):
     equity_data = []
     total_equity = Decimal('0')
 
-    for account in equity_accounts:
-        balance = account.get_balance_as_of(as_of_date)['balance']
+    for row in grouped['E']:
+        balance = row['balance']
         equity_data.append({
-            'account': account,
+            'account': row['account'],
             'balance': balance
         })
         total_equity += balance
 
     # Also include current period net income in equity (Retained Earnings)
-    income_statement = generate_income_statement(
-        from_date=None,  # From beginning
-        to_date=as_of_date,
-        method='accrual'
-    )
-    net_income = income_statement['net_income']
+    _, total_income, _, total_expenses = _income_statement_totals(grouped)
+    net_income = total_income - total_expenses
     total_equity += net_income
 
+    fields = {'as_of_date': as_of_date, 'asset_accounts': len(assets_data), 'total_assets': total_assets,
+              'liabilities_and_equity': total_liabilities + total_equity}
+    if total_assets != total_liabilities + total_equity:
+        logger.warning("Balance sheet does not balance", extra=fields)
+    else:
+        logger.debug("Balance sheet generated", extra=fields)
+
     return {
         'as_of_date': as_of_date,
         'assets': assets_data,
@@ -157,6 +177,35 @@ def generate_balance_sheet(as_of_date):
     }
 
 
+def _closing_trial_balance(balances):
+    """Place each account's closing balance on its debit or credit column"""
+    trial_balance_data = []
+
+    total_debits = Decimal('0')
+    total_credits = Decimal('0')
+
+    for row in balances:
+        balance = row['balance']
+
+        if balance == 0:
+            continue
+
+        if row['is_debit_side']:  # Assets and Expenses
+            debits = balance if balance > 0 else Decimal('0')
+            credits = -balance if balance < 0 else Decimal('0')
+        else:  # Liabilities, Equity, and Income
+            credits = balance if balance > 0 else Decimal('0')
+            debits = -balance if balance < 0 else Decimal('0')
+
+        trial_balance_data.append(TrialBalanceRow.from_balance(row, debits, credits))
+
+        total_debits += debits
+        total_credits += credits
+
+    return trial_balance_data, total_debits, total_credits
+
+
+@report_timer
 def generate_trial_balance(as_of_date=None, from_date=None, to_date=None):
     """
     Generate a trial balance
@@ -166,34 +215,9 @@ def generate_trial_balance(as_of_date=None, from_date=None, to_date=None):
     """
     if as_of_date:
         # Get balances as of a specific date (includes opening balances)
-        accounts = Accounting_Account.objects.filter(is_active=True).order_by('code')
-        trial_balance_data = []
-
-        total_debits = Decimal('0')
-        total_credits = Decimal('0')
-
-        for account in accounts:
-            balance_info = account.get_balance_as_of(as_of_date)
-            balance = balance_info['balance']
-
-            if balance == 0:
-                continue
-
-            if account.category.category_type in ['A', 'X']:  # Assets and Expenses
-                debits = balance if balance > 0 else Decimal('0')
-                credits = -balance if balance < 0 else Decimal('0')
-            else:  # Liabilities, Equity, and Income
-                credits = balance if balance > 0 else Decimal('0')
-                debits = -balance if balance < 0 else Decimal('0')
-
-            trial_balance_data.append({
-                'account': account,
-                'debits': debits,
-                'credits': credits,
-            })
-
-            total_debits += debits
-            total_credits += credits
+        trial_balance_data, total_debits, total_credits = _closing_trial_balance(
+            get_account_balances(to_date=as_of_date)
+        )
 
         return {
             'type': 'as_of',
@@ -205,26 +229,19 @@ def generate_trial_balance(as_of_date=None, from_date=None, to_date=None):
         }
     elif from_date and to_date:
         # Get activity for a specific period (excludes opening balances)
-        accounts = Accounting_Account.objects.filter(is_active=True).order_by('code')
         trial_balance_data = []
 
         total_debits = Decimal('0')
         total_credits = Decimal('0')
 
-        for account in accounts:
-            balance_info = account.get_period_balance(from_date, to_date)
-            debits = balance_info['debit']
-            credits = balance_info['credit']
+        for row in get_account_balances(from_date=from_date, to_date=to_date):
+            debits = row['debit']
+            credits = row['credit']
 
             if debits == 0 and credits == 0:
                 continue
 
-            trial_balance_data.append({
-                'account': account,
-                'debits': debits,
-                'credits': credits,
-
-            })
+            trial_balance_data.append(TrialBalanceRow.from_balance(row, debits, credits))
 
             total_debits += debits
             total_credits += credits
@@ -240,35 +257,9 @@ def generate_trial_balance(as_of_date=None, from_date=None, to_date=None):
         }
     else:
         # Default to all-time balances
-        accounts = Accounting_Account.objects.filter(is_active=True).order_by('code')
-        trial_balance_data = []
-
-        total_debits = Decimal('0')
-        total_credits = Decimal('0')
-
-        current_balance = 0
-        for account in accounts:
-            balance_info = account.get_balance()
-            balance = balance_info['balance']
-
-            if balance == 0:
-                continue
-
-            if account.category.category_type in ['A', 'X']:  # Assets and Expenses
-                debits = balance if balance > 0 else Decimal('0')
-                credits = -balance if balance < 0 else Decimal('0')
-            else:  # Liabilities, Equity, and Income
-                credits = balance if balance > 0 else Decimal('0')
-                debits = -balance if balance < 0 else Decimal('0')
-
-            trial_balance_data.append({
-                'account': account,
-                'debits': debits,
-                'credits': credits
-            })
-
-            total_debits += debits
-            total_credits += credits
+        trial_balance_data, total_debits, total_credits = _closing_trial_balance(
+            get_account_balances()
+        )
 
         return {
             'type': 'all_time',
@@ -278,26 +269,145 @@ def generate_trial_balance(as_of_date=None, from_date=None, to_date=None):
         }
 
 
-def yearly_basis_income_statement(year):
+PERIOD_MONTHS = {'month': 1, 'quarter': 3, 'year': 12}
+PERIOD_TRUNC = {'month': TruncMonth, 'quarter': TruncQuarter, 'year': TruncYear}
+
 
-    print(f"First and last days of each month in {year}:")
-    print("-" * 50)
-    print(f"{'Month':<15}{'First Day':<15}{'Last Day':<15}")
-    print("-" * 50)
+def _period_start(day, period):
+    """First day of the month, quarter or year containing day"""
+    months = PERIOD_MONTHS[period]
+    return date(day.year, (day.month - 1) // months * months + 1, 1)
 
-    for month in range(1, 13):
-        # Get first day (always the 1st)
-        first_day = datetime(year, month, 1)
 
-        # Get last day by finding the number of days in the month
-        _, last_day_num = calendar.monthrange(year, month)
-        last_day = datetime(year, month, last_day_num)
+def _shift_period(start, period, count):
+    """Move a period start by count periods (negative moves back)"""
+    month_index = start.year * 12 + start.month - 1 + PERIOD_MONTHS[period] * count
+    return date(month_index // 12, month_index % 12 + 1, 1)
 
-        # Format the output
-        month_name = calendar.month_name[month]
-        print(f"{month_name:<15}{first_day.strftime('%Y-%m-%d'):<15}{last_day.strftime('%Y-%m-%d'):<15}")
 
-    return 0
+def _period_label(start, period):
+    if period == 'month':
+        return start.strftime('%b %Y')
+    if period == 'quarter':
+        return f"Q{(start.month - 1) // 3 + 1} {start.year}"
+    return str(start.year)
+
+
+def _change(current, base):
+    """Difference against a comparison amount, with the percentage when it is defined"""
+    return {
+        'amount': current - base,
+        'percent': round((current - base) / abs(base) * 100, 2) if base else None,
+    }
+
+
+def _comparative_line(amounts, columns, period):
+    """One cell per report column with the amount and its period-over-period and year-over-year changes"""
+    year_back = 12 // PERIOD_MONTHS[period]
+    zero = Decimal('0')
+    cells = [
+        {
+            'amount': amounts.get(start, zero),
+            'change': _change(amounts.get(start, zero), amounts.get(_shift_period(start, period, -1), zero)),
+            'yoy_change': _change(amounts.get(start, zero),
+                                  amounts.get(_shift_period(start, period, -year_back), zero)),
+        }
+        for start in columns
+    ]
+    return {
+        'cells': cells,
+        'total': sum((cell['amount'] for cell in cells), zero),
+    }
+
+
+@report_timer
+def generate_comparative_income_statement(from_date, to_date, period='month'):
+    """
+    Generate an income statement with one column per month, quarter or year
+    All amounts come from a single grouped query; the window is widened by a year so
+    the first columns also get period-over-period and year-over-year comparisons.
+    :param from_date: Start date of the report
+    :param to_date: End date of the report (inclusive)
+    :param period: 'month', 'quarter' or 'year'
+    :return: Dictionary with the columns, per-account lines and totals
+    """
+    if period not in PERIOD_MONTHS:
+        raise ValueError(f"Unknown period {period!r}, expected one of {', '.join(PERIOD_MONTHS)}")
+
+    first = _period_start(local_day(from_date), period)
+    last = _period_start(local_day(to_date), period)
+    columns = []
+    start = first
+    while start <= last:
+        columns.append(start)
+        start = _shift_period(start, period, 1)
+
+    query_start = _shift_period(first, period, -(12 // PERIOD_MONTHS[period]))
+    rows = (
+        Journal.objects
+        .filter(
+            account__is_active=True,
+            account__category__category_type__in=['I', 'X'],
+            date__gte=start_of_day(query_start),
+            date__lt=start_of_day(local_day(to_date) + timedelta(days=1)),
+        )
+        .annotate(bucket=PERIOD_TRUNC[period]('date'))
+        .values('account_id', 'account__code', 'account__name', 'account__category__category_type', 'bucket')
+        .annotate(debit=Sum('debit'), credit=Sum('credit'))
+        .order_by()
+    )
+
+    accounts = {}
+    for row in rows:
+        account = accounts.setdefault(row['account_id'], {
+            'code': row['account__code'],
+            'name': row['account__name'],
+            'category_type': row['account__category__category_type'],
+            'amounts': {},
+        })
+        if account['category_type'] == 'I':
+            amount = row['credit'] - row['debit']
+        else:
+            amount = row['debit'] - row['credit']
+        bucket = local_day(row['bucket'])
+        account['amounts'][bucket] = account['amounts'].get(bucket, Decimal('0')) + amount
+
+    income, expenses = [], []
+    income_totals, expense_totals = {}, {}
+    for account in sorted(accounts.values(), key=lambda a: a['code']):
+        section, totals = (income, income_totals) if account['category_type'] == 'I' else (expenses, expense_totals)
+        for bucket, amount in account['amounts'].items():
+            totals[bucket] = totals.get(bucket, Decimal('0')) + amount
+        line = _comparative_line(account['amounts'], columns, period)
+        if any(cell['amount'] for cell in line['cells']):
+            section.append({'code': account['code'], 'name': account['name'], **line})
+
+    net_totals = {
+        bucket: income_totals.get(bucket, Decimal('0')) - expense_totals.get(bucket, Decimal('0'))
+        for bucket in set(income_totals) | set(expense_totals)
+    }
+
+    return {
+        'from_date': from_date,
+        'to_date': to_date,
+        'period': period,
+        'columns': [{'start': start, 'label': _period_label(start, period)} for start in columns],
+        'income': income,
+        'total_income': _comparative_line(income_totals, columns, period),
+        'expenses': expenses,
+        'total_expenses': _comparative_line(expense_totals, columns, period),
+        'net_income': _comparative_line(net_totals, columns, period),
+    }
+
+
+def yearly_basis_income_statement(year, period='month'):
+    """
+    Income statement for a calendar year broken down by month (or quarter)
+    :param year: Calendar year, e.g. 2025
+    :param period: 'month' or 'quarter'
+    :return: Dictionary from generate_comparative_income_statement
+    """
+    return generate_comparative_income_statement(date(year, 1, 1), date(year, 12, 31), period=period)
 '''
 from datetime import date
 
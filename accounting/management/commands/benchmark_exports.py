@@ -0,0 +1,122 @@
+import random
+import resource
+import sys
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db.transaction import atomic
+from django.utils import timezone
+
+from accounting.models import Category, Accounting_Account, Transaction, Journal
+from api.exports import EXPORTS, WRITERS
+
+BATCH_SIZE = 5000
+
+
+class Rollback(Exception):
+    pass
+
+
+def _status_mb(field):
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+
+def reset_peak_rss():
+    """
+    Start a new peak RSS measurement and return the current RSS in MB
+    Only Linux can reset the peak; elsewhere the peak of the whole process is measured from 0.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        return 0
+    return _status_mb('VmRSS') or 0
+
+
+def peak_rss_mb():
+    """Peak RSS in MB since the last reset"""
+    peak = _status_mb('VmHWM')
+    if peak is not None:
+        return peak
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class Command(BaseCommand):
+    help = ("Export a growing journal as CSV and XLSX and report how far each export raises the peak RSS; "
+            "it should stay flat as the row count grows. Everything is written inside a transaction that "
+            "is rolled back at the end.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('sizes', nargs='*', type=int, default=[10_000, 100_000, 1_000_000],
+                            help='Journal lines to export, in increasing order')
+        parser.add_argument('--accounts', type=int, default=50, help='Accounts to spread the lines over')
+        parser.add_argument('--baseline', action='store_true',
+                            help='Finish with a buffered export of the largest size for comparison')
+
+    def handle(self, *args, **options):
+        export = EXPORTS['journals']
+        try:
+            with atomic():
+                category = Category.objects.create(name='Benchmark', category_type='A')
+                self.account_ids = [
+                    Accounting_Account.objects.create(name=f'Bench {n}', code=f'BENCH{n}', category=category).pk
+                    for n in range(options['accounts'])
+                ]
+
+                self.stdout.write(f"{'rows':>10}{'format':>8}{'seconds':>10}{'MB written':>12}{'RSS growth MB':>15}")
+                generated = 0
+                for size in sorted(options['sizes']):
+                    self.insert((size - generated) // 2)
+                    generated = size
+                    for file_format in WRITERS:
+                        self.stream(export, file_format, size)
+
+                if options['baseline']:
+                    before = reset_peak_rss()
+                    started = time.perf_counter()
+                    rows = list(export.queryset().values_list(*(field for _, field in export.columns)))
+                    written = sum(len(chunk) for chunk in WRITERS['csv'][1](export.header, rows))
+                    self.stdout.write(f"{generated:>10}{'list':>8}{time.perf_counter() - started:>10.2f}"
+                                      f"{written / 1e6:>12.1f}{peak_rss_mb() - before:>15.1f}")
+                raise Rollback
+        except Rollback:
+            pass
+
+    def insert(self, transactions):
+        now = timezone.now()
+        for offset in range(0, transactions, BATCH_SIZE):
+            batch = Transaction.objects.bulk_create(
+                [Transaction(description='Benchmark', is_approved=True)
+                 for _ in range(min(BATCH_SIZE, transactions - offset))]
+            )
+            lines = []
+            for t in batch:
+                posted = now - timedelta(days=random.randrange(365))
+                amount = Decimal(random.randrange(100, 100000)) / 100
+                debit_account, credit_account = random.sample(self.account_ids, 2)
+                lines.append(Journal(account_id=debit_account, transaction=t, debit=amount,
+                                     description=f'Sale {t.pk}', posting_date=posted.date()))
+                lines.append(Journal(account_id=credit_account, transaction=t, credit=amount,
+                                     description=f'Sale {t.pk}', posting_date=posted.date()))
+            Journal.objects.bulk_create(lines)
+
+    def stream(self, export, file_format, size):
+        _, writer = WRITERS[file_format]
+        before = reset_peak_rss()
+        started = time.perf_counter()
+        written = 0
+        for chunk in writer(export.header, export.rows()):
+            written += len(chunk)
+        self.stdout.write(f"{size:>10}{file_format:>8}{time.perf_counter() - started:>10.2f}"
+                          f"{written / 1e6:>12.1f}{peak_rss_mb() - before:>15.1f}")
@@ -0,0 +1,136 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Sum
+from django.db.transaction import atomic
+from django.utils import timezone
+
+from accounting.models import Category, Accounting_Account, Transaction, Journal
+
+BATCH_SIZE = 5000
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Time the ledger hot-path queries with and without the composite indexes on a generated "
+            "ledger. Everything is written inside a transaction that is rolled back at the end.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--journals', type=int, default=1_000_000, help='Journal lines to generate')
+        parser.add_argument('--accounts', type=int, default=200, help='Accounts to spread them over')
+        parser.add_argument('--days', type=int, default=3 * 365, help='Days of history to spread them over')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per query, the best is reported')
+
+    def handle(self, *args, **options):
+        try:
+            with atomic():
+                self.generate(options['journals'], options['accounts'], options['days'])
+                after = self.measure(options['repeat'])
+                self.use_baseline_indexes()
+                before = self.measure(options['repeat'], baseline=True)
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write(f"{'query':<32}{'before (ms)':>14}{'after (ms)':>14}")
+        for name in after:
+            self.stdout.write(f"{name:<32}{before[name]:>14.2f}{after[name]:>14.2f}")
+
+    def generate(self, journals, accounts, days):
+        started = time.perf_counter()
+        category = Category.objects.create(name='Benchmark', category_type='A')
+        self.account_ids = [
+            Accounting_Account.objects.create(name=f'Bench {n}', code=f'BENCH{n}', category=category).pk
+            for n in range(accounts)
+        ]
+
+        # Keep the spread out dates instead of stamping every line with now
+        date_field = Journal._meta.get_field('date')
+        date_field.auto_now_add = False
+        try:
+            self.insert(journals // 2, days)
+        finally:
+            date_field.auto_now_add = True
+
+        self.transaction_ids = random.sample(
+            list(Transaction.objects.filter(description='Benchmark').values_list('pk', flat=True)),
+            min(1000, journals // 2),
+        )
+        self.stdout.write(f"Generated {journals} journals in {time.perf_counter() - started:.1f}s")
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+    def insert(self, transactions, days):
+        now = timezone.now()
+        for offset in range(0, transactions, BATCH_SIZE):
+            batch = Transaction.objects.bulk_create(
+                [Transaction(description='Benchmark', is_approved=True)
+                 for _ in range(min(BATCH_SIZE, transactions - offset))]
+            )
+            lines = []
+            for t in batch:
+                posted = now - timedelta(days=random.randrange(days), seconds=random.randrange(86400))
+                amount = Decimal(random.randrange(100, 100000)) / 100
+                debit_account, credit_account = random.sample(self.account_ids, 2)
+                lines.append(Journal(account_id=debit_account, transaction=t, debit=amount,
+                                     date=posted, posting_date=posted.date()))
+                lines.append(Journal(account_id=credit_account, transaction=t, credit=amount,
+                                     date=posted, posting_date=posted.date()))
+            Journal.objects.bulk_create(lines)
+
+    def use_baseline_indexes(self):
+        """Swap the composite indexes for the single-column foreign key indexes the tables had before"""
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            for model in (Journal, Transaction):
+                for index in model._meta.indexes:
+                    cursor.execute(f"DROP INDEX {quote(index.name)}")
+            for column in ('account_id', 'transaction_id'):
+                cursor.execute(f"CREATE INDEX {quote('bench_journal_' + column)} "
+                               f"ON {quote(Journal._meta.db_table)} ({quote(column)})")
+            if connection.vendor == 'sqlite':
+                cursor.execute('ANALYZE')
+
+    def measure(self, repeat, baseline=False):
+        as_of = timezone.now() - timedelta(days=30)
+        order = ['transaction__date', 'id'] if baseline else ['posting_date', 'id']
+
+        def account_balances():
+            for pk in self.account_ids:
+                Journal.objects.filter(account_id=pk, date__lte=as_of).aggregate(Sum('debit'), Sum('credit'))
+
+        def document_lookups():
+            for pk in self.transaction_ids:
+                Journal.objects.get(transaction_id=pk, credit=0)
+                Journal.objects.get(transaction_id=pk, debit=0)
+
+        def journal_page():
+            list(Journal.objects.order_by(*order)[:100])
+
+        def transaction_page():
+            list(Transaction.objects.all()[:100])
+
+        queries = {
+            'account as-of balances': account_balances,
+            'document journal lookups': document_lookups,
+            'ordered journal page': journal_page,
+            'ordered transaction page': transaction_page,
+        }
+        results = {}
+        for name, query in queries.items():
+            best = None
+            for _ in range(repeat):
+                started = time.perf_counter()
+                query()
+                elapsed = (time.perf_counter() - started) * 1000
+                best = elapsed if best is None else min(best, elapsed)
+            results[name] = best
+        return results
@@ -0,0 +1,70 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db.transaction import atomic
+
+from accounting.models import Category, Accounting_Account, Transaction, Journal
+from accounting.posting import Entry, JournalLine, post_entries, validate_entries
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Measure posting throughput of the bulk posting service against one-by-one creates. "
+            "Everything is written inside a transaction that is rolled back at the end.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('sizes', nargs='*', type=int, default=[10_000, 100_000],
+                            help='Batch sizes (entries) to post')
+        parser.add_argument('--accounts', type=int, default=50, help='Accounts to post against')
+        parser.add_argument('--baseline', type=int, default=1_000,
+                            help='Entries to post one by one for comparison (0 to skip)')
+
+    def handle(self, *args, **options):
+        try:
+            with atomic():
+                category = Category.objects.create(name='Benchmark', category_type='A')
+                account_ids = [
+                    Accounting_Account.objects.create(name=f'Bench {n}', code=f'BENCH{n}', category=category).pk
+                    for n in range(options['accounts'])
+                ]
+
+                if options['baseline']:
+                    self.report('one by one', options['baseline'], self.post_one_by_one,
+                                self.make_entries(options['baseline'], account_ids))
+                for size in options['sizes']:
+                    entries = self.make_entries(size, account_ids)
+                    started = time.perf_counter()
+                    validate_entries(entries)
+                    self.stdout.write(f"validated {size} entries in {time.perf_counter() - started:.2f}s")
+                    self.report('post_entries', size, post_entries, entries, validate=False)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def make_entries(self, count, account_ids):
+        entries = []
+        for n in range(count):
+            amount = Decimal(random.randrange(100, 100000)) / 100
+            debit_account, credit_account = random.sample(account_ids, 2)
+            entries.append(Entry(
+                description=f'Benchmark {n}',
+                lines=[JournalLine(debit_account, debit=amount), JournalLine(credit_account, credit=amount)],
+            ))
+        return entries
+
+    def post_one_by_one(self, entries):
+        for entry in entries:
+            t = Transaction.objects.create(description=entry.description, is_approved=True)
+            for line in entry.lines:
+                Journal.objects.create(account_id=line.account_id, transaction=t, debit=line.debit, credit=line.credit)
+
+    def report(self, label, count, function, *args, **kwargs):
+        started = time.perf_counter()
+        function(*args, **kwargs)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{label}: {count} entries in {elapsed:.2f}s ({count / elapsed:,.0f} entries/s)")
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from accounting.models import AccountBalance, Accounting_Account
+
+
+class Command(BaseCommand):
+    help = "Rebuild the running account balances from the journal entries"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--account', action='append', dest='codes', metavar='CODE',
+                            help='Only rebuild the account with this code (can be repeated)')
+
+    def handle(self, *args, **options):
+        account_ids = None
+        if options['codes']:
+            account_ids = list(
+                Accounting_Account.objects.filter(code__in=options['codes']).values_list('pk', flat=True)
+            )
+
+        before = {row.pk: row.balance for row in AccountBalance.objects.all()}
+        count = AccountBalance.rebuild(account_ids=account_ids)
+
+        drifted = 0
+        for row in AccountBalance.objects.select_related('account'):
+            if row.pk in before and before[row.pk] != row.balance:
+                drifted += 1
+                self.stdout.write(f"{row.account.code}: {before[row.pk]} -> {row.balance}")
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} account balances, {drifted} corrected"))
@@ -0,0 +1,59 @@
+import calendar
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from accounting.models import AccountSnapshot, Journal
+
+
+def _month_end(day):
+    return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+
+def _snapshot_dates(first, until, period):
+    """Closing dates between first and until for a daily or monthly period"""
+    current = first if period == 'day' else _month_end(first)
+    while current <= until:
+        yield current
+        if period == 'day':
+            current += timedelta(days=1)
+        else:
+            current = _month_end(current + timedelta(days=1))
+
+
+class Command(BaseCommand):
+    help = "Take closing balance snapshots for every account since the last snapshot"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', choices=['month', 'day'], default='month',
+                            help='Close at each month end (default) or at each day')
+        parser.add_argument('--until', type=date.fromisoformat,
+                            help='Last date to close (YYYY-MM-DD), defaults to the last complete period')
+
+    def handle(self, *args, **options):
+        period = options['period']
+        today = timezone.localdate()
+        until = options['until'] or (today - timedelta(days=1) if period == 'day'
+                                     else today.replace(day=1) - timedelta(days=1))
+        if until >= today:
+            raise CommandError("Only closed days can be snapshotted")
+
+        latest = AccountSnapshot.objects.order_by('-as_of').values_list('as_of', flat=True).first()
+        if latest is not None:
+            first = latest + timedelta(days=1)
+        else:
+            first_posting = Journal.objects.aggregate(first=Min('date'))['first']
+            if first_posting is None:
+                self.stdout.write("No journal entries to snapshot")
+                return
+            first = timezone.localdate(first_posting)
+
+        taken = 0
+        for as_of in _snapshot_dates(first, until, period):
+            rows = AccountSnapshot.take(as_of)
+            taken += 1
+            self.stdout.write(f"{as_of}: {rows} accounts")
+
+        self.stdout.write(self.style.SUCCESS(f"Took {taken} snapshots"))
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:18
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Sum, DecimalField
+from django.db.models.functions import Coalesce
+
+
+def build_account_balances(apps, schema_editor):
+    Accounting_Account = apps.get_model('accounting', 'Accounting_Account')
+    AccountBalance = apps.get_model('accounting', 'AccountBalance')
+
+    accounts = Accounting_Account.objects.select_related('category').annotate(
+        total_debit=Coalesce(Sum('journal_entries__debit'), Decimal('0'), output_field=DecimalField()),
+        total_credit=Coalesce(Sum('journal_entries__credit'), Decimal('0'), output_field=DecimalField()),
+    )
+    rows = []
+    for account in accounts:
+        debit_side = account.category is not None and account.category.category_type in ['A', 'X']
+        if debit_side:
+            balance = account.opening_balance + account.total_debit - account.total_credit
+        else:
+            balance = account.opening_balance + account.total_credit - account.total_debit
+        rows.append(AccountBalance(
+            account=account,
+            debit_side=debit_side,
+            total_debit=account.total_debit,
+            total_credit=account.total_credit,
+            balance=balance,
+        ))
+    AccountBalance.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting', '0007_journal_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountBalance',
+            fields=[
+                ('account', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='running_balance', serialize=False, to='accounting.accounting_account')),
+                ('debit_side', models.BooleanField(default=True)),
+                ('total_debit', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('total_credit', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='journal',
+            name='date',
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+        migrations.RunPython(build_account_balances, migrations.RunPython.noop),
+    ]
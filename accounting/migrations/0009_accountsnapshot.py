@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting', '0008_accountbalance'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateField()),
+                ('total_debit', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('total_credit', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='accounting.accounting_account')),
+            ],
+            options={
+                'ordering': ['-as_of', 'account'],
+                'indexes': [models.Index(fields=['as_of', 'account'], name='snapshot_as_of_idx')],
+                'constraints': [models.UniqueConstraint(fields=('account', 'as_of'), name='unique_account_snapshot')],
+            },
+        ),
+    ]
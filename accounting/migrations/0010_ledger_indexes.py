@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_transaction_dates(apps, schema_editor):
+    Journal = apps.get_model('accounting', 'Journal')
+    Transaction = apps.get_model('accounting', 'Transaction')
+    Journal.objects.update(
+        posting_date=Subquery(Transaction.objects.filter(pk=OuterRef('transaction_id')).values('date')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting', '0009_accountsnapshot'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='journal',
+            options={'ordering': ['posting_date', 'id']},
+        ),
+        migrations.AddField(
+            model_name='journal',
+            name='posting_date',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.RunPython(copy_transaction_dates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='journal',
+            name='posting_date',
+            field=models.DateField(editable=False),
+        ),
+        migrations.AlterField(
+            model_name='journal',
+            name='account',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='journal_entries', to='accounting.accounting_account'),
+        ),
+        migrations.AlterField(
+            model_name='journal',
+            name='transaction',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='journal_entries', to='accounting.transaction'),
+        ),
+        migrations.AddIndex(
+            model_name='journal',
+            index=models.Index(fields=['account', 'date', 'debit', 'credit'], name='journal_account_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='journal',
+            index=models.Index(fields=['transaction', 'debit', 'credit'], name='journal_transaction_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='journal',
+            index=models.Index(fields=['posting_date', 'id'], name='journal_posting_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['-date', '-id'], name='transaction_date_idx'),
+        ),
+    ]
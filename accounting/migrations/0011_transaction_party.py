@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def link_document_parties(apps, schema_editor):
+    """Point existing document transactions at their customer or supplier"""
+    Transaction = apps.get_model('accounting', 'Transaction')
+    documents = {
+        'customer': [apps.get_model('core', 'Delivered'), apps.get_model('core', 'Payment')],
+        'supplier': [apps.get_model('core', 'Bill'), apps.get_model('core', 'SupplierPayment')],
+    }
+    for party, document_models in documents.items():
+        for model in document_models:
+            party_id = model.objects.filter(transaction=OuterRef('pk')).values(f'{party}_id')[:1]
+            Transaction.objects.filter(pk__in=model.objects.values('transaction_id')).update(
+                **{f'{party}_id': Subquery(party_id)}
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting', '0010_ledger_indexes'),
+        ('core', '0015_bill_supplierpayment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='customer',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transactions', to='core.customer'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='supplier',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transactions', to='core.supplier'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['customer', 'date', 'id'], name='transaction_customer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['supplier', 'date', 'id'], name='transaction_supplier_idx'),
+        ),
+        migrations.RunPython(link_document_parties, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,41 @@
+from django.conf import settings
 from django.db import models
-from django.db.models import Sum, F, DecimalField
+from django.db.models import Sum, F, DecimalField, Case, When, Value
 from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.db.transaction import atomic, on_commit
+from django.dispatch import receiver
+from django.utils import timezone
+from datetime import datetime, time, timedelta
 from decimal import Decimal
 
+from accounting.report_cache import bump_ledger_version
+
+DEBIT_SIDE_TYPES = ['A', 'X']  # Assets and Expenses
+
+
+def _delta_cases(deltas):
+    """Build per-account CASE expressions for the debit and credit parts of a set of deltas"""
+    amount_field = DecimalField(max_digits=15, decimal_places=2)
+    debit = Case(*[When(account_id=pk, then=Value(d)) for pk, (d, c) in deltas.items()],
+                 default=Value(Decimal('0')), output_field=amount_field)
+    credit = Case(*[When(account_id=pk, then=Value(c)) for pk, (d, c) in deltas.items()],
+                  default=Value(Decimal('0')), output_field=amount_field)
+    return debit, credit, amount_field
+
+
+def local_day(value):
+    """Calendar day of a date or datetime in the current time zone"""
+    if isinstance(value, datetime):
+        return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+    return value
+
+
+def start_of_day(day):
+    """First moment of a local calendar day, used as the boundary between snapshots"""
+    moment = datetime.combine(day, time.min)
+    return timezone.make_aware(moment) if settings.USE_TZ else moment
+
 class Category(models.Model):
     name = models.CharField(max_length=30)
     sort = models.IntegerField(default=0, null=True, blank=True)
@@ -18,6 +51,12 @@ class Category(models.Model):
     def __str__(self):
         return f"{self.name} ({self.get_category_type_display()})"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # The category type decides which side every account's balance sits on
+        for account in self.accounts.all():
+            AccountBalance.sync_account(account)
+
 
 class Accounting_Account(models.Model):
     name = models.CharField(max_length=30)
@@ -33,9 +72,13 @@ class Accounting_Account(models.Model):
     def __str__(self):
         return f"{self.code} - {self.name} - {self.balance}"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        AccountBalance.sync_account(self)
+
     @property
     def is_debit_side(self):
-        if self.category.category_type in ['A', 'X']:  # Assets and Expenses
+        if self.category.category_type in DEBIT_SIDE_TYPES:  # Assets and Expenses
             return True
         else:  # Liabilities, Equity, and Income
             return False
@@ -96,7 +139,289 @@ class Accounting_Account(models.Model):
     @property
     def balance(self):
         """Property to easily access the current balance (all transactions)"""
-        return self.get_balance()['balance']
+        try:
+            return self.running_balance.balance
+        except AccountBalance.DoesNotExist:
+            return self.get_balance()['balance']
+
+
+class AccountBalance(models.Model):
+    """
+    Running totals of an account, updated whenever its journal entries are
+    created, edited or deleted so the current balance is a single row read.
+    Use the rebuild_account_balances command to reconcile it with the journals.
+    """
+    account = models.OneToOneField(Accounting_Account, primary_key=True, on_delete=models.CASCADE,
+                                   related_name='running_balance')
+    debit_side = models.BooleanField(default=True)
+    total_debit = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    total_credit = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    balance = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.account_id} (D: {self.total_debit}, C: {self.total_credit}, B: {self.balance})"
+
+    @staticmethod
+    def closing_balance(account, total_debit, total_credit):
+        """All-time balance of an account from its debit and credit totals"""
+        if account.category is not None and account.is_debit_side:
+            return account.opening_balance + total_debit - total_credit
+        return account.opening_balance + total_credit - total_debit
+
+    @classmethod
+    def sync_account(cls, account):
+        """Recalculate the stored balance after the account's category or opening balance changed"""
+        row, _ = cls.objects.get_or_create(account=account)
+        row.debit_side = account.category_id is not None and account.is_debit_side
+        row.balance = cls.closing_balance(account, row.total_debit, row.total_credit)
+        row.save()
+        # Opening balances and sides show up in every balance report
+        on_commit(bump_ledger_version)
+        return row
+
+    @classmethod
+    def apply_deltas(cls, deltas):
+        """
+        Add journal movements to the running totals with one UPDATE statement
+        :param deltas: Dictionary of account id -> (debit, credit) to add; negative values reverse a posting
+        """
+        deltas = {pk: (debit, credit) for pk, (debit, credit) in deltas.items() if debit or credit}
+        if not deltas:
+            return 0
+
+        debit, credit, amount_field = _delta_cases(deltas)
+
+        updated = cls.objects.filter(account_id__in=deltas.keys()).update(
+            total_debit=F('total_debit') + debit,
+            total_credit=F('total_credit') + credit,
+            balance=F('balance') + Case(
+                When(debit_side=True, then=debit - credit),
+                default=credit - debit,
+                output_field=amount_field,
+            ),
+            # update() skips auto_now; API ETags read it to notice any movement on the account
+            updated_at=timezone.now(),
+        )
+        if updated < len(deltas):
+            # An account without a row yet starts it from its journals, which already hold this change
+            existing = cls.objects.filter(account_id__in=deltas.keys()).values_list('account_id', flat=True)
+            updated += cls.rebuild(account_ids=list(set(deltas) - set(existing)))
+        return updated
+
+    @classmethod
+    def rebuild(cls, account_ids=None):
+        """
+        Recalculate running totals from scratch with one grouped query over the journals
+        :param account_ids: Optional list of account ids to limit the rebuild to
+        :return: Number of balances rebuilt
+        """
+        accounts = Accounting_Account.objects.select_related('category').annotate(
+            total_debit=Coalesce(Sum('journal_entries__debit'), Decimal('0'), output_field=DecimalField()),
+            total_credit=Coalesce(Sum('journal_entries__credit'), Decimal('0'), output_field=DecimalField()),
+        )
+        if account_ids is not None:
+            accounts = accounts.filter(pk__in=account_ids)
+
+        rows = [
+            cls(
+                account=account,
+                # A fixture may load an account before its category
+                debit_side=account.category is not None and account.is_debit_side,
+                total_debit=account.total_debit,
+                total_credit=account.total_credit,
+                balance=cls.closing_balance(account, account.total_debit, account.total_credit),
+            )
+            for account in accounts
+        ]
+
+        with atomic():
+            cls.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['account'],
+                update_fields=['debit_side', 'total_debit', 'total_credit', 'balance', 'updated_at'],
+            )
+        return len(rows)
+
+
+class AccountSnapshot(models.Model):
+    """
+    Cumulative debit and credit totals of an account at the close of a day
+    (usually a month end). As-of balances start from the nearest snapshot and
+    only sum the journals posted after it. Snapshots are taken by the
+    snapshot_account_balances command and shifted when older entries change.
+    """
+    account = models.ForeignKey(Accounting_Account, on_delete=models.CASCADE, related_name='snapshots')
+    as_of = models.DateField()
+    total_debit = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    total_credit = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['-as_of', 'account']
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'as_of'], name='unique_account_snapshot'),
+        ]
+        indexes = [
+            models.Index(fields=['as_of', 'account'], name='snapshot_as_of_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.as_of} - {self.account_id} (D: {self.total_debit}, C: {self.total_credit})"
+
+    @classmethod
+    def latest_before(cls, day):
+        """Date of the newest snapshot closed before the given day, or None"""
+        return cls.objects.filter(as_of__lt=day).aggregate(latest=models.Max('as_of'))['latest']
+
+    @classmethod
+    def nearest_totals(cls, day):
+        """
+        Totals of the newest snapshot closed before the given day, in one query
+        :return: Tuple of (snapshot date or None, dictionary of account id -> (debit, credit))
+        """
+        latest = cls.objects.filter(as_of__lt=day).order_by('-as_of').values('as_of')[:1]
+        rows = cls.objects.filter(as_of=models.Subquery(latest)).values_list(
+            'as_of', 'account_id', 'total_debit', 'total_credit').order_by()
+        as_of = None
+        totals = {}
+        for as_of, account_id, debit, credit in rows:
+            totals[account_id] = (debit, credit)
+        return as_of, totals
+
+    @classmethod
+    def totals(cls, as_of):
+        """Dictionary of account id -> (debit, credit) for one snapshot date"""
+        if as_of is None:
+            return {}
+        rows = cls.objects.filter(as_of=as_of).values_list('account_id', 'total_debit', 'total_credit')
+        return {account_id: (debit, credit) for account_id, debit, credit in rows}
+
+    @classmethod
+    def take(cls, as_of):
+        """
+        Store closing totals for every account at the end of as_of, starting from the
+        previous snapshot so only the journals in between are summed
+        :param as_of: Date to close
+        :return: Number of snapshot rows written
+        """
+        previous = cls.latest_before(as_of)
+        opening = cls.totals(previous)
+
+        window = models.Q(journal_entries__date__lt=start_of_day(as_of + timedelta(days=1)))
+        if previous is not None:
+            window &= models.Q(journal_entries__date__gte=start_of_day(previous + timedelta(days=1)))
+
+        accounts = Accounting_Account.objects.annotate(
+            window_debit=Coalesce(Sum('journal_entries__debit', filter=window), Decimal('0'),
+                                  output_field=DecimalField()),
+            window_credit=Coalesce(Sum('journal_entries__credit', filter=window), Decimal('0'),
+                                   output_field=DecimalField()),
+        ).order_by().values_list('pk', 'window_debit', 'window_credit')
+
+        rows = []
+        for pk, debit, credit in accounts:
+            opening_debit, opening_credit = opening.get(pk, (Decimal('0'), Decimal('0')))
+            rows.append(cls(account_id=pk, as_of=as_of,
+                            total_debit=opening_debit + debit, total_credit=opening_credit + credit))
+
+        with atomic():
+            cls.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['account', 'as_of'],
+                update_fields=['total_debit', 'total_credit'],
+            )
+        return len(rows)
+
+    @classmethod
+    def apply_deltas(cls, deltas, day):
+        """
+        Shift every snapshot closed on or after day by a change to a journal posted on that day
+        :param deltas: Dictionary of account id -> (debit, credit) to add
+        :param day: Local date of the changed journal entry
+        """
+        deltas = {pk: (debit, credit) for pk, (debit, credit) in deltas.items() if debit or credit}
+        if not deltas:
+            return 0
+
+        snapshot_dates = list(cls.objects.filter(as_of__gte=day).order_by('as_of').values_list(
+            'as_of', flat=True).distinct())
+        if not snapshot_dates:
+            return 0
+
+        debit, credit, _ = _delta_cases(deltas)
+        updated = cls.objects.filter(account_id__in=deltas.keys(), as_of__gte=day).update(
+            total_debit=F('total_debit') + debit,
+            total_credit=F('total_credit') + credit,
+        )
+        if updated < len(deltas) * len(snapshot_dates):
+            updated += cls.add_missing(list(deltas), snapshot_dates)
+        return updated
+
+    @classmethod
+    def add_missing(cls, account_ids, snapshot_dates):
+        """
+        Start the snapshot rows an account lacks from its journals, which already hold the change
+        A snapshot only has rows for the accounts that existed when it was taken, so a posting
+        backdated across it to a newer account has no row to shift.
+        :return: Number of snapshot rows created
+        """
+        existing = set(cls.objects.filter(account_id__in=account_ids, as_of__in=snapshot_dates).values_list(
+            'as_of', 'account_id'))
+        rows = []
+        for as_of in snapshot_dates:
+            missing = [pk for pk in account_ids if (as_of, pk) not in existing]
+            if not missing:
+                continue
+            window = models.Q(journal_entries__date__lt=start_of_day(as_of + timedelta(days=1)))
+            accounts = Accounting_Account.objects.filter(pk__in=missing).annotate(
+                window_debit=Coalesce(Sum('journal_entries__debit', filter=window), Decimal('0'),
+                                      output_field=DecimalField()),
+                window_credit=Coalesce(Sum('journal_entries__credit', filter=window), Decimal('0'),
+                                       output_field=DecimalField()),
+            ).order_by().values_list('pk', 'window_debit', 'window_credit')
+            rows += [cls(account_id=pk, as_of=as_of, total_debit=debit, total_credit=credit)
+                     for pk, debit, credit in accounts]
+        # A row another writer started in the meantime was also built from the journals
+        cls.objects.bulk_create(rows, ignore_conflicts=True)
+        return len(rows)
+
+    @classmethod
+    def apply_deltas_by_day(cls, deltas_by_day):
+        """
+        Shift snapshots by journals posted on several days, e.g. an import of historical entries
+        Each snapshot date gets the sum of the changes on or before it, so there is one UPDATE
+        per snapshot date after the earliest day instead of one per posting day.
+        :param deltas_by_day: Dictionary of local date -> dictionary of account id -> (debit, credit)
+        """
+        days = sorted(deltas_by_day)
+        if not days:
+            return 0
+        snapshot_dates = cls.objects.filter(as_of__gte=days[0]).order_by('as_of').values_list(
+            'as_of', flat=True).distinct()
+
+        updated = 0
+        running = {}
+        pending = iter(days)
+        day = next(pending, None)
+        for as_of in snapshot_dates:
+            while day is not None and day <= as_of:
+                for pk, (debit, credit) in deltas_by_day[day].items():
+                    total_debit, total_credit = running.get(pk, (Decimal('0'), Decimal('0')))
+                    running[pk] = (total_debit + debit, total_credit + credit)
+                day = next(pending, None)
+            changed = {pk: (debit, credit) for pk, (debit, credit) in running.items() if debit or credit}
+            if changed:
+                debit, credit, _ = _delta_cases(changed)
+                shifted = cls.objects.filter(account_id__in=changed.keys(), as_of=as_of).update(
+                    total_debit=F('total_debit') + debit,
+                    total_credit=F('total_credit') + credit,
+                )
+                if shifted < len(changed):
+                    shifted += cls.add_missing(list(changed), [as_of])
+                updated += shifted
+        return updated
 
 
 class Transaction(models.Model):
@@ -105,39 +430,94 @@ class Transaction(models.Model):
     datetime = models.DateTimeField(auto_now_add=True)
     reference = models.CharField(max_length=50, blank=True)
     is_approved = models.BooleanField(default=False)
+    # Party the originating document belongs to; covered by the composite indexes below
+    customer = models.ForeignKey('core.Customer', on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='transactions', db_index=False)
+    supplier = models.ForeignKey('core.Supplier', on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='transactions', db_index=False)
 
     class Meta:
         ordering = ['-date', '-id']
+        indexes = [
+            models.Index(fields=['-date', '-id'], name='transaction_date_idx'),
+            # Party statements: one customer's or supplier's transactions in date order
+            models.Index(fields=['customer', 'date', 'id'], name='transaction_customer_idx'),
+            models.Index(fields=['supplier', 'date', 'id'], name='transaction_supplier_idx'),
+        ]
 
     def __str__(self):
         return f"{self.date} - {self.description[:20]}"
 
     def save(self, *args, **kwargs):
-        """Ensure the transaction is balanced before saving"""
+        adding = self._state.adding
         super().save(*args, **kwargs)
-        if self.is_approved:
-            self.update_account_balances()
+        if not adding:
+            # Keep the journals' denormalized posting date in step
+            self.journal_entries.exclude(posting_date=self.date).update(posting_date=self.date)
 
     def update_account_balances(self):
-        """Update all account balances affected by this transaction"""
-        for journal in self.journal_entries.all():
-            journal.account.get_balance()
+        """
+        Reconcile the running balances of the accounts this transaction touches.
+        Journal entries keep them current on their own, so this is only needed after
+        writes that bypass Journal.save (e.g. queryset updates).
+        """
+        account_ids = self.journal_entries.values_list('account_id', flat=True).distinct()
+        AccountBalance.rebuild(account_ids=list(account_ids))
 
 
 class Journal(models.Model):
-    account = models.ForeignKey(Accounting_Account, on_delete=models.CASCADE, related_name='journal_entries')
-    transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, related_name='journal_entries')
+    # Both foreign keys lead a composite index below, so they skip their own
+    account = models.ForeignKey(Accounting_Account, on_delete=models.CASCADE, related_name='journal_entries',
+                                db_index=False)
+    transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, related_name='journal_entries',
+                                    db_index=False)
     ref    = models.CharField(blank=True, null=True)
     debit = models.DecimalField(max_digits=15, decimal_places=2, default=0)
     credit = models.DecimalField(max_digits=15, decimal_places=2, default=0)
     description = models.CharField(max_length=255, blank=True, null=True)
     date = models.DateTimeField(auto_now_add=True)
+    posting_date = models.DateField(editable=False)  # copy of transaction.date so sorting needs no join
     class Meta:
-        ordering = ['transaction__date', 'id']
+        ordering = ['posting_date', 'id']
+        indexes = [
+            # Balance sums filter by account and date and only read the amounts
+            models.Index(fields=['account', 'date', 'debit', 'credit'], name='journal_account_date_idx'),
+            # Document updates look up a transaction's debit or credit line
+            models.Index(fields=['transaction', 'debit', 'credit'], name='journal_transaction_idx'),
+            models.Index(fields=['posting_date', 'id'], name='journal_posting_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.transaction.date} - {self.account.name} (D: {self.debit}, C: {self.credit})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what is currently posted so an edit only moves the difference
+        instance._posted = (
+            instance.__dict__.get('account_id'),
+            instance.__dict__.get('debit'),
+            instance.__dict__.get('credit'),
+        )
+        return instance
+
+    @property
+    def posting_day(self):
+        """Local calendar day the entry falls on for snapshots"""
+        return local_day(self.date)
+
+    def balance_deltas(self):
+        """Changes this entry makes to the running balances since it was loaded"""
+        deltas = {}
+        posted = getattr(self, '_posted', None)
+        if posted and None not in posted:
+            account_id, debit, credit = posted
+            deltas[account_id] = (-debit, -credit)
+
+        debit, credit = deltas.get(self.account_id, (Decimal('0'), Decimal('0')))
+        deltas[self.account_id] = (debit + Decimal(self.debit), credit + Decimal(self.credit))
+        return deltas
+
     def clean(self):
         """Validate that either debit or credit is set, but not both"""
         from django.core.exceptions import ValidationError
@@ -148,5 +528,43 @@ class Journal(models.Model):
 
     def save(self, *args, **kwargs):
         """Ensure the journal entry is valid before saving"""
+        if self.posting_date is None and self.transaction_id is not None:
+            self.posting_date = self.transaction.date
         self.full_clean()
-        super().save(*args, **kwargs)
\ No newline at end of file
+        with atomic():
+            super().save(*args, **kwargs)
+            deltas = self.balance_deltas()
+            AccountBalance.apply_deltas(deltas)
+            AccountSnapshot.apply_deltas(deltas, self.posting_day)
+            on_commit(lambda: bump_ledger_version(self.posting_day))
+        self._posted = (self.account_id, self.debit, self.credit)
+
+
+@receiver(post_delete, sender=Journal)
+def reverse_journal_balance(sender, instance, **kwargs):
+    """Take a deleted entry (including cascades from its transaction) out of the running balance"""
+    deltas = {instance.account_id: (-instance.debit, -instance.credit)}
+    AccountBalance.apply_deltas(deltas)
+    AccountSnapshot.apply_deltas(deltas, instance.posting_day)
+    on_commit(lambda: bump_ledger_version(instance.posting_day))
+
+
+@receiver(post_save, sender=Accounting_Account)
+def create_raw_account_balance(sender, instance, raw, **kwargs):
+    """Fixtures (loaddata) save accounts raw, skipping Accounting_Account.save and its balance row"""
+    if raw:
+        AccountBalance.rebuild(account_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def sync_raw_category_balances(sender, instance, raw, **kwargs):
+    """A category loaded after its accounts decides which side their balances sit on"""
+    if raw:
+        AccountBalance.rebuild(account_ids=list(instance.accounts.values_list('pk', flat=True)))
+
+
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+def invalidate_transaction_reports(sender, instance, **kwargs):
+    """Cached reports are keyed on the ledger version, move it on any transaction write"""
+    on_commit(lambda: bump_ledger_version(instance.date))
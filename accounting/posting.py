@@ -0,0 +1,222 @@
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Case, When, Value, DecimalField
+from django.db.transaction import atomic, on_commit
+from django.utils import timezone
+
+from accounting.models import Accounting_Account, AccountBalance, AccountSnapshot, Transaction, Journal, local_day
+from accounting.report_cache import bump_ledger_version
+from normerp.metrics import JOURNAL_LINES
+
+BATCH_SIZE = 1000
+
+
+@dataclass
+class JournalLine:
+    """One side of an entry; exactly one of debit or credit is set"""
+    account_id: int
+    debit: Decimal = Decimal('0')
+    credit: Decimal = Decimal('0')
+    description: str = None
+    ref: str = None
+
+
+@dataclass
+class Entry:
+    """A balanced transaction waiting to be posted"""
+    description: str
+    lines: list = field(default_factory=list)
+    reference: str = ''
+    is_approved: bool = True
+    customer_id: int = None
+    supplier_id: int = None
+    # Moment the entry belongs to, defaults to now; set it to post historical entries
+    posted_at: datetime = None
+
+
+def validate_entries(entries, check_accounts=True):
+    """
+    Check a batch of entries in memory before anything is written
+    Every line must have an account and follow Journal.clean (debit or credit, never both)
+    and every entry must balance. Accounts are checked with one query for the whole batch.
+    :param check_accounts: Set to False when the account ids are known to exist (e.g. foreign keys)
+    :raises ValidationError: With a message per offending entry, prefixed by its position
+    """
+    errors = []
+    account_ids = set()
+
+    for position, entry in enumerate(entries):
+        if len(entry.lines) < 2:
+            errors.append(f"Entry {position}: needs at least two journal lines")
+            continue
+
+        total_debit = Decimal('0')
+        total_credit = Decimal('0')
+        for line in entry.lines:
+            if line.debit and line.credit:
+                errors.append(f"Entry {position}: journal entry cannot have both debit and credit amounts")
+            elif not line.debit and not line.credit:
+                errors.append(f"Entry {position}: journal entry must have either debit or credit amount")
+            total_debit += Decimal(line.debit)
+            total_credit += Decimal(line.credit)
+            if line.account_id is None:
+                errors.append(f"Entry {position}: journal line has no account")
+            else:
+                account_ids.add(line.account_id)
+
+        if total_debit != total_credit:
+            errors.append(f"Entry {position}: debits ({total_debit}) and credits ({total_credit}) do not balance")
+
+    if check_accounts:
+        existing = set(Accounting_Account.objects.filter(pk__in=account_ids).values_list('pk', flat=True))
+        missing = account_ids - existing
+        if missing:
+            errors.append(f"Unknown accounts: {', '.join(str(pk) for pk in sorted(missing))}")
+
+    if errors:
+        raise ValidationError(errors)
+
+
+def set_auto_dates(model, field_names, values, key='pk'):
+    """
+    Write explicit values into auto_now_add fields after bulk_create stamped them with now
+    One parameterised UPDATE is run for all rows with executemany.
+    :param model: Model class
+    :param field_names: The auto_now_add fields
+    :param values: Dictionary of key -> tuple of values in field_names order
+    :param key: Field the dictionary keys match, the primary key by default
+    """
+    if not values:
+        return
+    fields = [model._meta.get_field(name) for name in field_names]
+    key_column = model._meta.pk.column if key == 'pk' else model._meta.get_field(key).column
+    quote = connection.ops.quote_name
+    assignments = ', '.join(f"{quote(field.column)} = %s" for field in fields)
+    sql = f"UPDATE {quote(model._meta.db_table)} SET {assignments} WHERE {quote(key_column)} = %s"
+    params = [
+        [field.get_db_prep_save(value, connection) for field, value in zip(fields, row)] + [pk]
+        for pk, row in values.items()
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def post_entries(entries, batch_size=BATCH_SIZE, validate=True):
+    """
+    Post many balanced entries at once
+    Transactions and journals are written with bulk_create inside one atomic block,
+    then the running balances and snapshots are moved with one UPDATE each
+    (one per affected snapshot date when historical entries are posted).
+
+    :param entries: List of Entry
+    :param batch_size: Rows per INSERT statement
+    :param validate: Set to False when the entries were already checked with validate_entries
+    :return: List of the created Transactions, in the same order as entries
+    """
+    if validate:
+        validate_entries(entries)
+
+    today = timezone.localdate()
+    deltas = {}
+    deltas_by_day = defaultdict(dict)
+    with atomic():
+        transactions = Transaction.objects.bulk_create(
+            [Transaction(description=entry.description, reference=entry.reference, is_approved=entry.is_approved,
+                         customer_id=entry.customer_id, supplier_id=entry.supplier_id)
+             for entry in entries],
+            batch_size=batch_size,
+        )
+
+        # bulk_create stamps the auto_now_add dates with now, so backdated entries are moved afterwards
+        backdated = {}
+        for entry, t in zip(entries, transactions):
+            if entry.posted_at is not None:
+                t.date, t.datetime = local_day(entry.posted_at), entry.posted_at
+                backdated[t.pk] = t
+        set_auto_dates(Transaction, ['date', 'datetime'], {pk: (t.date, t.datetime) for pk, t in backdated.items()})
+
+        journals = []
+        for entry, t in zip(entries, transactions):
+            day = local_day(t.date)
+            day_deltas = deltas_by_day[day]
+            for line in entry.lines:
+                journals.append(Journal(
+                    account_id=line.account_id,
+                    transaction=t,
+                    debit=line.debit,
+                    credit=line.credit,
+                    description=line.description,
+                    ref=line.ref,
+                    posting_date=t.date,
+                ))
+                for totals in (deltas, day_deltas):
+                    debit, credit = totals.get(line.account_id, (Decimal('0'), Decimal('0')))
+                    totals[line.account_id] = (debit + Decimal(line.debit), credit + Decimal(line.credit))
+        Journal.objects.bulk_create(journals, batch_size=batch_size)
+        set_auto_dates(Journal, ['date'], {pk: (t.datetime,) for pk, t in backdated.items()}, key='transaction')
+
+        # bulk_create skips Journal.save, so move the running balances here
+        AccountBalance.apply_deltas(deltas)
+        if len(deltas_by_day) == 1:
+            [(day, _)] = deltas_by_day.items()
+            AccountSnapshot.apply_deltas(deltas, day)
+        elif deltas_by_day:
+            AccountSnapshot.apply_deltas_by_day(deltas_by_day)
+        first_day = min(deltas_by_day, default=today)
+        on_commit(lambda: bump_ledger_version(first_day))
+        lines = len(journals)
+        on_commit(lambda: JOURNAL_LINES.inc(lines))
+
+    return transactions
+
+
+def update_entry_amount(transaction_id, amount):
+    """
+    Move every line of an entry to a new amount, keeping each line on its own side
+    Used when a document with a two-line entry is edited. The lines are locked and read
+    with one query and rewritten with one UPDATE; the side of a line is the column that
+    is not zero, which Journal.clean guarantees.
+
+    :param transaction_id: Transaction whose journal lines change
+    :param amount: New amount of both the debit and the credit side
+    :raises ValidationError: When amount is zero
+    """
+    amount = Decimal(amount)
+    if not amount:
+        raise ValidationError("journal entry must have either debit or credit amount")
+
+    with atomic():
+        lines = list(
+            Journal.objects.select_for_update().filter(transaction_id=transaction_id).order_by()
+            .values_list('pk', 'account_id', 'debit', 'credit', 'date')
+        )
+        if not lines:
+            return 0
+
+        deltas = {}
+        for _, account_id, debit, credit, _ in lines:
+            debit_delta, credit_delta = deltas.get(account_id, (Decimal('0'), Decimal('0')))
+            if debit:
+                debit_delta += amount - debit
+            else:
+                credit_delta += amount - credit
+            deltas[account_id] = (debit_delta, credit_delta)
+
+        amount_field = DecimalField(max_digits=15, decimal_places=2)
+        updated = Journal.objects.filter(pk__in=[line[0] for line in lines]).update(
+            debit=Case(When(debit=0, then=Value(Decimal('0'))), default=Value(amount), output_field=amount_field),
+            credit=Case(When(credit=0, then=Value(Decimal('0'))), default=Value(amount), output_field=amount_field),
+        )
+
+        # update() skips Journal.save, so move the running balances here
+        day = local_day(lines[0][4])
+        AccountBalance.apply_deltas(deltas)
+        AccountSnapshot.apply_deltas(deltas, day)
+        on_commit(lambda: bump_ledger_version(day))
+
+    return updated
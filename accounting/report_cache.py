@@ -0,0 +1,87 @@
+import hashlib
+import time
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from normerp.metrics import REPORT_CACHE
+
+# Bumped on every journal or transaction write
+LEDGER_VERSION_KEY = 'ledger:version'
+# Bumped only when a write lands on a day that is already closed
+HISTORY_VERSION_KEY = 'ledger:history-version'
+
+
+def _initial_version():
+    # Start from the clock so a version lost from the cache never reuses an old key
+    return time.time_ns()
+
+
+def _get_version(key):
+    return cache.get_or_set(key, _initial_version, timeout=None)
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _initial_version(), timeout=None)
+
+
+def ledger_version():
+    """Version of the whole ledger, changes on every posting"""
+    return _get_version(LEDGER_VERSION_KEY)
+
+
+def history_version():
+    """Version of the closed days of the ledger, only changes when a past entry is edited"""
+    return _get_version(HISTORY_VERSION_KEY)
+
+
+def bump_ledger_version(day=None):
+    """
+    Invalidate cached reports after a ledger write
+    :param day: Local date of the changed entry; reports of closed periods are only
+                invalidated when it falls before today (or is unknown)
+    """
+    _bump(LEDGER_VERSION_KEY)
+    if day is None or day < timezone.localdate():
+        _bump(HISTORY_VERSION_KEY)
+
+
+def _param_key(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def cached_report(name, builder, **params):
+    """
+    Return a report from the cache, building it on a miss
+    Reports ending before today are cached until a closed day changes (or
+    REPORT_CACHE_CLOSED_TIMEOUT seconds), everything else until the next posting
+    (or REPORT_CACHE_TIMEOUT seconds).
+
+    :param name: Report type, e.g. 'balance_sheet'
+    :param builder: Function that generates the report from params
+    :param params: Keyword arguments for builder, the date window is part of the key
+    :return: The report dictionary
+    """
+    # accounting.models imports this module to bump the version
+    from accounting.models import local_day
+
+    end = params.get('to_date') or params.get('as_of_date')
+    closed = end is not None and local_day(end) < timezone.localdate()
+    version = history_version() if closed else ledger_version()
+
+    window = '|'.join(f"{key}={_param_key(value)}" for key, value in sorted(params.items()))
+    key = f"report:{name}:{version}:{hashlib.md5(window.encode()).hexdigest()}"
+
+    report = cache.get(key)
+    REPORT_CACHE.inc(report=name, result='miss' if report is None else 'hit')
+    if report is None:
+        report = builder(**params)
+        cache.set(key, report, timeout=settings.REPORT_CACHE_CLOSED_TIMEOUT if closed else settings.REPORT_CACHE_TIMEOUT)
+    return report
@@ -1,3 +1,381 @@
+import io
+import json
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core import checks, serializers
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounting.balances import get_account_balances
+from accounting.financial_reports import generate_comparative_income_statement
+from accounting.models import (Category, Accounting_Account, AccountBalance, AccountSnapshot, Transaction, Journal,
+                               start_of_day)
+from accounting.posting import Entry, JournalLine, post_entries, update_entry_amount, validate_entries
+from accounting.report_cache import cached_report
+
+
+class TrialBalancePageTests(TestCase):
+
+    def setUp(self):
+        self.asset = Category.objects.create(name='Cash', category_type='A')
+        self.income = Category.objects.create(name='Sale', category_type='I')
+
+    def add_accounts(self, count):
+        """Create pairs of cash and revenue accounts with one posting between each pair"""
+        start = Accounting_Account.objects.count()
+        for n in range(start, start + count):
+            cash = Accounting_Account.objects.create(name=f'Cash {n}', code=f'C{n:04}', category=self.asset)
+            revenue = Accounting_Account.objects.create(name=f'Sale {n}', code=f'S{n:04}', category=self.income)
+            t = Transaction.objects.create(description=f'Sale {n}', is_approved=True)
+            Journal.objects.create(account=cash, transaction=t, debit=Decimal('10.00'))
+            Journal.objects.create(account=revenue, transaction=t, credit=Decimal('10.00'))
+
+    def render(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('trial_balance'))
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_rows_are_precomputed(self):
+        self.add_accounts(2)
+        response, _ = self.render()
+
+        rows = response.context['accounts']
+        self.assertEqual([row.code for row in rows], ['C0000', 'C0001', 'S0000', 'S0001'])
+        self.assertEqual(rows[0].side, 'debit')
+        self.assertEqual(rows[0].debit, Decimal('10.00'))
+        self.assertEqual(rows[2].side, 'credit')
+        self.assertEqual(rows[2].credit, Decimal('10.00'))
+        self.assertEqual(response.context['total_debits'], response.context['total_credits'])
+
+    def test_query_count_does_not_grow_with_accounts(self):
+        self.add_accounts(3)
+        _, few = self.render()
+
+        self.add_accounts(30)
+        _, many = self.render()
+
+        self.assertEqual(few, many)
+
+
+class RunningBalanceTests(TestCase):
+
+    def setUp(self):
+        self.asset = Category.objects.create(name='Cash', category_type='A')
+        self.income = Category.objects.create(name='Sale', category_type='I')
+        self.cash = Accounting_Account.objects.create(name='Cash', code='CASH', category=self.asset,
+                                                      opening_balance=Decimal('1000'))
+        self.sales = Accounting_Account.objects.create(name='Sales', code='REV', category=self.income)
+
+    def post(self, amount, cash=None, sales=None):
+        t = Transaction.objects.create(description='Sale', is_approved=True)
+        Journal.objects.create(account=cash or self.cash, transaction=t, debit=amount)
+        Journal.objects.create(account=sales or self.sales, transaction=t, credit=amount)
+        return t
+
+    def assertMatchesJournals(self, account):
+        row = AccountBalance.objects.get(account=account)
+        sums = account.journal_entries.aggregate(debit=Sum('debit'), credit=Sum('credit'))
+        self.assertEqual(row.total_debit, sums['debit'] or 0)
+        self.assertEqual(row.total_credit, sums['credit'] or 0)
+        self.assertEqual(row.balance, account.get_balance()['balance'])
+
+    def test_posting_editing_and_deleting_journals_move_the_totals(self):
+        self.post(Decimal('100'))
+        t = self.post(Decimal('50'))
+        line = t.journal_entries.get(account=self.cash)
+        line.debit = Decimal('70')
+        line.save()
+        sale = t.journal_entries.get(account=self.sales)
+        sale.credit = Decimal('70')
+        sale.save()
+        for account in (self.cash, self.sales):
+            self.assertMatchesJournals(account)
+        self.assertEqual(AccountBalance.objects.get(account=self.cash).balance, Decimal('1170'))
+
+        t.delete()
+        for account in (self.cash, self.sales):
+            self.assertMatchesJournals(account)
+        self.assertEqual(AccountBalance.objects.get(account=self.sales).balance, Decimal('100'))
+
+    def test_rebuild_command_matches_the_journal_sums(self):
+        self.post(Decimal('100'))
+        self.post(Decimal('25'))
+        AccountBalance.objects.update(total_debit=0, total_credit=0, balance=0)
+
+        call_command('rebuild_account_balances', stdout=io.StringIO())
+        for account in (self.cash, self.sales):
+            self.assertMatchesJournals(account)
+
+    def test_fixture_loaded_accounts_are_posted_to(self):
+        fixture = json.dumps([
+            {'model': 'accounting.accounting_account', 'pk': 900,
+             'fields': {'name': 'Petty cash', 'code': 'PETTY', 'category': self.asset.pk, 'opening_balance': '1000'}},
+            {'model': 'accounting.accounting_account', 'pk': 901,
+             'fields': {'name': 'Fees', 'code': 'FEES', 'category': self.income.pk}},
+        ])
+        for record in serializers.deserialize('json', fixture):
+            record.save()  # as loaddata does, without Accounting_Account.save
+        petty, fees = Accounting_Account.objects.get(pk=900), Accounting_Account.objects.get(pk=901)
+
+        self.post(Decimal('100'), cash=petty, sales=fees)
+        AccountBalance.objects.filter(account__in=[petty, fees]).delete()  # e.g. loaded before this fix
+        self.post(Decimal('10'), cash=petty, sales=fees)
+
+        self.assertMatchesJournals(petty)
+        balances = {row['account'].code: row['balance'] for row in get_account_balances()}
+        self.assertEqual(balances['PETTY'], Decimal('1110'))
+        self.assertEqual(balances['FEES'], Decimal('110'))
+
+
+class SnapshotBalanceTests(TestCase):
+
+    def setUp(self):
+        asset = Category.objects.create(name='Cash', category_type='A')
+        income = Category.objects.create(name='Sale', category_type='I')
+        self.cash = Accounting_Account.objects.create(name='Cash', code='CASH', category=asset)
+        self.sales = Accounting_Account.objects.create(name='Sales', code='REV', category=income)
+
+    def post(self, day, amount):
+        post_entries([Entry(description='Sale', posted_at=start_of_day(day) + timedelta(hours=12), lines=[
+            JournalLine(self.cash.pk, debit=Decimal(amount)), JournalLine(self.sales.pk, credit=Decimal(amount)),
+        ])])
+
+    def balances(self, **dates):
+        return {row['account'].code: row['balance'] for row in get_account_balances(**dates)}
+
+    def assertMatchesJournals(self, **dates):
+        """Snapshot based balances equal the journal sums of Accounting_Account.get_balance"""
+        balances = self.balances(**dates)
+        for account in (self.cash, self.sales):
+            self.assertEqual(balances[account.code], account.get_balance(**dates)['balance'], dates)
+
+    def test_as_of_balance_is_snapshot_plus_later_journals(self):
+        self.post(date(2024, 1, 10), 100)
+        self.post(date(2024, 1, 31), 20)
+        AccountSnapshot.take(date(2024, 1, 31))
+        self.post(date(2024, 2, 1), 5)
+        self.post(date(2024, 2, 15), 7)
+
+        snapshot = AccountSnapshot.objects.get(account=self.cash, as_of=date(2024, 1, 31))
+        self.assertEqual(snapshot.total_debit, Decimal('120'))
+        for day in (date(2024, 1, 15), date(2024, 1, 31), date(2024, 2, 1), date(2024, 2, 20)):
+            self.assertMatchesJournals(to_date=start_of_day(day + timedelta(days=1)) - timedelta(microseconds=1))
+        self.assertEqual(self.balances(to_date=start_of_day(date(2024, 2, 2)))['CASH'], Decimal('125'))
+        # A period across the snapshot subtracts the totals at its start
+        self.assertMatchesJournals(from_date=start_of_day(date(2024, 1, 20)),
+                                   to_date=start_of_day(date(2024, 2, 10)))
+
+    def test_backdated_postings_shift_later_snapshots(self):
+        self.post(date(2024, 1, 10), 100)
+        AccountSnapshot.take(date(2024, 1, 31))
+        AccountSnapshot.take(date(2024, 2, 29))
+
+        # One batch over several days moves each snapshot by what was posted on or before it
+        post_entries([
+            Entry(description='Old', posted_at=start_of_day(day) + timedelta(hours=12),
+                  lines=[JournalLine(self.cash.pk, debit=Decimal(amount)),
+                         JournalLine(self.sales.pk, credit=Decimal(amount))])
+            for day, amount in ((date(2024, 1, 5), 10), (date(2024, 2, 5), 30), (date(2024, 3, 5), 50))
+        ])
+
+        totals = dict(AccountSnapshot.objects.filter(account=self.cash).values_list('as_of', 'total_debit'))
+        self.assertEqual(totals, {date(2024, 1, 31): Decimal('110'), date(2024, 2, 29): Decimal('140')})
+        self.assertMatchesJournals(to_date=start_of_day(date(2024, 2, 10)))
+        self.assertMatchesJournals(from_date=start_of_day(date(2024, 2, 1)), to_date=start_of_day(date(2024, 3, 10)))
+
+    def test_backdated_posting_to_an_account_newer_than_the_snapshot(self):
+        self.post(date(2024, 1, 10), 100)
+        AccountSnapshot.take(date(2024, 1, 31))
+        AccountSnapshot.take(date(2024, 2, 29))
+        bank = Accounting_Account.objects.create(name='Bank', code='BANK', category=self.cash.category)
+
+        # One entry on one day, then a batch over several days
+        post_entries([Entry(description='Deposit', posted_at=start_of_day(date(2024, 1, 20)), lines=[
+            JournalLine(bank.pk, debit=Decimal(40)), JournalLine(self.cash.pk, credit=Decimal(40)),
+        ])])
+        post_entries([
+            Entry(description='Deposit', posted_at=start_of_day(day), lines=[
+                JournalLine(bank.pk, debit=Decimal(amount)), JournalLine(self.cash.pk, credit=Decimal(amount))])
+            for day, amount in ((date(2024, 1, 25), 5), (date(2024, 2, 10), 3))
+        ])
+
+        totals = dict(AccountSnapshot.objects.filter(account=bank).values_list('as_of', 'total_debit'))
+        self.assertEqual(totals, {date(2024, 1, 31): Decimal('45'), date(2024, 2, 29): Decimal('48')})
+        for day in (date(2024, 2, 5), date(2024, 3, 5)):
+            balances = self.balances(to_date=start_of_day(day))
+            self.assertEqual(balances['BANK'], bank.get_balance(to_date=start_of_day(day))['balance'])
+            self.assertEqual(balances['CASH'], self.cash.get_balance(to_date=start_of_day(day))['balance'])
+
+
+class PostEntriesTests(TestCase):
+
+    def setUp(self):
+        asset = Category.objects.create(name='Cash', category_type='A')
+        income = Category.objects.create(name='Sale', category_type='I')
+        self.cash = Accounting_Account.objects.create(name='Cash', code='CASH', category=asset)
+        self.sales = Accounting_Account.objects.create(name='Sales', code='REV', category=income)
+
+    def entry(self, *lines):
+        return Entry(description='Sale', lines=list(lines))
+
+    def test_entries_are_posted_with_their_balances(self):
+        transactions = post_entries([
+            self.entry(JournalLine(self.cash.pk, debit=Decimal('100')), JournalLine(self.sales.pk, credit=Decimal('100'))),
+            self.entry(JournalLine(self.cash.pk, debit=Decimal('40')), JournalLine(self.sales.pk, credit=Decimal('40'))),
+        ])
+
+        self.assertEqual(len(transactions), 2)
+        self.assertEqual(Journal.objects.filter(transaction__in=transactions).count(), 4)
+        self.assertEqual(AccountBalance.objects.get(account=self.cash).balance, Decimal('140'))
+        self.assertEqual(AccountBalance.objects.get(account=self.sales).balance, Decimal('140'))
+
+    def test_invalid_entries_are_rejected_before_anything_is_written(self):
+        cases = {
+            'do not balance': self.entry(JournalLine(self.cash.pk, debit=Decimal('100')),
+                                         JournalLine(self.sales.pk, credit=Decimal('90'))),
+            'cannot have both debit and credit': self.entry(
+                JournalLine(self.cash.pk, debit=Decimal('10'), credit=Decimal('10')),
+                JournalLine(self.sales.pk, credit=Decimal('0'), debit=Decimal('0'))),
+            'needs at least two journal lines': self.entry(JournalLine(self.cash.pk, debit=Decimal('10'))),
+            'Unknown accounts: 999': self.entry(JournalLine(self.cash.pk, debit=Decimal('10')),
+                                                JournalLine(999, credit=Decimal('10'))),
+        }
+        valid = self.entry(JournalLine(self.cash.pk, debit=Decimal('5')), JournalLine(self.sales.pk, credit=Decimal('5')))
+        for message, entry in cases.items():
+            with self.subTest(message), self.assertRaisesMessage(ValidationError, message):
+                post_entries([valid, entry])
+
+        with self.assertRaisesMessage(ValidationError, 'must have either debit or credit'):
+            validate_entries([self.entry(JournalLine(self.cash.pk), JournalLine(self.sales.pk))])
+        self.assertFalse(Transaction.objects.exists())
+        self.assertEqual(AccountBalance.objects.get(account=self.cash).balance, 0)
+
+
+class UpdateEntryAmountTests(TestCase):
+
+    def setUp(self):
+        asset = Category.objects.create(name='Cash', category_type='A')
+        income = Category.objects.create(name='Sale', category_type='I')
+        self.cash = Accounting_Account.objects.create(name='Cash', code='CASH', category=asset)
+        self.sales = Accounting_Account.objects.create(name='Sales', code='REV', category=income)
+        [self.transaction] = post_entries([Entry(
+            description='Sale', posted_at=start_of_day(date(2024, 1, 10)),
+            lines=[JournalLine(self.cash.pk, debit=Decimal('100')), JournalLine(self.sales.pk, credit=Decimal('100'))],
+        )])
+        AccountSnapshot.take(date(2024, 1, 31))
+
+    def test_both_lines_and_the_totals_move(self):
+        self.assertEqual(update_entry_amount(self.transaction.pk, Decimal('60')), 2)
+
+        lines = dict(Journal.objects.filter(transaction=self.transaction).values_list('account_id', 'debit'))
+        self.assertEqual(lines, {self.cash.pk: Decimal('60'), self.sales.pk: Decimal('0')})
+        self.assertEqual(Journal.objects.get(transaction=self.transaction, account=self.sales).credit, Decimal('60'))
+        for account in (self.cash, self.sales):
+            row = AccountBalance.objects.get(account=account)
+            self.assertEqual(row.balance, Decimal('60'))
+            self.assertEqual(row.total_debit + row.total_credit, Decimal('60'))
+        snapshot = AccountSnapshot.objects.get(account=self.sales, as_of=date(2024, 1, 31))
+        self.assertEqual(snapshot.total_credit, Decimal('60'))
+
+    def test_zero_amount_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            update_entry_amount(self.transaction.pk, 0)
+        self.assertEqual(AccountBalance.objects.get(account=self.cash).balance, Decimal('100'))
+
+
+class ComparativeIncomeStatementTests(TestCase):
+
+    def setUp(self):
+        asset = Category.objects.create(name='Cash', category_type='A')
+        income = Category.objects.create(name='Sale', category_type='I')
+        expense = Category.objects.create(name='Rent', category_type='X')
+        self.cash = Accounting_Account.objects.create(name='Cash', code='CASH', category=asset)
+        self.sales = Accounting_Account.objects.create(name='Sales', code='REV', category=income)
+        self.rent = Accounting_Account.objects.create(name='Rent', code='RENT', category=expense)
+        post_entries([
+            Entry(description='Entry', posted_at=start_of_day(day) + timedelta(hours=12),
+                  lines=[JournalLine(debit_account.pk, debit=Decimal(amount)),
+                         JournalLine(credit_account.pk, credit=Decimal(amount))])
+            for day, debit_account, credit_account, amount in (
+                (date(2023, 1, 20), self.cash, self.sales, 80),
+                (date(2024, 1, 5), self.cash, self.sales, 60),
+                (date(2024, 1, 31), self.cash, self.sales, 40),
+                (date(2024, 2, 1), self.cash, self.sales, 50),
+                (date(2024, 2, 10), self.rent, self.cash, 30),
+                (date(2024, 4, 30), self.cash, self.sales, 30),
+            )
+        ])
+
+    def amounts(self, line):
+        return [cell['amount'] for cell in line['cells']]
+
+    def test_monthly_columns_and_changes(self):
+        report = generate_comparative_income_statement(date(2024, 1, 1), date(2024, 4, 30), period='month')
+
+        self.assertEqual([c['label'] for c in report['columns']], ['Jan 2024', 'Feb 2024', 'Mar 2024', 'Apr 2024'])
+        [sales] = report['income']
+        self.assertEqual(self.amounts(sales), [100, 50, 0, 30])
+        self.assertEqual(sales['total'], 180)
+        self.assertEqual(self.amounts(report['net_income']), [100, 20, 0, 30])
+
+        january, february = sales['cells'][:2]
+        self.assertEqual(february['change'], {'amount': -50, 'percent': Decimal('-50.00')})
+        # January 2023 is read for the comparison even though it is outside the report
+        self.assertEqual(january['yoy_change'], {'amount': 20, 'percent': Decimal('25.00')})
+        self.assertIsNone(sales['cells'][3]['change']['percent'])
+
+    def test_quarterly_and_yearly_buckets(self):
+        quarters = generate_comparative_income_statement(date(2024, 1, 1), date(2024, 6, 30), period='quarter')
+        self.assertEqual([c['label'] for c in quarters['columns']], ['Q1 2024', 'Q2 2024'])
+        self.assertEqual(self.amounts(quarters['income'][0]), [150, 30])
+        self.assertEqual(self.amounts(quarters['total_expenses']), [30, 0])
+
+        years = generate_comparative_income_statement(date(2024, 3, 1), date(2024, 12, 31), period='year')
+        self.assertEqual([c['label'] for c in years['columns']], ['2024'])
+        self.assertEqual(years['income'][0]['cells'][0]['yoy_change'], {'amount': 100, 'percent': Decimal('125.00')})
+
+    def test_invalid_parameters_are_a_bad_request(self):
+        for query in ('year=abc', 'from=31/01/2025', 'period=week', 'from=2025-02-01&to=2025-01-01'):
+            with self.subTest(query):
+                page = self.client.get(f"{reverse('comparative_income_statement')}?{query}")
+                self.assertEqual(page.status_code, 400)
+                self.assertContains(page, 'alert-danger', status_code=400)
+                self.assertEqual(self.client.get(f'/api/reports/comparative-income-statement/?{query}').status_code, 400)
+
+
+class ReportCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_closed_reports_expire_in_a_per_process_cache(self):
+        builder = mock.Mock(return_value={'total': 1})
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            with self.settings(REPORT_CACHE_CLOSED_TIMEOUT=3600, REPORT_CACHE_TIMEOUT=300):
+                cached_report('test', builder, to_date=date(2024, 1, 31))
+                cached_report('test', builder, to_date=date.today() + timedelta(days=1))
+        timeouts = [call.kwargs['timeout'] for call in cache_set.call_args_list if call.args[0].startswith('report:')]
+        self.assertEqual(timeouts, [3600, 300])
 
-# Create your tests here.
+    def test_deploy_check_warns_about_a_per_process_cache(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        database = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'normerp_cache'}}
+        with self.settings(CACHES=locmem):
+            self.assertEqual([w.id for w in checks.run_checks(tags=[checks.Tags.caches], include_deployment_checks=True)],
+                             ['accounting.W001'])
+        with self.settings(CACHES=database):
+            self.assertNotIn('accounting.W001',
+                             [w.id for w in checks.run_checks(tags=[checks.Tags.caches], include_deployment_checks=True)])
+        # Not a development warning
+        with self.settings(CACHES=locmem):
+            self.assertEqual(checks.run_checks(tags=[checks.Tags.caches]), [])
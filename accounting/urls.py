@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.urls import path
-from .views import enter_income, enter_expense, income_statement, income_statement_report, balance_sheet, trial_balance
+from .views import enter_income, enter_expense, income_statement, income_statement_report, balance_sheet, trial_balance, \
+    comparative_income_statement
 
 urlpatterns = [
     path('customer_payment/', enter_income, name="customer_payment"),
@@ -9,4 +10,5 @@ urlpatterns = [
     path('income-statement-report/', income_statement_report, name="income_statement_report"),
     path('balance-sheet/', balance_sheet, name="balance_sheet"),
     path('trial-balance/', trial_balance, name="trial_balance"),
+    path('comparative-income-statement/', comparative_income_statement, name="comparative_income_statement"),
 ]
\ No newline at end of file
@@ -1,12 +1,30 @@
+import logging
+
 from django.shortcuts import render
 from unicodedata import category
 from accounting.financial_reports import *
-from accounting.models import Accounting_Account, Category
+from accounting.models import Accounting_Account, Category, start_of_day
+from accounting.report_cache import cached_report
 from django.utils import timezone
-from datetime import datetime
+from datetime import date, datetime, time
+
+logger = logging.getLogger(__name__)
 
 # Create your views here.
 
+def end_of_day(day):
+    """Last moment of a local day, so reports run during that day share one cache key"""
+    return timezone.make_aware(datetime.combine(day, time.max))
+
+
+def end_of_today():
+    return end_of_day(timezone.localdate())
+
+
+# Window of the income statement and trial balance pages
+REPORTS_START = date(2023, 1, 1)
+
+
 def enter_income(req):
     return render(req, 'backend/accounting/income.html')
 
@@ -23,9 +41,11 @@ def income_statement(req):
 def income_statement_report(req):
     frm = req.GET.get('from')  # Get the value of the 'q' parameter
     to = req.GET.get('to')
-    income_statement = generate_income_statement(
-        from_date=timezone.make_aware(datetime(2023, 1, 1)),
-        to_date=timezone.make_aware(datetime.now()),
+    income_statement = cached_report(
+        'income_statement',
+        generate_income_statement,
+        from_date=start_of_day(REPORTS_START),
+        to_date=end_of_today(),
         method='accrual'
     )
 
@@ -33,17 +53,57 @@ def income_statement_report(req):
 
 
 def balance_sheet(req):
-    balance_sheet = generate_balance_sheet(
-        as_of_date=timezone.make_aware(datetime.now())
+    balance_sheet = cached_report(
+        'balance_sheet',
+        generate_balance_sheet,
+        as_of_date=end_of_today()
     )
     return render(req, 'backend/accounting/balance_sheet.html', balance_sheet)
 
 
 
 def trial_balance(req):
-    trial_balance_period = generate_trial_balance(
-        from_date=timezone.make_aware(datetime(2023, 1, 1)),
-        to_date=timezone.make_aware(datetime.now())
+    trial_balance_period = cached_report(
+        'trial_balance',
+        generate_trial_balance,
+        from_date=start_of_day(REPORTS_START),
+        to_date=end_of_today()
     )
-    print(trial_balance_period)
+    logger.debug("Trial balance rendered", extra={'accounts': len(trial_balance_period['accounts']),
+                                                  'total_debits': trial_balance_period['total_debits'],
+                                                  'total_credits': trial_balance_period['total_credits']})
     return render(req, 'backend/accounting/trial_balance.html', trial_balance_period )
+
+
+
+def comparative_report_params(params):
+    """
+    Read the comparative income statement window from request parameters
+    ?year=2025&period=quarter, or ?from=2025-01-01&to=2025-06-30&period=month
+    :raises ValueError: With a message for the user when a parameter is invalid
+    """
+    period = params.get('period') or 'month'
+    if period not in PERIOD_MONTHS:
+        raise ValueError(f"Unknown period {period!r}, expected one of {', '.join(PERIOD_MONTHS)}")
+    try:
+        year = int(params.get('year') or timezone.localdate().year)
+        from_date = date.fromisoformat(params['from']) if params.get('from') else date(year, 1, 1)
+        to_date = date.fromisoformat(params['to']) if params.get('to') else date(year, 12, 31)
+    except ValueError:
+        raise ValueError("year must be a year and from/to dates in YYYY-MM-DD format")
+    if from_date > to_date:
+        raise ValueError("from must not be after to")
+    return {'from_date': from_date, 'to_date': to_date, 'period': period}
+
+
+def comparative_income_statement(req):
+    try:
+        report = cached_report(
+            'comparative_income_statement',
+            generate_comparative_income_statement,
+            **comparative_report_params(req.GET)
+        )
+    except ValueError as e:
+        return render(req, 'backend/accounting/comparative_income_statement.html',
+                      {'error': str(e), 'period': req.GET.get('period')}, status=400)
+    return render(req, 'backend/accounting/comparative_income_statement.html', report)
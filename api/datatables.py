@@ -0,0 +1,146 @@
+import re
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.generics import GenericAPIView
+from rest_framework.response import Response
+
+MAX_LENGTH = 500
+# columns[3][search][value] -> ('3', 'search', 'value')
+COLUMN_PARAM = re.compile(r'^columns\[(\d+)\]\[(\w+)\](?:\[(\w+)\])?$')
+
+
+@dataclass(frozen=True)
+class Column:
+    """
+    A grid column and how it is searched
+    kind is 'text' (prefix match), 'number' (exact) or 'date' ('YYYY-MM-DD' or 'from|to', either end optional)
+    """
+    data: str
+    field: str
+    kind: str = 'text'
+    searchable: bool = True
+    orderable: bool = True
+
+    def search(self, value):
+        """Q filter for a search value, None when the value cannot apply to this column"""
+        if self.kind == 'text':
+            return Q(**{f'{self.field}__istartswith': value})
+        if self.kind == 'number':
+            return Q(**{self.field: int(value)}) if value.isdigit() else None
+        if self.kind == 'date':
+            first, last = value.split('|', 1) if '|' in value else (value, value)
+            first, last = _parse_day(first), _parse_day(last)
+            condition = Q()
+            if first:
+                condition &= Q(**{f'{self.field}__gte': _day_start(first)})
+            if last:
+                condition &= Q(**{f'{self.field}__lt': _day_start(last + timedelta(days=1))})
+            return condition or None
+        raise ValueError(f"Unknown column kind {self.kind!r}")
+
+
+def _parse_day(value):
+    try:
+        return parse_date(value.strip())
+    except ValueError:
+        return None
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class DataTablesView(GenericAPIView):
+    """
+    Server-side processing endpoint for DataTables grids
+    Reads the draw, start, length, search[value], order[i][column|dir] and
+    columns[i][data|search][value] parameters and answers with one page of rows:
+    {"draw", "recordsTotal", "recordsFiltered", "data"}.
+
+    Subclasses set queryset, serializer_class and columns; the grid's columns are
+    matched to them by their `data` name. Global search only matches text columns.
+    """
+    columns = []
+    default_order = ['-id']
+
+    def get(self, request, format=None):
+        params = request.query_params
+        draw = _int(params.get('draw'), 0)
+        start = max(_int(params.get('start'), 0), 0)
+        length = _int(params.get('length'), 10)
+        length = MAX_LENGTH if length < 0 else min(length, MAX_LENGTH)
+
+        requested = self.requested_columns(params)
+        queryset = self.get_queryset()
+        total = queryset.count()
+
+        filters = self.search_filter(params.get('search[value]', '').strip(), requested)
+        if filters:
+            queryset = queryset.filter(filters)
+            filtered = queryset.count()
+        else:
+            filtered = total
+
+        rows = queryset.order_by(*self.ordering(params, requested))[start:start + length]
+        return Response({
+            'draw': draw,
+            'recordsTotal': total,
+            'recordsFiltered': filtered,
+            'data': self.get_serializer(rows, many=True).data,
+        })
+
+    def requested_columns(self, params):
+        """Grid column index -> (Column, per-column search value), for the columns this view knows"""
+        known = {column.data: column for column in self.columns}
+        grid = {}
+        for key, value in params.items():
+            match = COLUMN_PARAM.match(key)
+            if match:
+                index, name, sub = match.groups()
+                grid.setdefault(int(index), {})[f'{name}.{sub}' if sub else name] = value
+
+        requested = {}
+        for index, attributes in grid.items():
+            column = known.get(attributes.get('data'))
+            if column is not None:
+                requested[index] = (column, attributes.get('search.value', '').strip())
+        return requested
+
+    def search_filter(self, term, requested):
+        condition = Q()
+        if term:
+            matches = [column.search(term) for column in self.columns if column.searchable and column.kind == 'text']
+            any_match = Q()
+            for match in matches:
+                any_match |= match
+            condition &= any_match
+        for column, value in requested.values():
+            if value and column.searchable:
+                match = column.search(value)
+                # A value that cannot apply to the column (letters in a number column) matches nothing
+                condition &= match if match is not None else Q(pk__in=[])
+        return condition
+
+    def ordering(self, params, requested):
+        order = []
+        n = 0
+        while f'order[{n}][column]' in params:
+            index = _int(params.get(f'order[{n}][column]'), -1)
+            if index in requested and requested[index][0].orderable:
+                column = requested[index][0]
+                descending = params.get(f'order[{n}][dir]') == 'desc'
+                order.append(f"{'-' if descending else ''}{column.field}")
+            n += 1
+        # Ties are broken by id so pages never overlap
+        return order + ['id'] if order else self.default_order
+
+
+def _int(value, default):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
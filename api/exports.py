@@ -0,0 +1,267 @@
+import csv
+import io
+import re
+import zipfile
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.db.models import DateTimeField, Exists, OuterRef
+from django.utils import timezone
+
+from accounting.models import Journal, Transaction, start_of_day
+from core.models import Bill, Delivered, Payment, SupplierPayment
+
+# Rows fetched per database round trip, and rows written per chunk of output
+CHUNK_SIZE = 2000
+
+
+@dataclass(frozen=True)
+class Export:
+    """
+    A table that can be exported, as (header, field) pairs read with values_list
+    date_field and account_field are what the from/to and account filters apply to;
+    account_field is None when the account has to be found through the journal lines.
+    """
+    model: type
+    columns: tuple
+    date_field: str
+    account_field: str = None
+    ordering: tuple = ('id',)
+
+    @property
+    def header(self):
+        return [name for name, _ in self.columns]
+
+    def queryset(self, from_date=None, to_date=None, account=None):
+        queryset = self.model._default_manager.order_by(*self.ordering)
+        if isinstance(self.model._meta.get_field(self.date_field), DateTimeField):
+            # Compare against day boundaries so the date index can be used
+            first = start_of_day(from_date) if from_date else None
+            last = start_of_day(to_date + timedelta(days=1)) if to_date else None
+        else:
+            first = from_date
+            last = to_date + timedelta(days=1) if to_date else None
+        if first:
+            queryset = queryset.filter(**{f'{self.date_field}__gte': first})
+        if last:
+            queryset = queryset.filter(**{f'{self.date_field}__lt': last})
+
+        if account is not None:
+            if self.account_field:
+                queryset = queryset.filter(**{self.account_field: account})
+            else:
+                lines = Journal.objects.filter(transaction=OuterRef('pk'), account_id=account)
+                queryset = queryset.filter(Exists(lines))
+        return queryset
+
+    def rows(self, from_date=None, to_date=None, account=None, chunk_size=CHUNK_SIZE):
+        """Tuples in column order, fetched chunk by chunk so memory does not grow with the table"""
+        queryset = self.queryset(from_date, to_date, account)
+        return queryset.values_list(*(field for _, field in self.columns)).iterator(chunk_size=chunk_size)
+
+
+EXPORTS = {
+    'journals': Export(
+        Journal,
+        (('id', 'id'), ('date', 'posting_date'), ('transaction', 'transaction_id'),
+         ('account_code', 'account__code'), ('account', 'account__name'), ('description', 'description'),
+         ('ref', 'ref'), ('debit', 'debit'), ('credit', 'credit')),
+        date_field='posting_date', account_field='account_id', ordering=('posting_date', 'id'),
+    ),
+    'transactions': Export(
+        Transaction,
+        (('id', 'id'), ('date', 'date'), ('description', 'description'), ('reference', 'reference'),
+         ('approved', 'is_approved'), ('customer', 'customer_id'), ('supplier', 'supplier_id')),
+        date_field='date', ordering=('date', 'id'),
+    ),
+    'payments': Export(
+        Payment,
+        (('id', 'id'), ('date', 'date'), ('customer', 'customer_id'), ('customer_name', 'customer__customer_name'),
+         ('account_code', 'account__code'), ('account', 'account__name'), ('amount', 'amount'),
+         ('transaction', 'transaction_id')),
+        date_field='date', account_field='account_id', ordering=('date', 'id'),
+    ),
+    'deliveries': Export(
+        Delivered,
+        (('id', 'id'), ('date', 'created_at'), ('customer', 'customer_id'),
+         ('customer_name', 'customer__customer_name'), ('delivered', 'delivered'),
+         ('price_per_meter', 'price_per_meter'), ('amount', 'amount'), ('account_code', 'account__code'),
+         ('account', 'account__name'), ('transaction', 'transaction_id')),
+        date_field='created_at', account_field='account_id', ordering=('created_at', 'id'),
+    ),
+    'bills': Export(
+        Bill,
+        (('id', 'id'), ('date', 'created_at'), ('bill_no', 'bill_id'), ('supplier', 'supplier_id'),
+         ('supplier_name', 'supplier__company_name'), ('account_code', 'account__code'),
+         ('account', 'account__name'), ('amount', 'amount'), ('transaction', 'transaction_id')),
+        date_field='created_at', account_field='account_id', ordering=('created_at', 'id'),
+    ),
+    'supplier-payments': Export(
+        SupplierPayment,
+        (('id', 'id'), ('date', 'date'), ('supplier', 'supplier_id'), ('supplier_name', 'supplier__company_name'),
+         ('account_code', 'account__code'), ('account', 'account__name'), ('amount', 'amount'),
+         ('transaction', 'transaction_id')),
+        date_field='date', account_field='account_id', ordering=('date', 'id'),
+    ),
+}
+
+
+def _local(value):
+    return timezone.localtime(value) if timezone.is_aware(value) else value
+
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return _local(value).strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
+def csv_stream(header, rows, chunk_size=CHUNK_SIZE):
+    """CSV text in chunks of chunk_size rows, with a BOM so spreadsheets read it as UTF-8"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(header)
+    for n, row in enumerate(rows, 1):
+        writer.writerow([_csv_value(value) for value in row])
+        if n % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+# Minimal SpreadsheetML package: one sheet, inline strings, a date and a date-time style
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Export" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '<Relationship Id="rId2" Target="styles.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles"/>'
+        '</Relationships>'
+    ),
+    'xl/styles.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<numFmts count="2"><numFmt numFmtId="164" formatCode="yyyy-mm-dd"/>'
+        '<numFmt numFmtId="165" formatCode="yyyy-mm-dd hh:mm:ss"/></numFmts>'
+        '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+        '<fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'
+    ),
+}
+XLSX_SHEET = 'xl/worksheets/sheet1.xml'
+XLSX_SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+XLSX_SHEET_TAIL = '</sheetData></worksheet>'
+EPOCH = datetime(1899, 12, 30)
+# Control characters are not allowed in XML text
+ILLEGAL_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _xlsx_cell(value):
+    if value is None:
+        return '<c/>'
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, Decimal)):
+        return f'<c><v>{value}</v></c>'
+    if isinstance(value, datetime):
+        serial = (_local(value).replace(tzinfo=None) - EPOCH) / timedelta(days=1)
+        return f'<c s="2"><v>{serial:.8f}</v></c>'
+    if isinstance(value, date):
+        return f'<c s="1"><v>{(value - EPOCH.date()).days}</v></c>'
+    text = escape(ILLEGAL_XML.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values):
+    return '<row>' + ''.join(_xlsx_cell(value) for value in values) + '</row>'
+
+
+class _Sink(io.RawIOBase):
+    """Write-only stream that hands back what was written since the last drain"""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def xlsx_stream(header, rows, chunk_size=CHUNK_SIZE):
+    """
+    An .xlsx workbook in chunks, without holding the sheet in memory
+    The zip is written to a stream that cannot seek, so each entry carries its sizes
+    after the data and the sheet can be compressed as the rows arrive.
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as book:
+        for name, content in XLSX_PARTS.items():
+            book.writestr(name, content)
+        with book.open(XLSX_SHEET, 'w', force_zip64=True) as sheet:
+            sheet.write((XLSX_SHEET_HEAD + _xlsx_row(header)).encode())
+            lines = []
+            for row in rows:
+                lines.append(_xlsx_row(row))
+                if len(lines) == chunk_size:
+                    sheet.write(''.join(lines).encode())
+                    lines.clear()
+                    yield sink.drain()
+            sheet.write((''.join(lines) + XLSX_SHEET_TAIL).encode())
+    yield sink.drain()
+
+
+WRITERS = {
+    'csv': ('text/csv; charset=utf-8', csv_stream),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', xlsx_stream),
+}
@@ -0,0 +1,93 @@
+from base64 import b64decode, b64encode
+from binascii import Error as Base64Error
+from datetime import date
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class ListCursorPagination(CursorPagination):
+    """
+    Default pagination for the list endpoints
+    Cursors stay cheap on big tables (no OFFSET, no COUNT) and stable while rows are added.
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = 'id'
+
+
+class NewestFirstCursorPagination(ListCursorPagination):
+    ordering = '-id'
+
+
+class StatementPagination(PageNumberPagination):
+    """Page number pagination that carries the statement header next to the lines"""
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def get_paginated_response(self, data, header=None):
+        return Response({
+            **(header or {}),
+            'count': self.page.paginator.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class StatementCursorPagination(BasePagination):
+    """
+    Forward-only keyset pagination over statement lines
+    The cursor is the (date, id) of the last line on the page. Views read it with
+    get_position() before building the statement, so the running balance of the next
+    page can start from the balance at that line.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(size, self.max_page_size) if size > 0 else self.page_size
+
+    def get_position(self, request):
+        """(date, id) of the cursor in the request, None on the first page"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            day, pk = b64decode(encoded.encode('ascii')).decode('ascii').split('|')
+            return date.fromisoformat(day), int(pk)
+        except (Base64Error, TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        size = self.get_page_size(request)
+        rows = list(queryset[:size + 1])
+        self.has_next = len(rows) > size
+        self.page = rows[:size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        cursor = b64encode(f"{last['day'].isoformat()}|{last['id']}".encode('ascii')).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data, header=None):
+        return Response({
+            **(header or {}),
+            'next': self.get_next_link(),
+            'results': data,
+        })
@@ -0,0 +1,31 @@
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+
+def date_param(params, name):
+    """Read an optional YYYY-MM-DD query parameter, 400 when it is malformed"""
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: 'Enter a date as YYYY-MM-DD.'})
+    return parsed
+
+
+def statement_params(params):
+    """Read ?from=YYYY-MM-DD&to=YYYY-MM-DD, both optional"""
+    return {'from_date': date_param(params, 'from'), 'to_date': date_param(params, 'to')}
+
+
+def int_param(params, name):
+    """Read an optional integer query parameter, 400 when it is malformed"""
+    value = params.get(name)
+    if not value:
+        return None
+    if not value.isdigit():
+        raise ValidationError({name: 'Enter a whole number.'})
+    return int(value)
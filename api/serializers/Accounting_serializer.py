@@ -1,12 +1,26 @@
 from rest_framework import serializers
 
 from accounting.models import Accounting_Account
+from api.serializers.sparse import SparseFieldsMixin
 
 
-class AssetSerializer(serializers.ModelSerializer):
+class BalanceSerializer(serializers.Serializer):
+    debit = serializers.DecimalField(max_digits=15, decimal_places=2)
+    credit = serializers.DecimalField(max_digits=15, decimal_places=2)
+    balance = serializers.DecimalField(max_digits=15, decimal_places=2)
+    is_period_balance = serializers.BooleanField()
+
+
+class AssetSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    balance = serializers.SerializerMethodField()
+
     class Meta:
         model = Accounting_Account
-        fields = ['id', 'name', 'get_balance']
+        fields = ['id', 'name', 'balance']
+
+    def get_balance(self, account):
+        # balance_of comes from annotate_balances on the view's queryset
+        return BalanceSerializer(self.context['balance_of'](account)).data
 
 
 
@@ -3,10 +3,19 @@ def __getattr__(name):
     if name == 'CustomerSerializer':
         from .customer_srializer import CustomerSerializer
         return CustomerSerializer
+    elif name == 'SupplierSerializer':
+        from .supplier_serializer import SupplierSerializer
+        return SupplierSerializer
     elif name == 'AssetSerializer':
         from .Accounting_serializer import AssetSerializer
         return AssetSerializer
     elif name == 'PaymentSerializer':
         from .core_serializer import PaymentSerializer
         return PaymentSerializer
+    elif name == 'StatementLineSerializer':
+        from .statement_serializer import StatementLineSerializer
+        return StatementLineSerializer
+    elif name == 'StatementHeaderSerializer':
+        from .statement_serializer import StatementHeaderSerializer
+        return StatementHeaderSerializer
     raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -1,12 +1,19 @@
 from rest_framework import serializers
 
+from api.serializers.sparse import SparseFieldsMixin
 from core.models import Payment
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    customer_name = serializers.CharField(source='customer.customer_name', read_only=True)
+    account_name = serializers.CharField(source='account.name', read_only=True, default=None)
+    transaction_date = serializers.DateField(source='transaction.date', read_only=True, default=None)
+
     class Meta:
         model = Payment
-        fields = '__all__'
+        fields = ['id', 'customer', 'customer_name', 'account', 'account_name', 'amount', 'date',
+                  'transaction', 'transaction_date', 'created_at']
+        read_only_fields = ['transaction']
 
 
 
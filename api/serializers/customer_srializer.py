@@ -1,9 +1,10 @@
 from rest_framework import serializers
 
+from api.serializers.sparse import SparseFieldsMixin
 from core.models import Customer
 
 
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Customer
         fields = '__all__'
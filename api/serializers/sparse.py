@@ -0,0 +1,18 @@
+class SparseFieldsMixin:
+    """
+    Let clients pick the fields they need with ?fields=id,name
+    Unknown names are ignored; without the parameter every field is returned.
+    """
+    fields_query_param = 'fields'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None:
+            return
+        requested = request.query_params.get(self.fields_query_param)
+        if not requested:
+            return
+        wanted = {name.strip() for name in requested.split(',')}
+        for name in set(self.fields) - wanted:
+            self.fields.pop(name)
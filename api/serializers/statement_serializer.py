@@ -0,0 +1,20 @@
+from rest_framework import serializers
+
+
+class StatementLineSerializer(serializers.Serializer):
+    id = serializers.IntegerField(help_text='Transaction id')
+    date = serializers.DateField(source='day', help_text='Day of the document, not of its posting')
+    document = serializers.CharField()
+    document_id = serializers.IntegerField()
+    description = serializers.CharField()
+    reference = serializers.CharField()
+    debit = serializers.DecimalField(max_digits=15, decimal_places=2)
+    credit = serializers.DecimalField(max_digits=15, decimal_places=2)
+    balance = serializers.DecimalField(max_digits=15, decimal_places=2)
+
+
+class StatementHeaderSerializer(serializers.Serializer):
+    from_date = serializers.DateField(allow_null=True)
+    to_date = serializers.DateField(allow_null=True)
+    opening_balance = serializers.DecimalField(max_digits=15, decimal_places=2)
+    closing_balance = serializers.DecimalField(max_digits=15, decimal_places=2)
@@ -0,0 +1,9 @@
+from rest_framework import serializers
+
+from core.models import Supplier
+
+
+class SupplierSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Supplier
+        fields = '__all__'
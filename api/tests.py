@@ -1,3 +1,444 @@
-from django.test import TestCase
+import csv
+import io
+import zipfile
+from datetime import timedelta
+from decimal import Decimal
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from accounting.models import Category, Accounting_Account
+from core.models import Customer, Delivered, Payment, Supplier, Bill, SupplierPayment
+from core.profiling import QueryProfile, stats
+
+
+class CustomerStatementTests(TestCase):
+
+    def setUp(self):
+        receivable = Category.objects.create(name='Receivable', category_type='A')
+        sales = Category.objects.create(name='Sale', category_type='I')
+        self.account = Accounting_Account.objects.create(name='Receivable', code='AR', category=receivable)
+        revenue = Accounting_Account.objects.create(name='Sales', code='REV', category=sales)
+        self.customer = Customer.objects.create(customer_name='Acme', owner_name='Owner')
+
+        with self.settings(LEDGER_ACCOUNTS={'revenue': revenue.pk}):
+            for n in range(1, 4):
+                Delivered.objects.create(account=self.account, customer=self.customer, price_per_meter=10, delivered=n)
+                Payment.objects.create(account=self.account, customer=self.customer, amount=5, date=timezone.now())
+            # Another customer's delivery must not show up
+            other = Customer.objects.create(customer_name='Other', owner_name='Owner')
+            Delivered.objects.create(account=self.account, customer=other, price_per_meter=10, delivered=1)
+
+    def get(self, **params):
+        response = self.client.get(f'/api/customers/{self.customer.pk}/statement/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_running_balance(self):
+        statement = self.get()
+        self.assertEqual(statement['count'], 6)
+        self.assertEqual([line['document'] for line in statement['results'][:2]], ['delivery', 'payment'])
+        self.assertEqual([line['balance'] for line in statement['results']],
+                         ['10.00', '5.00', '25.00', '20.00', '50.00', '45.00'])
+        self.assertEqual(statement['closing_balance'], '45.00')
+
+    def test_opening_balance_and_pages(self):
+        ten_days_ago = timezone.now() - timedelta(days=10)
+        Delivered.objects.filter(pk=Delivered.objects.filter(customer=self.customer).order_by('id')[0].pk).update(
+            created_at=ten_days_ago)
+        Payment.objects.filter(pk=Payment.objects.filter(customer=self.customer).order_by('id')[0].pk).update(
+            date=ten_days_ago)
+
+        statement = self.get(**{'from': (timezone.localdate() - timedelta(days=1)).isoformat(),
+                                'page_size': 2, 'page': 2})
+        self.assertEqual(statement['opening_balance'], '5.00')
+        self.assertEqual(statement['count'], 4)
+        self.assertEqual([Decimal(line['balance']) for line in statement['results']],
+                         [Decimal('50.00'), Decimal('45.00')])
+
+    def test_backdated_payment_sits_on_its_own_day(self):
+        # Posted today, dated three days ago: the statement follows the payment's date
+        three_days_ago = timezone.now() - timedelta(days=3)
+        with self.settings(LEDGER_ACCOUNTS={'revenue': Accounting_Account.objects.get(code='REV').pk}):
+            Payment.objects.create(account=self.account, customer=self.customer, amount=2, date=three_days_ago)
+
+        statement = self.get()
+        first = statement['results'][0]
+        self.assertEqual((first['document'], first['date'], first['balance']),
+                         ('payment', timezone.localdate(three_days_ago).isoformat(), '-2.00'))
+        self.assertEqual(statement['results'][-1]['balance'], '43.00')
+
+        statement = self.get(**{'from': (timezone.localdate() - timedelta(days=1)).isoformat()})
+        self.assertEqual(statement['opening_balance'], '-2.00')
+        self.assertEqual(statement['count'], 6)
+
+        statement = self.get(**{'to': (timezone.localdate() - timedelta(days=1)).isoformat()})
+        self.assertEqual(statement['closing_balance'], '-2.00')
+        self.assertEqual(statement['count'], 1)
+
+    def test_bad_date(self):
+        response = self.client.get(f'/api/customers/{self.customer.pk}/statement/', {'from': '31/12/2025'})
+        self.assertEqual(response.status_code, 400)
+
+
+class SupplierStatementTests(TestCase):
+
+    def setUp(self):
+        payable = Category.objects.create(name='Payable', category_type='L')
+        cash = Category.objects.create(name='Cash', category_type='A')
+        purchases = Category.objects.create(name='Purchase', category_type='X')
+        self.payable = Accounting_Account.objects.create(name='Payable', code='AP', category=payable)
+        self.cash = Accounting_Account.objects.create(name='Cash', code='CASH', category=cash)
+        purchase = Accounting_Account.objects.create(name='Purchases', code='PUR', category=purchases)
+        self.supplier = Supplier.objects.create(company_name='Inks Ltd', product='Ink')
+
+        with self.settings(LEDGER_ACCOUNTS={'purchase': purchase.pk, 'payable': self.payable.pk}):
+            for amount in (100, 200, 300):
+                Bill.objects.create(account=self.payable, supplier=self.supplier, amount=amount)
+                SupplierPayment.objects.create(account=self.cash, supplier=self.supplier, amount=50)
+
+    def test_cursor_pages_keep_the_running_balance(self):
+        url = f'/api/suppliers/{self.supplier.pk}/statement/?page_size=4'
+        first = self.client.get(url).json()
+        self.assertEqual([line['balance'] for line in first['results']], ['100.00', '50.00', '250.00', '200.00'])
+        self.assertEqual(first['results'][0]['credit'], '100.00')
+
+        second = self.client.get(first['next']).json()
+        self.assertEqual([line['balance'] for line in second['results']], ['500.00', '450.00'])
+        self.assertIsNone(second['next'])
+        self.assertEqual(second['closing_balance'], '450.00')
+
+    def test_invalid_cursor(self):
+        response = self.client.get(f'/api/suppliers/{self.supplier.pk}/statement/', {'cursor': 'nope'})
+        self.assertEqual(response.status_code, 404)
+
+
+class AgingCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        assets = Category.objects.create(name='Receivable', category_type='A')
+        sales = Category.objects.create(name='Sale', category_type='I')
+        self.account = Accounting_Account.objects.create(name='Receivable', code='AR', category=assets)
+        self.revenue = Accounting_Account.objects.create(name='Sales', code='REV', category=sales)
+        self.customer = Customer.objects.create(customer_name='Acme', owner_name='Owner')
+        self.yesterday = timezone.localdate() - timedelta(days=1)
+
+    def aging(self, report):
+        response = self.client.get(f'/api/reports/{report}/', {'as_of': self.yesterday.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['totals']['31-60']
+
+    def test_backdated_payment_refreshes_a_closed_receivables_aging(self):
+        with self.settings(LEDGER_ACCOUNTS={'revenue': self.revenue.pk}), self.captureOnCommitCallbacks(execute=True):
+            delivery = Delivered.objects.create(account=self.account, customer=self.customer,
+                                                price_per_meter=100, delivered=1)
+        Delivered.objects.filter(pk=delivery.pk).update(created_at=timezone.now() - timedelta(days=45))
+        cache.clear()
+        self.assertEqual(self.aging('receivables-aging'), '100.00')
+
+        # Entered today, dated last week: its journals are posted today but the aging reads its date
+        with self.settings(LEDGER_ACCOUNTS={'revenue': self.revenue.pk}), self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.create(account=self.account, customer=self.customer, amount=100,
+                                   date=timezone.now() - timedelta(days=7))
+        self.assertEqual(self.aging('receivables-aging'), '0.00')
+
+    def test_backdated_supplier_documents_refresh_a_closed_payables_aging(self):
+        liabilities = Category.objects.create(name='Payable', category_type='L')
+        payable = Accounting_Account.objects.create(name='Payable', code='AP', category=liabilities)
+        supplier = Supplier.objects.create(company_name='Ink Co', product='Ink')
+        ledger = {'purchase': self.revenue.pk, 'payable': payable.pk}
+        with self.settings(LEDGER_ACCOUNTS=ledger), self.captureOnCommitCallbacks(execute=True):
+            old, wrong = [Bill.objects.create(account=payable, supplier=supplier, amount=amount) for amount in (100, 40)]
+        Bill.objects.filter(pk__in=[old.pk, wrong.pk]).update(created_at=timezone.now() - timedelta(days=45))
+        cache.clear()
+        self.assertEqual(self.aging('payables-aging'), '140.00')
+
+        # Deleting a bill dated in the past, and paying one with a past date
+        with self.settings(LEDGER_ACCOUNTS=ledger), self.captureOnCommitCallbacks(execute=True):
+            Bill.objects.get(pk=wrong.pk).delete()
+        self.assertEqual(self.aging('payables-aging'), '100.00')
+        with self.settings(LEDGER_ACCOUNTS=ledger), self.captureOnCommitCallbacks(execute=True):
+            SupplierPayment.bulk_post([SupplierPayment(supplier=supplier, account=self.account, amount=100,
+                                                       date=timezone.now() - timedelta(days=7))])
+        self.assertEqual(self.aging('payables-aging'), '0.00')
+
+
+class ListQueryBudgetTests(TestCase):
+    """The list endpoints run a fixed number of queries however many rows there are"""
+
+    budgets = {
+        '/api/customers/': 1,
+        '/api/payment-list/': 1,
+        # the ETag's running balances, accounts with their balances, plus the nearest snapshot when dated
+        '/api/cash-bank/': 2,
+        '/api/cash-bank/?as_of=2030-01-01': 3,
+    }
+
+    def setUp(self):
+        cash = Category.objects.create(pk=2, name='Cash', category_type='A')
+        sales = Category.objects.create(name='Sale', category_type='I')
+        self.account = Accounting_Account.objects.create(name='Cash', code='CASH', category=cash)
+        self.revenue = Accounting_Account.objects.create(name='Sales', code='REV', category=sales)
+
+    def add_rows(self, count):
+        with self.settings(LEDGER_ACCOUNTS={'revenue': self.revenue.pk}):
+            start = Customer.objects.count()
+            for n in range(start, start + count):
+                customer = Customer.objects.create(customer_name=f'Customer {n}', owner_name='Owner')
+                account = Accounting_Account.objects.create(name=f'Bank {n}', code=f'BANK{n}',
+                                                            category_id=2)
+                Payment.objects.create(account=account, customer=customer, amount=10, date=timezone.now())
+
+    def assertBudget(self, url):
+        with self.assertNumQueries(self.budgets[url]):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_budgets_hold_as_rows_grow(self):
+        for count in (2, 20):
+            self.add_rows(count)
+            for url in self.budgets:
+                with self.subTest(url=url, rows=count):
+                    self.assertBudget(url)
+
+    def test_pages_and_sparse_fields(self):
+        self.add_rows(3)
+        page = self.client.get('/api/payment-list/', {'page_size': 2, 'fields': 'id,customer_name'}).json()
+        self.assertEqual(len(page['results']), 2)
+        self.assertEqual(set(page['results'][0]), {'id', 'customer_name'})
+
+        rest = self.client.get(page['next']).json()
+        self.assertEqual(len(rest['results']), 1)
+        self.assertIsNone(rest['next'])
+
+
+class CashBankBalanceTests(TestCase):
+
+    def setUp(self):
+        cash = Category.objects.create(pk=2, name='Cash', category_type='A')
+        sales = Category.objects.create(name='Sale', category_type='I')
+        self.account = Accounting_Account.objects.create(name='Cash', code='CASH', category=cash,
+                                                         opening_balance=Decimal('5.00'))
+        revenue = Accounting_Account.objects.create(name='Sales', code='REV', category=sales)
+        customer = Customer.objects.create(customer_name='Acme', owner_name='Owner')
+        with self.settings(LEDGER_ACCOUNTS={'revenue': revenue.pk}):
+            Payment.objects.create(account=self.account, customer=customer, amount=20, date=timezone.now())
+
+    def test_balance_matches_get_balance(self):
+        [row] = self.client.get('/api/cash-bank/').json()['results']
+        self.assertEqual(row['balance']['balance'], '25.00')
+        self.assertEqual(Decimal(row['balance']['balance']), self.account.get_balance()['balance'])
+
+        yesterday = (timezone.localdate() - timedelta(days=1)).isoformat()
+        [row] = self.client.get('/api/cash-bank/', {'as_of': yesterday}).json()['results']
+        self.assertEqual(row['balance']['debit'], '0.00')
+        self.assertTrue(row['balance']['is_period_balance'])
+
+    def test_unchanged_ledger_answers_not_modified(self):
+        response = self.client.get('/api/cash-bank/')
+        tag = response['ETag']
+        self.assertEqual(self.client.get('/api/cash-bank/', HTTP_IF_NONE_MATCH=tag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Accounting_Account.objects.filter(pk=self.account.pk).get().save()
+        self.assertEqual(self.client.get('/api/cash-bank/', HTTP_IF_NONE_MATCH=tag).status_code, 200)
+
+    def test_posting_in_another_worker_changes_the_etag(self):
+        yesterday = (timezone.localdate() - timedelta(days=1)).isoformat()
+        tags = {query: self.client.get(f'/api/cash-bank/{query}')['ETag'] for query in ('', f'?as_of={yesterday}')}
+
+        # Another process posted: the ledger version in this process's cache does not move
+        customer = Customer.objects.get()
+        with self.settings(LEDGER_ACCOUNTS={'revenue': Accounting_Account.objects.get(code='REV').pk}):
+            Payment.objects.create(account=self.account, customer=customer, amount=5,
+                                   date=timezone.now() - timedelta(days=2))
+        for query, tag in tags.items():
+            with self.subTest(query):
+                self.assertEqual(self.client.get(f'/api/cash-bank/{query}', HTTP_IF_NONE_MATCH=tag).status_code, 200)
+
+
+class DataTablesTests(TestCase):
+
+    def setUp(self):
+        cash = Category.objects.create(name='Cash', category_type='A')
+        sales = Category.objects.create(name='Sale', category_type='I')
+        account = Accounting_Account.objects.create(name='Cash', code='CASH', category=cash)
+        revenue = Accounting_Account.objects.create(name='Sales', code='REV', category=sales)
+        names = ['Beta Prints', 'Alpha Textiles', 'Alpine Fabrics', 'Gamma Mills']
+        self.customers = [Customer.objects.create(customer_name=name, owner_name='Owner') for name in names]
+        with self.settings(LEDGER_ACCOUNTS={'revenue': revenue.pk}):
+            for days_ago, customer in enumerate(self.customers):
+                Payment.objects.create(account=account, customer=customer, amount=10 + days_ago,
+                                       date=timezone.now() - timedelta(days=days_ago * 10))
+
+    def grid(self, url, columns, **params):
+        query = {'draw': '3', **params}
+        for n, name in enumerate(columns):
+            query[f'columns[{n}][data]'] = name
+        response = self.client.get(url, query)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_search_sort_and_page(self):
+        table = self.grid('/api/customers/datatable/', ['id', 'customer_name', 'owner_name'], **{
+            'search[value]': 'alp', 'order[0][column]': '1', 'order[0][dir]': 'asc', 'start': '0', 'length': '1',
+        })
+        self.assertEqual(table['draw'], 3)
+        self.assertEqual(table['recordsTotal'], 4)
+        self.assertEqual(table['recordsFiltered'], 2)
+        self.assertEqual([row['customer_name'] for row in table['data']], ['Alpha Textiles'])
+
+    def test_column_filters_and_query_count(self):
+        since = (timezone.localdate() - timedelta(days=15)).isoformat()
+        with self.assertNumQueries(3):
+            table = self.grid('/api/payment-list/datatable/', ['id', 'date', 'customer_name'], **{
+                'columns[1][search][value]': f'{since}|',
+                'order[0][column]': '1', 'order[0][dir]': 'desc',
+            })
+        self.assertEqual(table['recordsFiltered'], 2)
+        self.assertEqual([row['customer_name'] for row in table['data']], ['Beta Prints', 'Alpha Textiles'])
+
+    def test_name_search_seeks_the_search_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('the query plan below is SQLite syntax')
+        plan = Customer.objects.filter(customer_name__istartswith='alp').explain()
+        self.assertIn('SEARCH core_customer USING', plan)
+        self.assertIn('customer_name_search_idx', plan)
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        cash = Category.objects.create(name='Cash', category_type='A')
+        sales = Category.objects.create(name='Sale', category_type='I')
+        self.cash = Accounting_Account.objects.create(name='Cash', code='CASH', category=cash)
+        self.bank = Accounting_Account.objects.create(name='Bank', code='BANK', category=cash)
+        revenue = Accounting_Account.objects.create(name='Sales', code='REV', category=sales)
+        customer = Customer.objects.create(customer_name='Acme, "North"', owner_name='Owner')
+        with self.settings(LEDGER_ACCOUNTS={'revenue': revenue.pk}):
+            for days_ago, account in enumerate([self.cash, self.bank, self.cash]):
+                Payment.objects.create(account=account, customer=customer, amount=Decimal('10.50'),
+                                       date=timezone.now() - timedelta(days=days_ago * 10))
+        self.client.force_login(User.objects.create_user('staff', password='secret', is_staff=True))
+
+    def export(self, path, **params):
+        response = self.client.get(f'/api/exports/{path}', params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_csv_with_filters(self):
+        since = (timezone.localdate() - timedelta(days=15)).isoformat()
+        content = self.export('payments.csv', account=self.cash.pk, **{'from': since}).decode('utf-8-sig')
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(rows[0][:4], ['id', 'date', 'customer', 'customer_name'])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][3], 'Acme, "North"')
+        self.assertEqual(rows[1][6], '10.50')
+
+    def test_account_filter_through_journal_lines(self):
+        content = self.export('transactions.csv', account=self.bank.pk).decode('utf-8-sig')
+        self.assertEqual(len(content.splitlines()), 2)
+
+    def test_xlsx_is_a_valid_workbook(self):
+        content = self.export('journals.xlsx')
+        with zipfile.ZipFile(io.BytesIO(content)) as book:
+            self.assertIsNone(book.testzip())
+            sheet = ElementTree.fromstring(book.read('xl/worksheets/sheet1.xml'))
+        rows = sheet.findall('.//{http://schemas.openxmlformats.org/spreadsheetml/2006/main}row')
+        self.assertEqual(len(rows), 7)
+
+    def test_backdated_documents_are_exported_in_date_order(self):
+        customer = Customer.objects.get()
+        with self.settings(LEDGER_ACCOUNTS={'revenue': Accounting_Account.objects.get(code='REV').pk}):
+            today = Delivered.objects.create(account=self.cash, customer=customer, price_per_meter=10, delivered=1)
+            backdated = Delivered(account=self.cash, customer=customer, price_per_meter=10, delivered=2,
+                                  created_at=timezone.now() - timedelta(days=5))
+            backdated.prepare_posting()
+            Delivered.bulk_post([backdated])
+        rows = list(csv.reader(io.StringIO(self.export('deliveries.csv').decode('utf-8-sig'))))
+        self.assertEqual([row[0] for row in rows[1:]], [str(backdated.pk), str(today.pk)])
+
+    def test_rejects_unknown_tables_and_bad_filters(self):
+        self.assertEqual(self.client.get('/api/exports/customers.csv').status_code, 404)
+        self.assertEqual(self.client.get('/api/exports/journals.pdf').status_code, 404)
+        self.assertEqual(self.client.get('/api/exports/journals.csv', {'account': 'x'}).status_code, 400)
+
+    def test_staff_only(self):
+        self.client.logout()
+        self.assertEqual(self.client.get('/api/exports/journals.csv').status_code, 403)
+        self.client.force_login(User.objects.create_user('clerk', password='secret'))
+        self.assertEqual(self.client.get('/api/exports/journals.csv').status_code, 403)
+
+
+class CsvImportUploadTests(TestCase):
+
+    def test_staff_only(self):
+        upload = io.BytesIO(b"customer_name,owner_name\nAcme,Owner\n")
+        upload.name = 'customers.csv'
+        self.assertEqual(self.client.post('/api/imports/customers/', {'file': upload}).status_code, 403)
+        self.assertFalse(Customer.objects.exists())
+
+    def test_upload_reports_row_errors(self):
+        self.client.force_login(User.objects.create_user('staff', password='secret', is_staff=True))
+        cash = Accounting_Account.objects.create(
+            name='Cash', code='CASH', category=Category.objects.create(name='Cash', category_type='A'))
+        revenue = Accounting_Account.objects.create(
+            name='Sales', code='REV', category=Category.objects.create(name='Sale', category_type='I'))
+        Customer.objects.create(customer_name='Acme', owner_name='Owner')
+        upload = io.BytesIO(b"date,customer,account,amount\n2024-01-15,Acme,CASH,10\n2024-01-16,Acme,CASH,x\n")
+        upload.name = 'payments.csv'
+
+        with self.settings(LEDGER_ACCOUNTS={'revenue': revenue.pk}):
+            response = self.client.post('/api/imports/payments/', {'file': upload})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual(response.json()['errors'], [{'line': 3, 'message': "amount must be a number, got 'x'"}])
+        self.assertEqual(Payment.objects.get().account, cash)
+        self.assertEqual(self.client.post('/api/imports/suppliers/', {}).status_code, 404)
+
+
+@override_settings(QUERY_PROFILER=True, QUERY_PROFILER_SLOW_MS=10_000, QUERY_PROFILER_DUPLICATES=3)
+class QueryProfilerTests(TestCase):
+
+    def setUp(self):
+        stats.reset()
+        self.addCleanup(stats.reset)
+        self.customers = [Customer.objects.create(customer_name=f'Customer {n}', owner_name='Owner')
+                          for n in range(3)]
+
+    def test_repeated_statements_are_traced_to_their_caller(self):
+        profile = QueryProfile()
+        with connection.execute_wrapper(profile):
+            for customer in self.customers:
+                Customer.objects.get(pk=customer.pk)
+            Customer.objects.filter(pk__in=[1, 2]).count()
+            Customer.objects.filter(pk__in=[1, 2, 3]).count()
+
+        [(sql, executions, location), (_, in_lists, _)] = profile.duplicates()
+        self.assertEqual((profile.count, executions, in_lists), (5, 3, 2))
+        self.assertIn('FROM "core_customer"', sql)
+        self.assertTrue(location.startswith('api/tests.py:'), location)
+
+    def test_stats_per_url_name_for_staff(self):
+        with self.assertLogs('core.profiling', 'WARNING') as logs:
+            with self.settings(QUERY_PROFILER_MAX_QUERIES=0):
+                self.client.get('/api/customers/')
+        self.assertIn('GET /api/customers/', logs.output[0])
+
+        self.assertEqual(self.client.get('/api/profiler/queries/').status_code, 403)
+        staff = User.objects.create_user('staff', password='secret', is_staff=True)
+        self.client.force_login(staff)
+        views = self.client.get('/api/profiler/queries/').json()['views']
+        [customers] = [view for view in views if view['name'] == 'api.views.customer_views.CustomerList']
+        self.assertEqual((customers['requests'], customers['slow_requests'], customers['max_queries']), (1, 1, 1))
+
+        self.assertEqual(self.client.delete('/api/profiler/queries/').status_code, 204)
+        self.assertEqual([view['name'] for view in self.client.get('/api/profiler/queries/').json()['views']],
+                         ['api.views.profiler_views.QueryProfileStats'])
@@ -2,18 +2,32 @@
 from rest_framework import routers
 from django.urls import path
 from rest_framework.urlpatterns import format_suffix_patterns
-from .views import CustomerList, CustomerDetail, AssetList, PaymentList
+from .views import CustomerList, CustomerDetail, CustomerStatement, CustomerTable, SupplierStatement, AssetList, \
+    PaymentList, PaymentTable, ComparativeIncomeStatement, ReceivablesAging, PayablesAging, LedgerExport, \
+    CsvImport, QueryProfileStats
 from django.views.decorators.csrf import csrf_exempt
 
 router = routers.DefaultRouter(trailing_slash=False)
 urlpatterns = [
     path('customers/', csrf_exempt(CustomerList.as_view()) ),
     path('customers/<int:pk>/', CustomerDetail.as_view()),
+    path('customers/datatable/', CustomerTable.as_view()),
+    path('customers/<int:pk>/statement/', CustomerStatement.as_view()),
+    path('suppliers/<int:pk>/statement/', SupplierStatement.as_view()),
 
 
     path('cash-bank/', AssetList.as_view()),
 
     path('payment-list/', PaymentList.as_view()),
+    path('payment-list/datatable/', PaymentTable.as_view()),
+
+    path('reports/comparative-income-statement/', ComparativeIncomeStatement.as_view()),
+    path('reports/receivables-aging/', ReceivablesAging.as_view()),
+    path('reports/payables-aging/', PayablesAging.as_view()),
+
+    path('exports/<slug:dataset>.<slug:file_format>', LedgerExport.as_view()),
+    path('imports/<slug:kind>/', CsvImport.as_view()),
+    path('profiler/queries/', QueryProfileStats.as_view()),
 ]
 
 urlpatterns = format_suffix_patterns(urlpatterns)
\ No newline at end of file
@@ -1,11 +1,26 @@
-from .customer_views import CustomerDetail, CustomerList
+from .customer_views import CustomerDetail, CustomerList, CustomerStatement, CustomerTable
 from .asset_views  import AssetList
-from .acc_views import PaymentList
+from .acc_views import PaymentList, PaymentTable
+from .supplier_views import SupplierStatement
+from .export_views import LedgerExport
+from .import_views import CsvImport
+from .report_views import ComparativeIncomeStatement, ReceivablesAging, PayablesAging
+from .profiler_views import QueryProfileStats
 
 __all__ = ['CustomerDetail',
            'CustomerList',
+           'CustomerStatement',
+           'CustomerTable',
+           'SupplierStatement',
 
            'AssetList',
-           'PaymentList'
+           'PaymentList',
+           'PaymentTable',
+           'ComparativeIncomeStatement',
+           'ReceivablesAging',
+           'PayablesAging',
+           'LedgerExport',
+           'CsvImport',
+           'QueryProfileStats',
 
 ]
\ No newline at end of file
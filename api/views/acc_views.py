@@ -1,9 +1,27 @@
 from api.serializers.core_serializer import PaymentSerializer
 from core.models import Payment
 from rest_framework import generics
+from api.datatables import Column, DataTablesView
+from api.pagination import NewestFirstCursorPagination
 from api.serializers import PaymentSerializer
 
 class PaymentList(generics.ListCreateAPIView):
     #queryset = Accounting_Account.objects.all()
-    queryset = Payment.objects.all()
-    serializer_class = PaymentSerializer
\ No newline at end of file
+    queryset = Payment.objects.select_related('customer', 'account', 'transaction')
+    serializer_class = PaymentSerializer
+    pagination_class = NewestFirstCursorPagination
+
+
+class PaymentTable(DataTablesView):
+    """Server-side processing for the payment grid"""
+    queryset = Payment.objects.select_related('customer', 'account', 'transaction')
+    serializer_class = PaymentSerializer
+    columns = [
+        Column('id', 'id', kind='number'),
+        Column('date', 'date', kind='date'),
+        Column('customer', 'customer_id', kind='number'),
+        Column('customer_name', 'customer__customer_name'),
+        Column('account_name', 'account__name'),
+        Column('amount', 'amount', kind='number', searchable=False),
+    ]
+    default_order = ['-date', '-id']
@@ -1,18 +1,62 @@
-from unicodedata import category
+import hashlib
+from datetime import datetime, time
 
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import etag
+
+from accounting.balances import annotate_balances
 from accounting.models import Accounting_Account
 from rest_framework import generics
+from api.pagination import ListCursorPagination
+from api.params import date_param
 from api.serializers import AssetSerializer
 
+
+# Bank and cash
+ASSET_CATEGORY_IDS = [2, 5]
+
+
+def asset_accounts():
+    return Accounting_Account.objects.filter(category__id__in=ASSET_CATEGORY_IDS)
+
+
+def ledger_etag(request, *args, **kwargs):
+    """
+    Same accounts, same running balances and same query string, same response
+    Read from the database rather than the per-process ledger version, so every worker agrees.
+    Any journal movement stamps the account's running balance, dated balances included.
+    """
+    state = asset_accounts().order_by('pk').values_list(
+        'pk', 'name', 'opening_balance', 'category__category_type',
+        'running_balance__total_debit', 'running_balance__total_credit', 'running_balance__updated_at',
+    )
+    return hashlib.md5(f"{list(state)}|{request.get_full_path()}".encode()).hexdigest()
+
+
+@method_decorator(etag(ledger_etag), name='get')
 class AssetList(generics.ListAPIView):
+    """
+    Cash and bank accounts with their balances
+    ?as_of=2025-06-30 for the balance at the end of that day; unchanged ledgers answer 304
+    """
     #queryset = Accounting_Account.objects.all()
     serializer_class = AssetSerializer
+    pagination_class = ListCursorPagination
 
     def get_queryset(self):
         """"
         This view should return a list of all the purchases
         for the currently authenticated user.
         """
-        category_ids = [ 2, 5] # bank and cash
-        return Accounting_Account.objects.filter(category__id__in=category_ids)
+        accounts = asset_accounts().select_related('category')
+
+        as_of = date_param(self.request.query_params, 'as_of')
+        to_date = timezone.make_aware(datetime.combine(as_of, time.max)) if as_of else None
+        accounts, self.balance_of = annotate_balances(accounts, to_date=to_date)
+        return accounts
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['balance_of'] = self.balance_of
+        return context
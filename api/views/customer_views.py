@@ -1,12 +1,51 @@
+from django.shortcuts import get_object_or_404
 from core.models import Customer
+from core.statements import customer_statement
 from rest_framework import generics
-from api.serializers import CustomerSerializer
+from api.datatables import Column, DataTablesView
+from api.pagination import ListCursorPagination, StatementPagination
+from api.params import statement_params
+from api.serializers import CustomerSerializer, StatementHeaderSerializer, StatementLineSerializer
 
 class CustomerList(generics.ListCreateAPIView):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
+    pagination_class = ListCursorPagination
 
 
 class CustomerDetail(generics.RetrieveUpdateDestroyAPIView):
     queryset = Customer.objects.all()
-    serializer_class = CustomerSerializer
\ No newline at end of file
+    serializer_class = CustomerSerializer
+
+
+class CustomerTable(DataTablesView):
+    """Server-side processing for the customer grid"""
+    queryset = Customer.objects.all()
+    serializer_class = CustomerSerializer
+    columns = [
+        Column('id', 'id', kind='number'),
+        Column('customer_name', 'customer_name'),
+        Column('owner_name', 'owner_name'),
+        Column('price_per_meter', 'price_per_meter', kind='number'),
+        Column('remarks', 'remarks', orderable=False),
+    ]
+
+
+class CustomerStatement(generics.ListAPIView):
+    """
+    Deliveries and payments of one customer with opening, running and closing balances
+    ?from=2025-01-01&to=2025-03-31&page=2&page_size=100
+    """
+    serializer_class = StatementLineSerializer
+    pagination_class = StatementPagination
+
+    def get_queryset(self):
+        customer = get_object_or_404(Customer, pk=self.kwargs['pk'])
+        self.statement = customer_statement(customer, **statement_params(self.request.query_params))
+        return self.statement['lines']
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data, header={
+            'customer': CustomerSerializer(self.statement['customer']).data,
+            **StatementHeaderSerializer(self.statement).data,
+        })
@@ -0,0 +1,28 @@
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import IsAdminUser
+from rest_framework.views import APIView
+
+from api.exports import EXPORTS, WRITERS
+from api.params import int_param, statement_params
+
+
+class LedgerExport(APIView):
+    """
+    Stream a table as CSV or XLSX, e.g. /api/exports/journals.csv?from=2025-01-01&to=2025-03-31&account=4
+    Rows are read chunk by chunk and written as they arrive, so memory stays flat however long the export is.
+    Staff only: the whole ledger can be read through it.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, dataset, file_format):
+        export = EXPORTS.get(dataset)
+        if export is None or file_format not in WRITERS:
+            raise NotFound()
+        params = request.query_params
+        rows = export.rows(account=int_param(params, 'account'), **statement_params(params))
+
+        content_type, writer = WRITERS[file_format]
+        response = StreamingHttpResponse(writer(export.header, rows), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{dataset}.{file_format}"'
+        return response
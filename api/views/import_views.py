@@ -0,0 +1,39 @@
+import io
+
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.imports import IMPORTERS
+
+
+class CsvImport(APIView):
+    """
+    Upload a CSV of customers, deliveries or payments as the multipart field 'file', staff only
+    The file is read as a stream and imported in chunks; rows that fail are listed with their line numbers.
+    """
+    parser_classes = [MultiPartParser]
+    permission_classes = [IsAdminUser]
+
+    def post(self, request, kind, format=None):
+        importer_class = IMPORTERS.get(kind)
+        if importer_class is None:
+            raise NotFound()
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'file': 'Upload a CSV file.'})
+
+        lines = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        try:
+            result = importer_class().run(lines)
+        except (UnicodeDecodeError, ValueError) as e:
+            raise ValidationError({'file': str(e)})
+
+        return Response({
+            'rows': result.rows,
+            'created': result.created,
+            'failed': result.failed,
+            'errors': [{'line': line, 'message': message} for line, message in result.errors],
+        })
@@ -0,0 +1,24 @@
+import os
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.profiling import stats
+
+
+class QueryProfileStats(APIView):
+    """
+    SQL profile per URL name collected by core.profiling.QueryProfilerMiddleware, staff only
+    The totals belong to the process answering the request; DELETE starts them over.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, format=None):
+        return Response({'enabled': settings.QUERY_PROFILER, 'pid': os.getpid(), 'views': stats.snapshot()})
+
+    def delete(self, request, format=None):
+        stats.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
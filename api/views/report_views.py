@@ -0,0 +1,73 @@
+from accounting.financial_reports import generate_comparative_income_statement
+from accounting.report_cache import cached_report
+from accounting.views import comparative_report_params
+from api.params import date_param
+from core.aging import payables_aging, receivables_aging
+from rest_framework import serializers, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+
+class ComparativeIncomeStatement(APIView):
+    """
+    Income and expenses per account bucketed by month, quarter or year
+    ?year=2025&period=quarter or ?from=2025-01-01&to=2025-06-30&period=month
+    """
+
+    def get(self, request, format=None):
+        try:
+            report = cached_report(
+                'comparative_income_statement',
+                generate_comparative_income_statement,
+                **comparative_report_params(request.query_params)
+            )
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report)
+
+
+money = serializers.DecimalField(max_digits=15, decimal_places=2).to_representation
+
+
+def aging_response(report, party_fields):
+    """Aging report as JSON, one object per party with the buckets keyed by label"""
+    return Response({
+        'as_of_date': report.as_of_date,
+        'buckets': report.labels,
+        'rows': [
+            {
+                **{name: getattr(row.party, name) for name in party_fields},
+                'buckets': {label: money(amount) for label, amount in zip(report.labels, row.buckets)},
+                'unapplied': money(row.unapplied),
+                'total': money(row.total),
+            }
+            for row in report.rows
+        ],
+        'totals': {label: money(amount) for label, amount in zip(report.labels, report.totals)},
+        'total_unapplied': money(report.total_unapplied),
+        'total': money(report.total),
+    })
+
+
+class ReceivablesAging(APIView):
+    """
+    Open deliveries per customer in 0-30, 31-60, 61-90 and 90+ day buckets
+    ?as_of=2025-06-30, defaults to today
+    """
+
+    def get(self, request, format=None):
+        report = cached_report('receivables_aging', receivables_aging,
+                               as_of_date=date_param(request.query_params, 'as_of'))
+        return aging_response(report, ['id', 'customer_name'])
+
+
+class PayablesAging(APIView):
+    """
+    Open bills per supplier in 0-30, 31-60, 61-90 and 90+ day buckets
+    ?as_of=2025-06-30, defaults to today
+    """
+
+    def get(self, request, format=None):
+        report = cached_report('payables_aging', payables_aging,
+                               as_of_date=date_param(request.query_params, 'as_of'))
+        return aging_response(report, ['id', 'company_name'])
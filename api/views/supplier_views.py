@@ -0,0 +1,31 @@
+from django.shortcuts import get_object_or_404
+from core.models import Supplier
+from core.statements import supplier_statement
+from rest_framework import generics
+from api.pagination import StatementCursorPagination
+from api.params import statement_params
+from api.serializers import SupplierSerializer, StatementHeaderSerializer, StatementLineSerializer
+
+
+class SupplierStatement(generics.ListAPIView):
+    """
+    Bills and payments of one supplier with opening, running and closing balances
+    ?from=2025-01-01&to=2025-03-31&page_size=100, then follow `next`
+    """
+    serializer_class = StatementLineSerializer
+    pagination_class = StatementCursorPagination
+
+    def get_queryset(self):
+        supplier = get_object_or_404(Supplier, pk=self.kwargs['pk'])
+        self.statement = supplier_statement(
+            supplier,
+            after=self.paginator.get_position(self.request),
+            **statement_params(self.request.query_params)
+        )
+        return self.statement['lines']
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data, header={
+            'supplier': SupplierSerializer(self.statement['supplier']).data,
+            **StatementHeaderSerializer(self.statement).data,
+        })
@@ -0,0 +1,175 @@
+from dataclasses import dataclass, field
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.utils import timezone
+
+from accounting.models import start_of_day
+from core.models import Customer, Delivered, Payment, Supplier, Bill, SupplierPayment
+
+ZERO = Decimal('0')
+CENT = Decimal('0.01')
+
+# (label, oldest age in days); the last bucket has no upper bound
+BUCKETS = [
+    ('0-30', 30),
+    ('31-60', 60),
+    ('61-90', 90),
+    ('90+', None),
+]
+
+
+@dataclass
+class AgingRow:
+    party: object
+    buckets: list
+    unapplied: Decimal = ZERO
+
+    @property
+    def total(self):
+        """Open amount owed after unapplied payments"""
+        return sum(self.buckets, ZERO) - self.unapplied
+
+
+@dataclass
+class AgingReport:
+    as_of_date: object
+    labels: list
+    rows: list = field(default_factory=list)
+
+    @property
+    def totals(self):
+        return [sum((row.buckets[n] for row in self.rows), ZERO) for n in range(len(self.labels))]
+
+    @property
+    def total_unapplied(self):
+        return sum((row.unapplied for row in self.rows), ZERO)
+
+    @property
+    def total(self):
+        return sum((row.total for row in self.rows), ZERO)
+
+
+def _decimal(value):
+    return Decimal(str(value or 0)).quantize(CENT)
+
+
+def _bucket_conditions(as_of):
+    """SQL condition and parameters on charge_date for every bucket, newest first"""
+    adapt = connection.ops.adapt_datetimefield_value
+    conditions = []
+    newer = None
+    for _, oldest in BUCKETS:
+        parts, params = [], []
+        lower = None
+        if oldest is not None:
+            lower = adapt(start_of_day(as_of - timedelta(days=oldest)))
+            parts.append('charge_date >= %s')
+            params.append(lower)
+        if newer is not None:
+            parts.append('charge_date < %s')
+            params.append(newer)
+        conditions.append((' AND '.join(parts), params))
+        newer = lower
+    return conditions
+
+
+def _aging_sql(party, charges, charge_date, settlements, settlement_date, conditions):
+    """
+    Grouped FIFO aging over two document tables
+    Settlements are applied to the oldest charges first: a charge is open by however much
+    of it lies beyond the party's total settlements on the running sum of its charges.
+    The open amounts are then bucketed by charge date and summed per party.
+    """
+    quote = connection.ops.quote_name
+    party_column = quote(f'{party}_id')
+    bucket_sums = ', '.join(f"SUM(CASE WHEN {condition} THEN open_amount ELSE 0 END)" for condition, _ in conditions)
+    return f"""
+        WITH settled AS (
+            SELECT {party_column} AS party_id, SUM(amount) AS settled
+            FROM {quote(settlements._meta.db_table)}
+            WHERE {quote(settlement_date)} < %s
+            GROUP BY {party_column}
+        ),
+        charges AS (
+            SELECT {party_column} AS party_id, {quote(charge_date)} AS charge_date, amount,
+                   SUM(amount) OVER (PARTITION BY {party_column} ORDER BY {quote(charge_date)}, id) AS running
+            FROM {quote(charges._meta.db_table)}
+            WHERE {quote(charge_date)} < %s
+        ),
+        open_charges AS (
+            SELECT c.party_id, c.charge_date,
+                   CASE
+                       WHEN c.running - COALESCE(s.settled, 0) <= 0 THEN 0
+                       WHEN c.running - COALESCE(s.settled, 0) < c.amount THEN c.running - COALESCE(s.settled, 0)
+                       ELSE c.amount
+                   END AS open_amount
+            FROM charges c LEFT JOIN settled s ON s.party_id = c.party_id
+        ),
+        charged AS (
+            SELECT party_id, SUM(amount) AS charged FROM charges GROUP BY party_id
+        )
+        SELECT party_id, {bucket_sums}, 0 AS unapplied
+        FROM open_charges
+        GROUP BY party_id
+        HAVING SUM(open_amount) <> 0
+        UNION ALL
+        SELECT s.party_id, {', '.join('0' for _ in conditions)}, s.settled - COALESCE(c.charged, 0)
+        FROM settled s LEFT JOIN charged c ON c.party_id = s.party_id
+        WHERE s.settled > COALESCE(c.charged, 0)
+    """
+
+
+def aging(party_model, party, charges, charge_date, settlements, settlement_date, as_of_date=None):
+    """
+    Aging of open charges per party, with one grouped query
+    :param party_model: Customer or Supplier
+    :param party: Name of the party foreign key on both document models
+    :param charges: Model of the documents that increase what is owed
+    :param charge_date: Date field of charges that the age counts from
+    :param settlements: Model of the documents that reduce it
+    :param settlement_date: Date field of settlements
+    :param as_of_date: Local date to age at, defaults to today
+    :return: AgingReport with one AgingRow per party that has an open balance or unapplied payments
+    """
+    as_of = as_of_date or timezone.localdate()
+    end = connection.ops.adapt_datetimefield_value(start_of_day(as_of + timedelta(days=1)))
+    conditions = _bucket_conditions(as_of)
+
+    params = [end, end]
+    for _, bucket_params in conditions:
+        params += bucket_params
+
+    with connection.cursor() as cursor:
+        cursor.execute(_aging_sql(party, charges, charge_date, settlements, settlement_date, conditions), params)
+        results = cursor.fetchall()
+
+    totals = {}
+    for party_id, *amounts, unapplied in results:
+        buckets, credit = totals.get(party_id, ([ZERO] * len(BUCKETS), ZERO))
+        totals[party_id] = (
+            [total + _decimal(amount) for total, amount in zip(buckets, amounts)],
+            credit + _decimal(unapplied),
+        )
+
+    parties = party_model.objects.in_bulk(totals.keys())
+    rows = [AgingRow(parties[pk], buckets, unapplied) for pk, (buckets, unapplied) in totals.items()]
+    rows.sort(key=lambda row: str(row.party))
+    return AgingReport(as_of_date=as_of, labels=[label for label, _ in BUCKETS], rows=rows)
+
+
+def receivables_aging(as_of_date=None):
+    """
+    Accounts receivable aging per customer
+    Payments settle the oldest deliveries first; buckets count days since delivery.
+    """
+    return aging(Customer, 'customer', Delivered, 'created_at', Payment, 'date', as_of_date=as_of_date)
+
+
+def payables_aging(as_of_date=None):
+    """
+    Accounts payable aging per supplier
+    Supplier payments settle the oldest bills first; buckets count days since the bill.
+    """
+    return aging(Supplier, 'supplier', Bill, 'created_at', SupplierPayment, 'date', as_of_date=as_of_date)
@@ -0,0 +1,176 @@
+import statistics
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from decimal import Decimal
+from typing import Callable
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from django.db.transaction import atomic
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounting.financial_reports import generate_balance_sheet, generate_income_statement, generate_trial_balance
+from accounting.models import Accounting_Account, start_of_day
+from accounting.posting import Entry, JournalLine, post_entries
+from accounting.views import end_of_today
+from core.aging import payables_aging, receivables_aging
+from core.models import Customer, Payment
+from core.statements import customer_statement
+
+# Documents written by each posting benchmark, inside a transaction that is rolled back
+POSTING_BATCH = 200
+
+
+class Rollback(Exception):
+    pass
+
+
+class Skip(Exception):
+    """The dataset lacks what a benchmark needs"""
+
+
+@dataclass(frozen=True)
+class Benchmark:
+    """
+    One measured operation
+    setup() returns the arguments of run() and is not timed; it raises Skip when the data is
+    missing. When run() returns an int, it is the number of items processed and a throughput
+    is reported; other results (e.g. a report dictionary) are ignored.
+    Each run starts with an empty cache, so reports are measured computing rather than cached.
+    """
+    group: str
+    run: Callable
+    setup: Callable = tuple
+    repeat: int = 5
+
+
+def rolled_back(function):
+    """Run function inside a transaction that is rolled back, returning its result"""
+    result = None
+    try:
+        with atomic():
+            result = function()
+            raise Rollback
+    except Rollback:
+        return result
+
+
+def _year_ago():
+    return start_of_day(timezone.localdate() - timedelta(days=365))
+
+
+def _first(queryset):
+    instance = queryset.first()
+    if instance is None:
+        raise Skip(f"no {queryset.model._meta.verbose_name} in the database")
+    return instance
+
+
+def busiest_customer():
+    return (_first(Customer.objects.annotate(documents=Count('transactions')).order_by('-documents', 'pk')),)
+
+
+def payment_accounts():
+    return _first(Customer.objects.order_by('pk')), _first(
+        Accounting_Account.objects.filter(category__category_type='A').order_by('pk'))
+
+
+def post_payments(customer, account):
+    def create():
+        for n in range(POSTING_BATCH):
+            Payment.objects.create(customer=customer, account=account, date=timezone.now(),
+                                   amount=Decimal(100 + n))
+        return POSTING_BATCH
+    return rolled_back(create)
+
+
+def entry_batch():
+    accounts = list(Accounting_Account.objects.order_by('pk').values_list('pk', flat=True)[:2])
+    if len(accounts) < 2:
+        raise Skip("needs two accounts")
+    return ([
+        Entry(description=f'Benchmark {n}', lines=[JournalLine(accounts[0], debit=Decimal(n + 1)),
+                                                  JournalLine(accounts[1], credit=Decimal(n + 1))])
+        for n in range(POSTING_BATCH * 25)
+    ],)
+
+
+def post_entry_batch(entries):
+    return rolled_back(lambda: len(post_entries(entries, validate=False)))
+
+
+def get(path):
+    response = Client(HTTP_HOST='localhost').get(path)
+    if response.status_code != 200:
+        raise AssertionError(f"GET {path} returned {response.status_code}")
+    # Streaming responses are only produced while they are read
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+
+
+def path(url):
+    return lambda: (url,)
+
+
+BENCHMARKS = {
+    'report.balance_sheet': Benchmark('report', lambda: generate_balance_sheet(end_of_today())),
+    'report.income_statement': Benchmark(
+        'report', lambda: generate_income_statement(_year_ago(), end_of_today(), method='accrual')),
+    'report.trial_balance': Benchmark('report', lambda: generate_trial_balance(_year_ago(), end_of_today())),
+    'report.trial_balance_all_time': Benchmark('report', generate_trial_balance),
+    'report.customer_statement': Benchmark(
+        'report', lambda customer: list(customer_statement(customer)['lines']), busiest_customer),
+    'report.receivables_aging': Benchmark('report', receivables_aging),
+    'report.payables_aging': Benchmark('report', payables_aging),
+    'posting.payment_save': Benchmark('posting', post_payments, payment_accounts, repeat=3),
+    'posting.post_entries': Benchmark('posting', post_entry_batch, entry_batch, repeat=3),
+    'api.customer_datatable': Benchmark(
+        'api', get, path('/api/customers/datatable/?draw=1&start=0&length=25&search[value]=a')),
+    'api.payment_datatable': Benchmark(
+        'api', get, path('/api/payment-list/datatable/?draw=1&start=0&length=25&order[0][column]=0&order[0][dir]=desc')),
+    'api.receivables_aging': Benchmark('api', get, path('/api/reports/receivables-aging/')),
+    'api.export_journals_month': Benchmark(
+        'api', get, lambda: (f"/api/exports/journals.csv?from={timezone.localdate() - timedelta(days=30)}",)),
+    'page.balance_sheet': Benchmark('page', get, path('/acc/balance-sheet/')),
+    'page.trial_balance': Benchmark('page', get, path('/acc/trial-balance/')),
+}
+
+
+def measure(benchmark, repeat=None):
+    """
+    Run a benchmark and summarise it
+    :return: Dictionary with runs, min_ms, median_ms, max_ms, queries (of one run) and
+             items_per_second for benchmarks that report items; or {'skipped': reason}
+    """
+    try:
+        args = benchmark.setup()
+    except Skip as e:
+        return {'skipped': str(e)}
+
+    timings = []
+    items = None
+    queries = 0
+    for _ in range(repeat or benchmark.repeat):
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            items = benchmark.run(*args)
+            timings.append(time.perf_counter() - started)
+        queries = len(captured)
+
+    median = statistics.median(timings)
+    result = {
+        'runs': len(timings),
+        'min_ms': round(min(timings) * 1000, 2),
+        'median_ms': round(median * 1000, 2),
+        'max_ms': round(max(timings) * 1000, 2),
+        'queries': queries,
+    }
+    if isinstance(items, int) and items:
+        result['items_per_second'] = round(items / median, 1)
+    return result
@@ -0,0 +1,258 @@
+import csv
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.transaction import atomic
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from accounting.models import Accounting_Account
+from core.models import Customer, Delivered, Payment
+
+# Rows validated and written per atomic batch
+CHUNK_SIZE = 5000
+# Row errors kept for the report, later ones are only counted
+MAX_ERRORS = 1000
+
+
+class RowError(ValueError):
+    """A row that cannot be imported; the message is reported with its line number"""
+
+
+@dataclass
+class ImportResult:
+    rows: int = 0
+    created: int = 0
+    failed: int = 0
+    errors: list = field(default_factory=list)  # (line number, message)
+
+    def add_error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((line, message))
+
+
+def _text(row, name, model=None, required=True):
+    value = row.get(name, '')
+    if required and not value:
+        raise RowError(f"{name} is required")
+    if model is not None:
+        max_length = model._meta.get_field(name).max_length
+        if max_length and len(value) > max_length:
+            raise RowError(f"{name} is longer than {max_length} characters")
+    return value
+
+
+def _integer(row, name, default=None):
+    value = row.get(name, '')
+    if not value and default is not None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise RowError(f"{name} must be a whole number, got {value!r}")
+
+
+def _amount(row, name):
+    value = row.get(name, '')
+    try:
+        amount = Decimal(value)
+    except InvalidOperation:
+        raise RowError(f"{name} must be a number, got {value!r}")
+    if not amount.is_finite() or amount <= 0 or amount != amount.quantize(Decimal('0.01')):
+        raise RowError(f"{name} must be positive with at most two decimals, got {value!r}")
+    if amount >= Decimal('1e13'):
+        raise RowError(f"{name} is too large")
+    return amount
+
+
+def _moment(row, name):
+    """YYYY-MM-DD or YYYY-MM-DD HH:MM[:SS], in the local time zone unless an offset is given"""
+    value = row.get(name, '')
+    try:
+        moment = parse_datetime(value)
+    except ValueError:
+        moment = None
+    if moment is None:
+        raise RowError(f"{name} must be a date as YYYY-MM-DD, got {value!r}")
+    if settings.USE_TZ and timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class Importer:
+    """
+    Reads one kind of record from a CSV file and bulk-creates it chunk by chunk
+    A chunk is validated row by row in memory, then written in one atomic block. Invalid
+    rows are reported and skipped; if a chunk still fails in the database, its rows are
+    retried one at a time so only the offending ones are lost.
+
+    Subclasses set model and required and turn a row into an unsaved instance in build().
+    """
+    model = None
+    required = ()
+
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+
+    def load(self):
+        """Fill the lookup maps, called once before the first row"""
+
+    def build(self, row):
+        """Unsaved instance for a row of stripped strings, raises RowError when the row is invalid"""
+        raise NotImplementedError
+
+    def save(self, instances):
+        """Write a chunk of valid instances, called inside the chunk's atomic block"""
+        self.model.objects.bulk_create(instances)
+
+    def run(self, lines, progress=None):
+        """
+        Import CSV text
+        :param lines: Iterable of lines, e.g. an open text file; the first line holds the column names
+        :param progress: Optional callback that gets the ImportResult after every chunk
+        :raises ValueError: When a required column is missing
+        :return: ImportResult
+        """
+        reader = csv.DictReader(lines)
+        missing = set(self.required) - set(reader.fieldnames or ())
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(sorted(missing))}")
+
+        self.load()
+        result = ImportResult()
+        rows = ((reader.line_num, row) for row in reader)
+        while chunk := list(islice(rows, self.chunk_size)):
+            self.import_chunk(chunk, result)
+            if progress is not None:
+                progress(result)
+        return result
+
+    def import_chunk(self, chunk, result):
+        valid = []
+        for line, row in chunk:
+            result.rows += 1
+            try:
+                valid.append((line, self.build({
+                    name: (value or '').strip() for name, value in row.items() if isinstance(value, str) and name
+                })))
+            except RowError as e:
+                result.add_error(line, str(e))
+        if not valid:
+            return
+
+        try:
+            with atomic():
+                self.save([instance for _, instance in valid])
+            result.created += len(valid)
+        except DatabaseError:
+            for line, instance in valid:
+                instance.pk = None
+                try:
+                    with atomic():
+                        self.save([instance])
+                    result.created += 1
+                except DatabaseError as e:
+                    result.add_error(line, str(e))
+
+
+class CustomerImporter(Importer):
+    """customer_name, owner_name, price_per_meter (optional), remarks (optional)"""
+    model = Customer
+    required = ('customer_name', 'owner_name')
+
+    def build(self, row):
+        return Customer(
+            customer_name=_text(row, 'customer_name', Customer),
+            owner_name=_text(row, 'owner_name', Customer),
+            price_per_meter=_integer(row, 'price_per_meter', default=0),
+            remarks=row.get('remarks') or None,
+        )
+
+
+class DocumentImporter(Importer):
+    """
+    Base for posted documents: each one is posted on its own date with the entry its model
+    builds, and the documents, transactions and journals of a chunk are written with bulk_create
+    """
+    date_field = None
+
+    def load(self):
+        self.customers_by_id = {}
+        self.customers_by_name = {}
+        for customer in Customer.objects.only('id', 'customer_name', 'price_per_meter').order_by():
+            self.customers_by_id[customer.pk] = customer
+            # None marks a name several customers share
+            name = customer.customer_name.casefold()
+            self.customers_by_name[name] = None if name in self.customers_by_name else customer
+        self.accounts = {code: pk for pk, code in Accounting_Account.objects.values_list('pk', 'code')}
+
+    def customer(self, row):
+        """The customer column holds a customer id or an exact customer name"""
+        value = _text(row, 'customer')
+        if value.isdigit() and int(value) in self.customers_by_id:
+            return self.customers_by_id[int(value)]
+        name = value.casefold()
+        if name not in self.customers_by_name:
+            raise RowError(f"Unknown customer {value!r}")
+        customer = self.customers_by_name[name]
+        if customer is None:
+            raise RowError(f"Several customers are named {value!r}, use the customer id")
+        return customer
+
+    def account(self, row):
+        """Accounting_Account id for the code in the account column"""
+        value = _text(row, 'account')
+        try:
+            return self.accounts[value]
+        except KeyError:
+            raise RowError(f"Unknown account code {value!r}")
+
+    def save(self, documents):
+        self.model.bulk_post(documents, self.date_field)
+
+
+class DeliveryImporter(DocumentImporter):
+    """date, customer, account, delivered, price_per_meter (optional, defaults to the customer's price)"""
+    model = Delivered
+    required = ('date', 'customer', 'account', 'delivered')
+    date_field = 'created_at'
+
+    def build(self, row):
+        customer = self.customer(row)
+        delivery = Delivered(
+            created_at=_moment(row, 'date'),
+            customer=customer,
+            account_id=self.account(row),
+            delivered=_integer(row, 'delivered'),
+            price_per_meter=_integer(row, 'price_per_meter', default=customer.price_per_meter),
+        )
+        delivery.prepare_posting()
+        if delivery.amount <= 0:
+            raise RowError("delivered times price_per_meter must be positive")
+        return delivery
+
+
+class PaymentImporter(DocumentImporter):
+    """date, customer, account, amount"""
+    model = Payment
+    required = ('date', 'customer', 'account', 'amount')
+    date_field = 'date'
+
+    def build(self, row):
+        return Payment(
+            date=_moment(row, 'date'),
+            customer=self.customer(row),
+            account_id=self.account(row),
+            amount=_amount(row, 'amount'),
+        )
+
+
+IMPORTERS = {
+    'customers': CustomerImporter,
+    'deliveries': DeliveryImporter,
+    'payments': PaymentImporter,
+}
@@ -0,0 +1,135 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.transaction import atomic
+from django.utils import timezone
+
+from accounting.models import Transaction, start_of_day
+from accounting.report_cache import cached_report
+from core.aging import BUCKETS, receivables_aging
+from core.models import Customer, Delivered, Payment
+
+BATCH_SIZE = 5000
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Time the receivables aging on generated customers and documents against a Python FIFO "
+            "pass over every row. Everything is written inside a transaction that is rolled back at the end.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=5_000, help='Customers to generate')
+        parser.add_argument('--documents', type=int, default=500_000, help='Deliveries and payments to generate')
+        parser.add_argument('--days', type=int, default=365, help='Days of history to spread them over')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement, the best is reported')
+
+    def handle(self, *args, **options):
+        try:
+            with atomic():
+                self.generate(options['customers'], options['documents'], options['days'])
+                self.measure(options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def generate(self, customers, documents, days):
+        started = time.perf_counter()
+        customer_ids = [
+            c.pk for c in Customer.objects.bulk_create(
+                [Customer(customer_name=f'Bench {n}', owner_name='Benchmark') for n in range(customers)],
+                batch_size=BATCH_SIZE,
+            )
+        ]
+        now = timezone.now()
+
+        def when():
+            return now - timedelta(days=random.randrange(days), seconds=random.randrange(86400))
+
+        # Deliveries need a transaction each; payments may go without
+        deliveries = documents * 2 // 3
+        # Keep the spread out delivery dates instead of stamping every row with now
+        created_at = Delivered._meta.get_field('created_at')
+        created_at.auto_now_add = False
+        try:
+            self.insert_deliveries(deliveries, customer_ids, when)
+        finally:
+            created_at.auto_now_add = True
+        for offset in range(deliveries, documents, BATCH_SIZE):
+            Payment.objects.bulk_create([
+                Payment(customer_id=random.choice(customer_ids), amount=Decimal(random.randrange(10, 400)),
+                        date=when())
+                for _ in range(min(BATCH_SIZE, documents - offset))
+            ])
+
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        self.stdout.write(f"Generated {customers} customers and {documents} documents "
+                          f"in {time.perf_counter() - started:.1f}s")
+
+    def insert_deliveries(self, deliveries, customer_ids, when):
+        for offset in range(0, deliveries, BATCH_SIZE):
+            size = min(BATCH_SIZE, deliveries - offset)
+            transactions = Transaction.objects.bulk_create(
+                [Transaction(description='Benchmark', is_approved=True) for _ in range(size)]
+            )
+            # bulk_create skips the posting in Delivered.save, aging only reads the documents
+            Delivered.objects.bulk_create([
+                Delivered(customer_id=random.choice(customer_ids), transaction=t, price_per_meter=10,
+                          delivered=n % 50 + 1, amount=Decimal((n % 50 + 1) * 10), created_at=when())
+                for n, t in enumerate(transactions)
+            ])
+
+    def measure(self, repeat):
+        as_of = timezone.localdate()
+
+        def best(function):
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                result = function()
+                timings.append(time.perf_counter() - started)
+            return min(timings) * 1000, result
+
+        python_ms, python_total = best(lambda: python_fifo(as_of))
+        sql_ms, report = best(lambda: receivables_aging(as_of))
+        self.stdout.write(f"{'python FIFO over every row':<32}{python_ms:>12.1f} ms")
+        self.stdout.write(f"{'grouped SQL aging':<32}{sql_ms:>12.1f} ms")
+
+        cache.clear()
+        cached_report('receivables_aging', receivables_aging, as_of_date=as_of)
+        cached_ms, _ = best(lambda: cached_report('receivables_aging', receivables_aging, as_of_date=as_of))
+        self.stdout.write(f"{'cached aging':<32}{cached_ms:>12.1f} ms")
+
+        if python_total != report.total:
+            self.stderr.write(f"Totals differ: python {python_total}, sql {report.total}")
+        self.stdout.write(f"{len(report.rows)} customers open, {report.total} outstanding")
+
+
+def python_fifo(as_of):
+    """The straightforward version: load every document and allocate payments in Python"""
+    end = start_of_day(as_of + timedelta(days=1))
+    paid = {}
+    for customer_id, amount in Payment.objects.filter(date__lt=end).values_list('customer_id', 'amount'):
+        paid[customer_id] = paid.get(customer_id, Decimal('0')) + amount
+
+    buckets = {}
+    deliveries = (Delivered.objects.filter(created_at__lt=end).order_by('customer_id', 'created_at', 'id')
+                  .values_list('customer_id', 'created_at', 'amount'))
+    for customer_id, created_at, amount in deliveries.iterator(chunk_size=BATCH_SIZE):
+        applied = min(paid.get(customer_id, Decimal('0')), amount)
+        paid[customer_id] = paid.get(customer_id, Decimal('0')) - applied
+        age = (as_of - timezone.localdate(created_at)).days
+        index = next(n for n, (_, oldest) in enumerate(BUCKETS) if oldest is None or age <= oldest)
+        row = buckets.setdefault(customer_id, [Decimal('0')] * len(BUCKETS))
+        row[index] += amount - applied
+
+    return sum((sum(row) for row in buckets.values()), Decimal('0')) - sum(paid.values(), Decimal('0'))
@@ -0,0 +1,105 @@
+import random
+import statistics
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from accounting.models import Category, Accounting_Account, Transaction
+from core.models import Customer, Payment
+
+SQLITE_PRAGMAS = ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size')
+
+
+class Command(BaseCommand):
+    help = ("Post payments from several writer threads while a reader renders the balance sheet page, "
+            "and report throughput, latency and lock errors for both. Payments go to accounts created "
+            "for the run, which are deleted with everything posted to them at the end.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4, help='Threads posting payments')
+        parser.add_argument('--seconds', type=float, default=10, help='Duration of the run')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                pragmas = [f"{name}={cursor.execute(f'PRAGMA {name}').fetchone()[0]}" for name in SQLITE_PRAGMAS]
+            self.stdout.write(f"sqlite: {', '.join(pragmas)}")
+        else:
+            self.stdout.write(f"{connection.vendor}: CONN_MAX_AGE={connection.settings_dict['CONN_MAX_AGE']}")
+
+        cash_category = Category.objects.create(name='Benchmark cash', category_type='A')
+        sales_category = Category.objects.create(name='Benchmark sales', category_type='I')
+        self.cash = Accounting_Account.objects.create(name='Benchmark cash', code='BENCH-CASH',
+                                                      category=cash_category)
+        revenue = Accounting_Account.objects.create(name='Benchmark sales', code='BENCH-SALES',
+                                                    category=sales_category)
+        self.customer = Customer.objects.create(customer_name='Benchmark', owner_name='Benchmark')
+        try:
+            with override_settings(LEDGER_ACCOUNTS={'revenue': revenue.pk}):
+                results = self.run(options['writers'], options['seconds'])
+        finally:
+            Transaction.objects.filter(customer=self.customer).delete()
+            Accounting_Account.objects.filter(pk__in=[self.cash.pk, revenue.pk]).delete()
+            Category.objects.filter(pk__in=[cash_category.pk, sales_category.pk]).delete()
+            self.customer.delete()
+
+        self.stdout.write(f"{'role':<10}{'ops':>8}{'ops/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}{'errors':>8}")
+        for role, (latencies, errors) in results.items():
+            latencies.sort()
+            p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0
+            self.stdout.write(
+                f"{role:<10}{len(latencies):>8}{len(latencies) / options['seconds']:>9.1f}"
+                f"{statistics.median(latencies) if latencies else 0:>9.1f}{p95:>9.1f}"
+                f"{latencies[-1] if latencies else 0:>9.1f}{errors:>8}"
+            )
+
+    def run(self, writers, seconds):
+        deadline = time.monotonic() + seconds
+        results = {'write': ([], 0), 'read': ([], 0)}
+        lock = threading.Lock()
+
+        def record(role, latencies, errors):
+            with lock:
+                total, failed = results[role]
+                results[role] = (total + latencies, failed + errors)
+
+        def repeat(role, operation):
+            latencies, errors = [], 0
+            try:
+                while time.monotonic() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        operation()
+                    except DatabaseError:
+                        errors += 1
+                        continue
+                    latencies.append((time.perf_counter() - started) * 1000)
+            finally:
+                record(role, latencies, errors)
+                # Every thread opens its own connection
+                connection.close()
+
+        def write():
+            Payment.objects.create(account=self.cash, customer=self.customer, date=timezone.now(),
+                                   amount=Decimal(random.randrange(100, 100000)) / 100)
+
+        client = Client(HTTP_HOST='localhost')
+
+        def read():
+            response = client.get('/acc/balance-sheet/')
+            if response.status_code != 200:
+                raise DatabaseError(f"balance sheet returned {response.status_code}")
+
+        threads = [threading.Thread(target=repeat, args=('write', write)) for _ in range(writers)]
+        threads.append(threading.Thread(target=repeat, args=('read', read)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
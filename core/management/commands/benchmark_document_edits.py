@@ -0,0 +1,84 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.transaction import atomic
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from accounting.models import Category, Accounting_Account, Journal
+from core.models import Customer, Payment
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Count the queries of a document amount edit with the per-line journal lookups the documents "
+            "used before and with the single UPDATE they use now. Everything is rolled back at the end.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--edits', type=int, default=500, help='Payments to edit')
+
+    def handle(self, *args, **options):
+        try:
+            with atomic():
+                results = self.run(options['edits'])
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write(f"{'path':<16}{'queries/edit':>14}{'journal/edit':>14}{'ms/edit':>10}")
+        for name, (queries, journal_queries, elapsed) in results.items():
+            self.stdout.write(f"{name:<16}{queries:>14.1f}{journal_queries:>14.1f}{elapsed:>10.2f}")
+
+    def run(self, edits):
+        assets = Category.objects.create(name='Benchmark cash', category_type='A')
+        income = Category.objects.create(name='Benchmark sales', category_type='I')
+        cash = Accounting_Account.objects.create(name='Bench cash', code='BENCH-CASH', category=assets)
+        revenue = Accounting_Account.objects.create(name='Bench revenue', code='BENCH-REV', category=income)
+        customer = Customer.objects.create(customer_name='Benchmark', owner_name='Benchmark')
+
+        with override_settings(LEDGER_ACCOUNTS={'revenue': revenue.pk}):
+            for _ in range(edits):
+                Payment(account=cash, customer=customer, amount=Decimal('100.00'), date=timezone.now()).save()
+            payments = list(Payment.objects.filter(customer=customer))
+
+            return {
+                'journal lookups': self.measure(payments, self.edit_legacy),
+                'bulk update': self.measure(payments, self.edit),
+            }
+
+    def measure(self, payments, edit):
+        journal_table = connection.ops.quote_name(Journal._meta.db_table)
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for payment in payments:
+                edit(payment, Decimal(random.randrange(100, 100000)) / 100)
+            elapsed = time.perf_counter() - started
+
+        statements = [q['sql'] for q in queries.captured_queries if not q['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        journal_statements = [sql for sql in statements if journal_table in sql]
+        count = len(payments)
+        return len(statements) / count, len(journal_statements) / count, elapsed * 1000 / count
+
+    def edit(self, payment, amount):
+        payment.amount = amount
+        payment.save()
+
+    def edit_legacy(self, payment, amount):
+        """The update branch the documents had: look up and save each line on its own"""
+        with atomic():
+            j = Journal.objects.get(transaction=payment.transaction_id, credit=0)
+            j.debit = amount
+            j.save()
+            j1 = Journal.objects.get(transaction=payment.transaction_id, debit=0)
+            j1.credit = amount
+            j1.save()
+            payment.amount = amount
+            payment._posted_amount = amount
+            payment.save()
+
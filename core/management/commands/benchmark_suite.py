@@ -0,0 +1,107 @@
+import json
+import platform
+import subprocess
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from accounting.models import Journal, Transaction
+from core.benchmarks import BENCHMARKS, measure
+from core.models import Customer, Supplier
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ("Time the reports, posting paths and API endpoints against the current database and write the "
+            "results as JSON. Run it on a dataset from generate_ledger; with --compare, medians slower than "
+            "the baseline by more than --threshold fail the command.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', metavar='name',
+                            help=f"Benchmarks or groups to run, all by default: {', '.join(BENCHMARKS)}")
+        parser.add_argument('--repeat', type=int, help='Runs per benchmark, overriding its default')
+        parser.add_argument('--output', help='JSON file to write the results to')
+        parser.add_argument('--compare', metavar='BASELINE', help='JSON results of an earlier run')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Slowdown of the median that counts as a regression (0.25 = 25%%)')
+        parser.add_argument('--min-ms', type=float, default=5,
+                            help='Slowdowns smaller than this are timing noise, whatever the percentage')
+
+    def handle(self, *args, **options):
+        names = options['names']
+        unknown = [name for name in names
+                   if name not in BENCHMARKS and not any(b.group == name for b in BENCHMARKS.values())]
+        if unknown:
+            raise CommandError(f"Unknown benchmarks: {', '.join(unknown)}")
+        selected = {name: benchmark for name, benchmark in BENCHMARKS.items()
+                    if not names or name in names or benchmark.group in names}
+
+        report = {
+            'commit': _commit(),
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'dataset': {
+                'customers': Customer.objects.count(),
+                'suppliers': Supplier.objects.count(),
+                'transactions': Transaction.objects.count(),
+                'journals': Journal.objects.count(),
+            },
+            'results': {},
+        }
+        self.stdout.write(', '.join(f"{count} {name}" for name, count in report['dataset'].items()))
+
+        self.stdout.write(f"{'benchmark':<32}{'median ms':>11}{'min ms':>10}{'queries':>9}{'items/s':>10}")
+        for name, benchmark in selected.items():
+            result = measure(benchmark, options['repeat'])
+            report['results'][name] = result
+            if 'skipped' in result:
+                self.stdout.write(f"{name:<32}skipped: {result['skipped']}")
+            else:
+                self.stdout.write(f"{name:<32}{result['median_ms']:>11.1f}{result['min_ms']:>10.1f}"
+                                  f"{result['queries']:>9}{result.get('items_per_second', ''):>10}")
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if options['compare']:
+            self.compare(report, options['compare'], options['threshold'], options['min_ms'])
+
+    def compare(self, report, path, threshold, min_ms):
+        try:
+            with open(path) as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read the baseline: {e}")
+
+        self.stdout.write(f"\nCompared with {baseline.get('commit') or path}:")
+        regressions = []
+        for name, result in report['results'].items():
+            before = baseline.get('results', {}).get(name, {})
+            if 'median_ms' not in result or 'median_ms' not in before:
+                continue
+            change = result['median_ms'] / before['median_ms'] - 1 if before['median_ms'] else 0
+            queries = result['queries'] - before['queries']
+            line = f"{name:<32}{change:>+9.0%}{queries:>+6} queries"
+            # More queries is a regression whatever the timing noise
+            slower = change > threshold and result['median_ms'] - before['median_ms'] > min_ms
+            if slower or queries > 0:
+                regressions.append(name)
+                line = self.style.ERROR(line + '  REGRESSION')
+            self.stdout.write(line)
+
+        if regressions:
+            raise CommandError(f"{len(regressions)} benchmarks regressed: {', '.join(regressions)}")
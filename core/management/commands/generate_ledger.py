@@ -0,0 +1,178 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core import serializers
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db.transaction import atomic
+from django.utils import timezone
+
+from accounting.models import Category, Accounting_Account, Transaction
+from accounting.posting import Entry, JournalLine, post_entries
+from core.models import Customer, Supplier, Delivered, Payment, Bill, SupplierPayment
+
+CHART = settings.BASE_DIR / 'accounting.json'
+CHUNK_SIZE = 5000
+
+# Accounts the documents need besides the chart in accounting.json: (name, code, category name)
+ROLE_ACCOUNTS = {
+    'revenue': ('Revenue', 'rev', 'Sale'),
+    'purchase': ('Cost Of Good Sold', 'CGS', 'Cost Of Good Sold'),
+    'payable': ('Accounts Payable', 'ap', 'Loan And Liabilities'),
+}
+RECEIVABLE = ('Accounts Receivable', 'ar', 'Current Asset')
+
+# Share of each kind of document in the generated ledger
+MIX = {'delivery': 35, 'payment': 30, 'bill': 15, 'supplier_payment': 10, 'expense': 10}
+
+WORDS = ['Apex', 'Bengal', 'Crown', 'Delta', 'Eastern', 'Fabric', 'Golden', 'Horizon', 'Indigo', 'Jamuna',
+         'Kohinoor', 'Lotus', 'Meghna', 'Noor', 'Orient', 'Padma', 'Rupsha', 'Silk', 'Titas', 'Unique']
+
+
+def load_chart(path=CHART):
+    """
+    Unsaved categories and accounts of a fixture file, which may be saved as UTF-16 (as PowerShell
+    does); loaddata only reads UTF-8
+    """
+    data = path.read_bytes()
+    text = data.decode('utf-16') if data[:2] in (b'\xff\xfe', b'\xfe\xff') else data.decode('utf-8-sig')
+    objects = [record.object for record in serializers.deserialize('json', text)]
+    return ([o for o in objects if isinstance(o, Category)],
+            [o for o in objects if isinstance(o, Accounting_Account)])
+
+
+class Command(BaseCommand):
+    help = ("Fill an empty database with a synthetic ledger for load tests: the chart of accounts from "
+            "accounting.json, customers, suppliers and years of deliveries, payments, bills, supplier "
+            "payments and expenses, posted through the same code as the documents. "
+            "Use a separate database, e.g. DB_NAME=/tmp/synthetic.sqlite3.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=2000)
+        parser.add_argument('--suppliers', type=int, default=200)
+        parser.add_argument('--documents', type=int, default=500_000,
+                            help='Documents and expenses to post, two journal lines each')
+        parser.add_argument('--years', type=int, default=3, help='Years of history ending yesterday')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed, the same seed gives the same ledger')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Documents per atomic batch')
+        parser.add_argument('--no-snapshots', action='store_true',
+                            help='Do not take month-end balance snapshots afterwards')
+
+    def handle(self, *args, **options):
+        if Transaction.objects.exists():
+            raise CommandError("The ledger already has transactions; generate into an empty database")
+        self.random = random.Random(options['seed'])
+        started = time.perf_counter()
+
+        with atomic():
+            self.create_chart()
+            self.create_parties(options['customers'], options['suppliers'])
+
+        end = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.start = end - timedelta(days=365 * options['years'])
+        self.span = (end - self.start).total_seconds()
+
+        total = options['documents']
+        chunk_size = options['chunk_size']
+        # Draw the moments in order, so documents are posted the way they would have been
+        moments = sorted(self.random.random() for _ in range(total))
+        kinds = self.random.choices(list(MIX), weights=list(MIX.values()), k=total)
+        for offset in range(0, total, chunk_size):
+            with atomic():
+                self.post_chunk(moments[offset:offset + chunk_size], kinds[offset:offset + chunk_size])
+            done = min(offset + chunk_size, total)
+            rate = done / (time.perf_counter() - started) * 60
+            self.stdout.write(f"{done} of {total} documents posted ({rate:,.0f}/min)")
+
+        if not options['no_snapshots']:
+            call_command('snapshot_account_balances', stdout=self.stdout)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {total} documents ({total * 2} journal lines) in {time.perf_counter() - started:.0f}s"
+        ))
+
+    def create_chart(self):
+        categories, accounts = load_chart()
+        for objects, model in ((categories, Category), (accounts, Accounting_Account)):
+            existing = set(model.objects.values_list('pk', flat=True))
+            for instance in objects:
+                if instance.pk not in existing:
+                    instance.save(force_insert=True)
+
+        categories = {c.name: c for c in Category.objects.all()}
+        for role, pk in settings.LEDGER_ACCOUNTS.items():
+            if not Accounting_Account.objects.filter(pk=pk).exists():
+                name, code, category = ROLE_ACCOUNTS[role]
+                Accounting_Account.objects.create(pk=pk, name=name, code=code, category=categories[category])
+        name, code, category = RECEIVABLE
+        self.receivable, _ = Accounting_Account.objects.get_or_create(
+            code=code, defaults={'name': name, 'category': categories[category]}
+        )
+        self.payable = Accounting_Account.objects.get(pk=settings.LEDGER_ACCOUNTS['payable'])
+
+        # Money moves through the cash and bank accounts, expenses hit every expense account
+        self.cash_accounts = list(Accounting_Account.objects.filter(category__category_type='A',
+                                                                    category__name__in=['Cash', 'Bank']))
+        self.expense_accounts = list(Accounting_Account.objects.filter(category__category_type='X'))
+        if not self.cash_accounts or not self.expense_accounts:
+            raise CommandError("The chart needs at least one cash or bank account and one expense account")
+
+    def name(self, suffix):
+        return f"{self.random.choice(WORDS)} {self.random.choice(WORDS)} {suffix}"
+
+    def create_parties(self, customers, suppliers):
+        self.customers = Customer.objects.bulk_create([
+            Customer(customer_name=self.name('Prints')[:30], owner_name=self.name('Ali')[:30],
+                     price_per_meter=self.random.randrange(20, 200))
+            for _ in range(customers)
+        ], batch_size=CHUNK_SIZE)
+        self.suppliers = Supplier.objects.bulk_create([
+            Supplier(company_name=self.name('Traders'), product=self.random.choice(['Ink', 'Paper', 'Fabric']))
+            for _ in range(suppliers)
+        ], batch_size=CHUNK_SIZE)
+
+    def amount(self, low, high):
+        return Decimal(self.random.randrange(low * 100, high * 100)) / 100
+
+    def post_chunk(self, moments, kinds):
+        documents = {Delivered: [], Payment: [], Bill: [], SupplierPayment: []}
+        expenses = []
+        for fraction, kind in zip(moments, kinds):
+            moment = self.start + timedelta(seconds=fraction * self.span)
+            if kind == 'delivery':
+                customer = self.random.choice(self.customers)
+                delivery = Delivered(customer=customer, account=self.receivable, created_at=moment,
+                                     price_per_meter=customer.price_per_meter,
+                                     delivered=self.random.randrange(10, 500))
+                delivery.prepare_posting()
+                documents[Delivered].append(delivery)
+            elif kind == 'payment':
+                documents[Payment].append(Payment(customer=self.random.choice(self.customers), date=moment,
+                                                  account=self.random.choice(self.cash_accounts),
+                                                  amount=self.amount(500, 50_000)))
+            elif kind == 'bill':
+                documents[Bill].append(Bill(supplier=self.random.choice(self.suppliers), account=self.payable,
+                                            created_at=moment, bill_id=self.random.randrange(1, 10**6),
+                                            amount=self.amount(1000, 100_000)))
+            elif kind == 'supplier_payment':
+                documents[SupplierPayment].append(SupplierPayment(
+                    supplier=self.random.choice(self.suppliers), date=moment,
+                    account=self.random.choice(self.cash_accounts), amount=self.amount(1000, 80_000),
+                ))
+            else:
+                amount = self.amount(100, 20_000)
+                expenses.append(Entry(
+                    description='Operating expense',
+                    posted_at=moment,
+                    lines=[JournalLine(self.random.choice(self.expense_accounts).pk, debit=amount),
+                           JournalLine(self.random.choice(self.cash_accounts).pk, credit=amount)],
+                ))
+
+        for model, batch in documents.items():
+            if batch:
+                model.bulk_post(batch)
+        if expenses:
+            post_entries(expenses, validate=False)
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.imports import CHUNK_SIZE, IMPORTERS
+
+
+class Command(BaseCommand):
+    help = ("Bulk import customers, deliveries or payments from a CSV file. Rows are validated and "
+            "posted in chunks; invalid rows are reported by line number and skipped.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS), help='What the file contains')
+        parser.add_argument('path', help='CSV file with a header row')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows per atomic batch')
+        parser.add_argument('--encoding', default='utf-8-sig', help='File encoding')
+
+    def handle(self, *args, **options):
+        importer = IMPORTERS[options['kind']](chunk_size=options['chunk_size'])
+        started = time.perf_counter()
+
+        def progress(result):
+            self.stdout.write(f"{result.rows} rows read, {result.created} imported, {result.failed} failed")
+
+        try:
+            with open(options['path'], newline='', encoding=options['encoding']) as f:
+                result = importer.run(f, progress=progress)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for line, message in result.errors:
+            self.stderr.write(f"line {line}: {message}")
+        if result.failed > len(result.errors):
+            self.stderr.write(f"... and {result.failed - len(result.errors)} more errors")
+
+        elapsed = time.perf_counter() - started
+        rate = result.rows / elapsed * 60 if elapsed else 0
+        style = self.style.SUCCESS if not result.failed else self.style.WARNING
+        self.stdout.write(style(f"Imported {result.created} of {result.rows} rows in {elapsed:.1f}s "
+                                f"({rate:,.0f} rows/min)"))
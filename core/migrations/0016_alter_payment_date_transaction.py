@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting', '0011_transaction_party'),
+        ('core', '0015_bill_supplierpayment'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payment',
+            name='date',
+            field=models.DateTimeField(),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='transaction',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='accounting.transaction'),
+        ),
+    ]
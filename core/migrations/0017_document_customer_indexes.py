@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting', '0011_transaction_party'),
+        ('core', '0016_alter_payment_date_transaction'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='delivered',
+            name='customer',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='core.customer'),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='customer',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='core.customer'),
+        ),
+        migrations.AddIndex(
+            model_name='delivered',
+            index=models.Index(fields=['customer', 'created_at', 'id'], name='delivered_customer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['customer', 'date'], name='payment_customer_date_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting', '0011_transaction_party'),
+        ('core', '0017_document_customer_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bill',
+            name='supplier',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='core.supplier'),
+        ),
+        migrations.AlterField(
+            model_name='supplierpayment',
+            name='supplier',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='core.supplier'),
+        ),
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(fields=['supplier', 'created_at', 'id'], name='bill_supplier_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='supplierpayment',
+            index=models.Index(fields=['supplier', 'date'], name='supplierpayment_supplier_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations
+
+# istartswith is LIKE ... ESCAPE on SQLite and UPPER(col) LIKE UPPER(%s) on PostgreSQL;
+# neither can seek the binary (customer_name, id) index, so each gets a matching one
+SEARCH_INDEX = {
+    'sqlite': 'CREATE INDEX customer_name_search_idx ON core_customer (customer_name COLLATE NOCASE)',
+    'postgresql': 'CREATE INDEX customer_name_search_idx ON core_customer '
+                  '(UPPER(customer_name::text) text_pattern_ops)',
+}
+
+
+def create_search_index(apps, schema_editor):
+    sql = SEARCH_INDEX.get(schema_editor.connection.vendor)
+    if sql:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in SEARCH_INDEX:
+        schema_editor.execute('DROP INDEX IF EXISTS customer_name_search_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_grid_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
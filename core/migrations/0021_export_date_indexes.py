@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting', '0011_transaction_party'),
+        ('core', '0020_customer_name_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(fields=['created_at', 'id'], name='bill_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='delivered',
+            index=models.Index(fields=['created_at', 'id'], name='delivered_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='supplierpayment',
+            index=models.Index(fields=['date', 'id'], name='supplierpayment_date_idx'),
+        ),
+    ]
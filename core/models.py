@@ -1,105 +1,243 @@
-from idlelib.configdialog import tracers
+import logging
 
 from django.db import models
 from django.db.models import SET_NULL
+from django.db.transaction import atomic, on_commit
 from django.utils import timezone
-from accounting.models import Transaction, Accounting_Account, Journal
+from accounting.models import Transaction, Accounting_Account, Journal, local_day
+from accounting.account_map import get_ledger_account
+from accounting.report_cache import bump_ledger_version
+from normerp.metrics import DOCUMENTS_POSTED
+from accounting.posting import Entry, JournalLine, post_entries, set_auto_dates, update_entry_amount, validate_entries
+
+logger = logging.getLogger(__name__)
 
 
 # Create your models here.
 
+class PostedDocument(models.Model):
+    """
+    A document that posts a two-line journal entry when it is created and keeps the
+    amounts in step when it is edited. The document, its transaction and journals
+    are always written together in one database transaction.
+
+    Subclasses need `transaction` and `amount` fields, name the field the document is
+    dated by in date_field and implement posting_accounts().
+    """
+    # The aging reports and statements read this date, not the posting date of the journals
+    date_field = None
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the posted amount so an edit only touches the journals when it changes
+        instance._posted_amount = instance.__dict__.get('amount')
+        instance._posted_party = instance.posting_party()
+        instance._posted_day = instance.document_day()
+        return instance
+
+    def document_day(self):
+        """Local day of the document's date, None when it is not set or not loaded"""
+        value = self.__dict__.get(self.date_field)
+        return local_day(value) if value is not None else None
+
+    def bump_reports(self, *days):
+        """
+        Invalidate cached reports after the document changed on commit
+        A document dated in the past changes closed aging reports and statements, even
+        though its journals are posted today.
+        """
+        day = None if None in days else min(days)
+        on_commit(lambda: bump_ledger_version(day))
+
+    def posting_accounts(self):
+        """Return the (debit account id, credit account id) the document posts to"""
+        raise NotImplementedError
+
+    def posting_description(self):
+        raise NotImplementedError
+
+    def posting_reference(self):
+        return ''
+
+    def posting_party(self):
+        """Party fields to set on the transaction, e.g. {'customer_id': 1}"""
+        return {}
+
+    def prepare_posting(self):
+        """Hook to fill in derived fields (e.g. the amount) before a new document is posted"""
+
+    def posting_entry(self, posted_at=None):
+        """The two-line entry the document posts, see accounting.posting.Entry"""
+        debit_account_id, credit_account_id = self.posting_accounts()
+        return Entry(
+            description=self.posting_description(),
+            reference=self.posting_reference(),
+            posted_at=posted_at,
+            **self.posting_party(),
+            lines=[
+                JournalLine(debit_account_id, debit=self.amount),
+                JournalLine(credit_account_id, credit=self.amount),
+            ],
+        )
+
+    def post(self):
+        """Post the journal entry for a new document and attach its transaction"""
+        entry = self.posting_entry()
+        # The accounts are foreign keys, so only a missing account and the amounts need checking
+        validate_entries([entry], check_accounts=False)
+        self.transaction = post_entries([entry], validate=False)[0]
+
+    def update_posting(self):
+        """Move both posted lines to the document's current amount"""
+        if self.amount != getattr(self, '_posted_amount', None):
+            update_entry_amount(self.transaction_id, self.amount)
+        party = self.posting_party()
+        if party != getattr(self, '_posted_party', None):
+            Transaction.objects.filter(pk=self.transaction_id).update(**party)
+
+    def save(self, *args, **kwargs):
+        with atomic():
+            if self.pk is None:  # or if self._state.adding
+                # This is a new object being created (INSERT)
+                self.prepare_posting()
+                self.post()
+                on_commit(lambda: DOCUMENTS_POSTED.inc(type=type(self).__name__))
+                event = "Document posted"
+            else:
+                # This is an existing object being updated (UPDATE)
+                self.update_posting()
+                event = "Document updated"
+
+            super().save(*args, **kwargs)  # Call the original save method
+            # An edit may move the document out of a closed day as well as into one
+            day = self.document_day()
+            self.bump_reports(day, getattr(self, '_posted_day', day))
+        logger.debug(event, extra={'document': type(self).__name__, 'pk': self.pk,
+                                   'transaction_id': self.transaction_id, 'amount': self.amount})
+        self._posted_amount = self.amount
+        self._posted_party = self.posting_party()
+        self._posted_day = day
+
+    @classmethod
+    def bulk_post(cls, documents, date_field=None):
+        """
+        Post and create many new documents, each on the moment in its date_field
+        (the model's date_field by default). The journals are posted on those moments too,
+        so post_entries invalidates the cached reports from the earliest of them.
+        Entries go through post_entries and the documents through bulk_create, so save()
+        is not called: run prepare_posting() on each document first. Call inside atomic().
+        """
+        date_field = date_field or cls.date_field
+        dates = [getattr(document, date_field) for document in documents]
+        entries = [document.posting_entry(posted_at=posted_at) for document, posted_at in zip(documents, dates)]
+        validate_entries(entries, check_accounts=False)
+        for document, t in zip(documents, post_entries(entries, validate=False)):
+            document.transaction = t
+        field = cls._meta.get_field(date_field)
+        try:
+            cls.objects.bulk_create(documents)
+            on_commit(lambda: DOCUMENTS_POSTED.inc(len(documents), type=cls.__name__))
+            if field.auto_now or field.auto_now_add:
+                set_auto_dates(cls, [date_field],
+                               {document.pk: (posted_at,) for document, posted_at in zip(documents, dates)})
+        finally:
+            # bulk_create stamps auto_now and auto_now_add fields with now, even when it fails
+            for document, posted_at in zip(documents, dates):
+                setattr(document, date_field, posted_at)
+        return documents
+
+    def delete(self, *args, **kwargs):
+        with atomic():
+            # Delete the transaction (and its journals) together with the document
+            self.transaction.delete()
+            self.bump_reports(self.document_day())
+            return super().delete(*args, **kwargs)
+
+
 class Customer(models.Model):
     customer_name = models.CharField(max_length=30)
     owner_name = models.CharField(max_length=30)
     price_per_meter = models.IntegerField(default=0)
     remarks = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Customer grid: pages sorted by name. The case-insensitive prefix search needs a
+            # vendor specific index (customer_name_search_idx), created in migration 0020.
+            models.Index(fields=['customer_name', 'id'], name='customer_name_idx'),
+        ]
+
     def __str__(self):
         return f' {self.customer_name} - {self.owner_name}'
 
-class Delivered(models.Model):
+class Delivered(PostedDocument):
+    date_field = 'created_at'
     account = models.ForeignKey(Accounting_Account, on_delete=models.CASCADE, null=True) # account Receivable
-    customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, db_index=False)
     transaction = models.OneToOneField(Transaction, on_delete=models.CASCADE)
     price_per_meter = models.IntegerField(default=0)
     delivered = models.IntegerField(default=0)
     amount = models.DecimalField(max_digits=15, decimal_places=2, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
-    def save(
-        self,
-        *args,
-        **kwargs
-    ):
-        if self.pk is None:  # or if self._state.adding
-            # This is a new object being created (INSERT)
-            self.amount = self.price_per_meter * self.delivered
-            t = Transaction.objects.create(description=f'Order Delivered For {self.customer.customer_name}', reference =f'customer-{self.customer.customer_name}', is_approved=True)
-            j = Journal.objects.create( account = self.account,transaction=t,debit=self.amount)
-            acc = Accounting_Account.objects.get(pk=4)
-            j1 = Journal.objects.create( account = acc,transaction=t,credit=self.amount) # credit rev account
-            self.transaction = t
-            print("Creating a new MyModel instance.")
-        else:
-            # This is an existing object being updated (UPDATE)
-
-            j = Journal.objects.get(transaction=self.transaction, credit=0)
-            j.debit = self.amount # update ar account
-            j.save()
-            j1 = Journal.objects.get(transaction=self.transaction, debit=0)
-            j1.credit = self.amount # update rev account
-            j1.save()
-            print(f"Updating MyModel instance with primary key: {self.pk}")
-
-        super().save(*args, **kwargs)  # Call the original save method
+    class Meta:
+        indexes = [
+            # Receivables aging walks each customer's deliveries oldest first
+            models.Index(fields=['customer', 'created_at', 'id'], name='delivered_customer_idx'),
+            # Exports: date order and date range filters; bulk_post backdates, so id order is not date order
+            models.Index(fields=['created_at', 'id'], name='delivered_date_idx'),
+        ]
 
-    def delete(self, *args, **kwargs):
-        # Delete the related User object before deleting the Profile object
-        self.transaction.delete()
-        # Call the original delete method to delete the Profile object
-        return super().delete(*args, **kwargs)
+    def prepare_posting(self):
+        self.amount = self.price_per_meter * self.delivered
+
+    def posting_accounts(self):
+        # debit account receivable, credit revenue
+        return self.account_id, get_ledger_account('revenue').pk
+
+    def posting_description(self):
+        return f'Order Delivered For {self.customer.customer_name}'
+
+    def posting_reference(self):
+        return f'customer-{self.customer.customer_name}'
+
+    def posting_party(self):
+        return {'customer_id': self.customer_id}
 
 
 
-class Payment(models.Model):
+class Payment(PostedDocument):
+    date_field = 'date'
     account = models.ForeignKey(Accounting_Account, on_delete=models.CASCADE, null=True)
-    customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, db_index=False)
     transaction = models.OneToOneField(Transaction, blank=True, null=True, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=15, decimal_places=2, default=0)
     date = models.DateTimeField()
     created_at = models.DateTimeField(auto_now_add=True)
 
-    def save(
-        self,
-        *args,
-        **kwargs
-    ):
-        if self.pk is None:  # or if self._state.adding
-            # This is a new object being created (INSERT)
-            t = Transaction.objects.create(description=f'Payment Received From {self.customer.customer_name}', reference =f'customer-{self.customer.customer_name}', is_approved=True)
-            # enter debit amount into assets
-            j = Journal.objects.create( account = self.account,transaction=t,debit=self.amount)
-            acc = Accounting_Account.objects.get(pk=4) # Revenue will be credited
-            j1 = Journal.objects.create( account = acc,transaction=t,credit=self.amount)
-            self.transaction = t
-            print("Creating a new MyModel instance.")
-        else:
-            # This is an existing object being updated (UPDATE)
-            j = Journal.objects.get(transaction=self.transaction, credit=0)
-            j.debit = self.amount
-            j.save()
-            j1 = Journal.objects.get(transaction=self.transaction, debit=0)
-            j1.credit = self.amount
-            j1.save()
-            print(f"Updating MyModel instance with primary key: {self.pk}")
-
-        super().save(*args, **kwargs)  # Call the original save method
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', 'date'], name='payment_customer_date_idx'),
+            # Payment grid: newest first and date range filters
+            models.Index(fields=['date', 'id'], name='payment_date_idx'),
+        ]
 
-    def delete(self, *args, **kwargs):
-        # Delete the related User object before deleting the Profile object
-        self.transaction.delete()
-        # Call the original delete method to delete the Profile object
-        return super().delete(*args, **kwargs)
+    def posting_accounts(self):
+        # enter debit amount into assets, Revenue will be credited
+        return self.account_id, get_ledger_account('revenue').pk
+
+    def posting_description(self):
+        return f'Payment Received From {self.customer.customer_name}'
+
+    def posting_reference(self):
+        return f'customer-{self.customer.customer_name}'
+
+    def posting_party(self):
+        return {'customer_id': self.customer_id}
 
 
 class Supplier(models.Model):
@@ -114,85 +252,64 @@ class Supplier(models.Model):
     def __str__(self):
         return self.company_name
 
-class Bill(models.Model):
+class Bill(PostedDocument):
+    date_field = 'created_at'
     account = models.ForeignKey(Accounting_Account, on_delete=models.CASCADE, null=True) # account Payable
-    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE)
+    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, db_index=False)
     transaction = models.OneToOneField(Transaction, on_delete=models.CASCADE)
     bill_id = models.IntegerField(default=0)
     amount = models.DecimalField(max_digits=15, decimal_places=2, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
-    def save(
-        self,
-        *args,
-        **kwargs
-    ):
-        if self.pk is None:  # or if self._state.adding
-            # This is a new object being created (INSERT)
-            #self.amount = self.price_per_meter * self.delivered
-            t = Transaction.objects.create(description=f'Bill received From {self.supplier.company_name}', reference =f'supplier-{self.id}', is_approved=True)
-            j = Journal.objects.create( account = self.account,transaction=t,credit=self.amount)
-            acc = Accounting_Account.objects.get(pk=1)
-            j1 = Journal.objects.create( account = acc,transaction=t,debit=self.amount) # credit rev account
-            self.transaction = t
-            print("Creating a new MyModel instance.")
-        else:
-            # This is an existing object being updated (UPDATE)
-
-            j = Journal.objects.get(transaction=self.transaction, credit=0)
-            j.debit = self.amount # update ar account
-            j.save()
-            j1 = Journal.objects.get(transaction=self.transaction, debit=0)
-            j1.credit = self.amount # update rev account
-            j1.save()
-            print(f"Updating MyModel instance with primary key: {self.pk}")
-
-        super().save(*args, **kwargs)  # Call the original save method
+    class Meta:
+        indexes = [
+            # Payables aging walks each supplier's bills oldest first
+            models.Index(fields=['supplier', 'created_at', 'id'], name='bill_supplier_idx'),
+            # Exports: date order and date range filters
+            models.Index(fields=['created_at', 'id'], name='bill_date_idx'),
+        ]
 
-    def delete(self, *args, **kwargs):
-        # Delete the related User object before deleting the Profile object
-        self.transaction.delete()
-        # Call the original delete method to delete the Profile object
-        return super().delete(*args, **kwargs)
+    def posting_accounts(self):
+        # debit purchase, credit account payable
+        return get_ledger_account('purchase').pk, self.account_id
+
+    def posting_description(self):
+        return f'Bill received From {self.supplier.company_name}'
 
-class SupplierPayment(models.Model):
+    def posting_reference(self):
+        return f'supplier-{self.supplier_id}'
+
+    def posting_party(self):
+        return {'supplier_id': self.supplier_id}
+
+class SupplierPayment(PostedDocument):
+    date_field = 'date'
     account = models.ForeignKey(Accounting_Account, on_delete=models.CASCADE, null=True) # Asset Account Credit
-    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE)
+    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, db_index=False)
     transaction = models.OneToOneField(Transaction, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=15, decimal_places=2, default=0)
     date = models.DateTimeField(auto_now=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
-    def save(
-        self,
-        *args,
-        **kwargs
-    ):
-        if self.pk is None:  # or if self._state.adding
-            # This is a new object being created (INSERT)
-            t = Transaction.objects.create(description=f'Payment Done to {self.supplier.company_name}', reference =f'supplier-{self.supplier.id}', is_approved=True)
-            j = Journal.objects.create( account = self.account,transaction=t,credit=self.amount)
-            acc = Accounting_Account.objects.get(pk=8)
-            j1 = Journal.objects.create( account = acc,transaction=t,debit=self.amount)
-            self.transaction = t
-            print("Creating a new MyModel instance.")
-        else:
-            # This is an existing object being updated (UPDATE)
-            j = Journal.objects.get(transaction=self.transaction, credit=0)
-            j.debit = self.amount
-            j.save()
-            j1 = Journal.objects.get(transaction=self.transaction, debit=0)
-            j1.credit = self.amount
-            j1.save()
-            print(f"Updating MyModel instance with primary key: {self.pk}")
-
-        super().save(*args, **kwargs)  # Call the original save method
+    class Meta:
+        indexes = [
+            models.Index(fields=['supplier', 'date'], name='supplierpayment_supplier_idx'),
+            # Exports: date order and date range filters
+            models.Index(fields=['date', 'id'], name='supplierpayment_date_idx'),
+        ]
 
-    def delete(self, *args, **kwargs):
-        # Delete the related User object before deleting the Profile object
-        self.transaction.delete()
-        # Call the original delete method to delete the Profile object
-        return super().delete(*args, **kwargs)
+    def posting_accounts(self):
+        # debit account payable, credit the asset account paid from
+        return get_ledger_account('payable').pk, self.account_id
+
+    def posting_description(self):
+        return f'Payment Done to {self.supplier.company_name}'
+
+    def posting_reference(self):
+        return f'supplier-{self.supplier_id}'
+
+    def posting_party(self):
+        return {'supplier_id': self.supplier_id}
 
 
 class Order(models.Model):
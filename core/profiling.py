@@ -0,0 +1,174 @@
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Parts of a statement that change between executions of the same query
+IN_LIST = re.compile(r'\bIN \(%s(?:, %s)*\)', re.IGNORECASE)
+NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+STRING = re.compile(r"'(?:[^']|'')*'")
+# Duplicates kept per URL name in the aggregated stats
+TOP_DUPLICATES = 5
+
+
+def fingerprint(sql):
+    """The statement with its literals and IN lists folded, so repeated queries compare equal"""
+    sql = IN_LIST.sub('IN (...)', sql)
+    sql = STRING.sub('?', sql)
+    sql = NUMBER.sub('?', sql)
+    return ' '.join(sql.split())
+
+
+def caller(skip=2):
+    """'path:line in function' of the innermost project frame on the stack, outside this module"""
+    root = str(settings.BASE_DIR) + os.sep
+    frame = sys._getframe(skip)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(root) and filename != __file__ and 'site-packages' not in filename:
+            return f"{filename[len(root):]}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+class QueryProfile:
+    """
+    Execute wrapper that counts and times the queries of one request
+    The time covers execute() only; SQLite produces rows while they are fetched, so reading
+    a large result shows up in the wall time rather than the database time. The stack is only
+    walked for the first execution of each fingerprint, which is enough to point at the loop
+    behind an N+1 pattern.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints = Counter()
+        self.locations = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            key = fingerprint(sql)
+            self.fingerprints[key] += 1
+            if key not in self.locations:
+                self.locations[key] = caller()
+
+    def duplicates(self):
+        """(fingerprint, executions, location) of every statement run more than once, most repeated first"""
+        return [(key, count, self.locations[key]) for key, count in self.fingerprints.most_common() if count > 1]
+
+
+class QueryStats:
+    """Per URL name totals of this process, safe to update from several threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def record(self, name, profile, wall_seconds, slow):
+        with self.lock:
+            view = self.views.setdefault(name, {
+                'requests': 0, 'slow_requests': 0, 'queries': 0, 'max_queries': 0,
+                'db_ms': 0.0, 'wall_ms': 0.0, 'max_wall_ms': 0.0, 'duplicates': Counter(), 'locations': {},
+            })
+            view['requests'] += 1
+            view['slow_requests'] += slow
+            view['queries'] += profile.count
+            view['max_queries'] = max(view['max_queries'], profile.count)
+            view['db_ms'] += profile.seconds * 1000
+            view['wall_ms'] += wall_seconds * 1000
+            view['max_wall_ms'] = max(view['max_wall_ms'], wall_seconds * 1000)
+            for key, count, location in profile.duplicates():
+                view['duplicates'][key] += count
+                view['locations'].setdefault(key, location)
+
+    def snapshot(self):
+        """List of per URL name stats, the most database time first"""
+        with self.lock:
+            rows = []
+            for name, view in self.views.items():
+                requests = view['requests']
+                rows.append({
+                    'name': name,
+                    'requests': requests,
+                    'slow_requests': view['slow_requests'],
+                    'avg_queries': round(view['queries'] / requests, 1),
+                    'max_queries': view['max_queries'],
+                    'avg_db_ms': round(view['db_ms'] / requests, 2),
+                    'avg_wall_ms': round(view['wall_ms'] / requests, 2),
+                    'max_wall_ms': round(view['max_wall_ms'], 2),
+                    'total_db_ms': round(view['db_ms'], 2),
+                    'duplicates': [
+                        {'sql': key, 'executions': count, 'location': view['locations'][key]}
+                        for key, count in view['duplicates'].most_common(TOP_DUPLICATES)
+                    ],
+                })
+        return sorted(rows, key=lambda row: row['total_db_ms'], reverse=True)
+
+    def reset(self):
+        with self.lock:
+            self.views.clear()
+
+
+stats = QueryStats()
+
+
+class QueryProfilerMiddleware:
+    """
+    Profile the SQL of every request when settings.QUERY_PROFILER is on
+    Requests slower than QUERY_PROFILER_SLOW_MS, with more than QUERY_PROFILER_MAX_QUERIES
+    queries or with a statement repeated QUERY_PROFILER_DUPLICATES times are logged with
+    where the repeated statements come from. Totals per URL name are kept in `stats`.
+    Queries run while a streaming response is consumed are not seen.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_PROFILER:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = QueryProfile()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(profile))
+            response = self.get_response(request)
+        wall_seconds = time.perf_counter() - started
+
+        match = request.resolver_match
+        name = match.view_name if match else '<unresolved>'
+        duplicates = profile.duplicates()
+        slow = (wall_seconds * 1000 >= settings.QUERY_PROFILER_SLOW_MS
+                or profile.count > settings.QUERY_PROFILER_MAX_QUERIES
+                or bool(duplicates and duplicates[0][1] >= settings.QUERY_PROFILER_DUPLICATES))
+        stats.record(name, profile, wall_seconds, slow)
+        if slow:
+            self.log(request, name, profile, wall_seconds, duplicates)
+        return response
+
+    def log(self, request, name, profile, wall_seconds, duplicates):
+        lines = [f"{request.method} {request.path} ({name}): {wall_seconds * 1000:.0f} ms, "
+                 f"{profile.count} queries in {profile.seconds * 1000:.0f} ms"]
+        for key, count, location in duplicates[:TOP_DUPLICATES]:
+            lines.append(f"  {count}x at {location or 'unknown'}: {key[:300]}")
+        logger.warning('\n'.join(lines), extra={
+            'method': request.method, 'path': request.path, 'view': name,
+            'duration_ms': round(wall_seconds * 1000), 'queries': profile.count,
+            'db_ms': round(profile.seconds * 1000),
+        })
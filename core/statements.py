@@ -0,0 +1,122 @@
+from decimal import Decimal
+
+from django.db.models import F, Q, Sum, Case, When, Value, Window, CharField, DecimalField
+from django.db.models.functions import Coalesce, TruncDate
+
+from accounting.models import Transaction
+
+ZERO = Decimal('0')
+AMOUNT = DecimalField(max_digits=15, decimal_places=2)
+
+
+def _movements(party, charge, settlement, charge_side):
+    """
+    The party's transactions with the amount of the document behind each one
+    :param party: Lookup of the party on Transaction, e.g. {'customer': customer}
+    :param charge: Reverse name of the document that increases the balance, e.g. 'delivered'
+    :param settlement: Reverse name of the document that reduces it, e.g. 'payment'
+    :param charge_side: 'debit' when charges are debits in our books (receivables), 'credit' otherwise
+    :return: Transactions annotated with debit, credit, change and day, the local day of the
+             document's own date; a backdated document is posted today but belongs on its day
+    """
+    dated = [f'{name}__{Transaction._meta.get_field(name).related_model.date_field}' for name in (charge, settlement)]
+    charged = Coalesce(f'{charge}__amount', Value(ZERO), output_field=AMOUNT)
+    settled = Coalesce(f'{settlement}__amount', Value(ZERO), output_field=AMOUNT)
+    debit, credit = (charged, settled) if charge_side == 'debit' else (settled, charged)
+    return Transaction.objects.filter(**party).annotate(
+        debit=debit,
+        credit=credit,
+        change=charged - settled,
+        day=TruncDate(Coalesce(*dated)),
+    )
+
+
+def _balances(movements, from_date, to_date, after=None):
+    """
+    Balances around the statement window, with one aggregate query
+    :param after: Optional (day, transaction id) position in the statement
+    :return: Tuple of (opening balance before from_date, closing balance at the end of to_date,
+             balance at the after position)
+    """
+    def balance(condition=None):
+        change = F('change')
+        if condition is not None:
+            change = Case(When(condition, then=change), default=Value(ZERO), output_field=AMOUNT)
+        return Coalesce(Sum(change, output_field=AMOUNT), Value(ZERO), output_field=AMOUNT)
+
+    nothing = Q(pk__in=[])
+    totals = movements.order_by().aggregate(
+        opening=balance(Q(day__lt=from_date) if from_date else nothing),
+        closing=balance(Q(day__lte=to_date) if to_date else None),
+        carried=balance(nothing if after is None else Q(day__lt=after[0]) | Q(day=after[0], id__lte=after[1])),
+    )
+    return totals['opening'], totals['closing'], totals['carried']
+
+
+def _statement(movements, documents, from_date=None, to_date=None, after=None):
+    """
+    Statement lines with an opening and running balance
+    The running balance is a window sum over the lines in the date range, offset by the
+    balance before the first returned line, so any page of the lines carries correct
+    balances without reading the rows before it.
+
+    :param documents: Tuple of (reverse name, label) for each document type behind the lines
+    :param after: Optional (day, transaction id) of the last line already read; only later lines are returned
+    """
+    opening_balance, closing_balance, carried = _balances(movements, from_date, to_date, after)
+    lines = movements
+    if from_date:
+        lines = lines.filter(day__gte=from_date)
+    if to_date:
+        lines = lines.filter(day__lte=to_date)
+    if after is not None:
+        lines = lines.filter(Q(day__gt=after[0]) | Q(day=after[0], id__gt=after[1]))
+
+    lines = lines.annotate(
+        document=Case(
+            *[When(**{f'{name}__isnull': False}, then=Value(label)) for name, label in documents],
+            output_field=CharField(),
+        ),
+        document_id=Coalesce(*[f'{name}__id' for name, _ in documents]),
+        balance=Window(Sum('change', output_field=AMOUNT), order_by=[F('day').asc(), F('id').asc()])
+                + Value(opening_balance if after is None else carried, output_field=AMOUNT),
+    ).order_by('day', 'id').values(
+        'id', 'day', 'document', 'document_id', 'description', 'reference', 'debit', 'credit', 'balance'
+    )
+
+    return {
+        'from_date': from_date,
+        'to_date': to_date,
+        'opening_balance': opening_balance,
+        'closing_balance': closing_balance,
+        'lines': lines,
+    }
+
+
+def customer_statement(customer, from_date=None, to_date=None, after=None):
+    """
+    Deliveries and payments of a customer with opening, running and closing balances
+    :param customer: Customer
+    :param from_date: First day of the statement, None for the customer's first transaction
+    :param to_date: Last day of the statement, None for today
+    :param after: Optional (day, transaction id) of the last line already read
+    :return: Dictionary with customer, from_date, to_date, opening_balance, closing_balance and
+             lines, an unevaluated queryset of dicts (id, day, document, document_id, description,
+             reference, debit, credit, balance) that callers can paginate
+    """
+    movements = _movements({'customer': customer}, 'delivered', 'payment', charge_side='debit')
+    statement = _statement(movements, [('delivered', 'delivery'), ('payment', 'payment')],
+                           from_date, to_date, after)
+    return {'customer': customer, **statement}
+
+
+def supplier_statement(supplier, from_date=None, to_date=None, after=None):
+    """
+    Bills and payments of a supplier; the balance is what we owe them
+    Bills are credited to payables and payments debited, as in the ledger.
+    Parameters and result as customer_statement, with supplier in place of customer.
+    """
+    movements = _movements({'supplier': supplier}, 'bill', 'supplierpayment', charge_side='credit')
+    statement = _statement(movements, [('bill', 'bill'), ('supplierpayment', 'payment')],
+                           from_date, to_date, after)
+    return {'supplier': supplier, **statement}
@@ -1,3 +1,305 @@
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db.models import Sum
 from django.test import TestCase
+from django.utils import timezone
+
+from accounting.models import Category, Accounting_Account, AccountBalance, AccountSnapshot, Journal, Transaction
+from core.aging import payables_aging, receivables_aging
+from core.imports import DeliveryImporter, PaymentImporter
+from core.models import Customer, Delivered, Payment, Supplier, Bill, SupplierPayment
+from normerp.log import BackgroundHandler, JsonFormatter, RequestIdFilter, request_id
+from normerp.metrics import REGISTRY, Counter, DOCUMENTS_POSTED, JOURNAL_LINES, LOG_RECORDS_DROPPED
+
+
+class ReceivablesAgingTests(TestCase):
+
+    def setUp(self):
+        receivable = Category.objects.create(name='Receivable', category_type='A')
+        sales = Category.objects.create(name='Sale', category_type='I')
+        self.account = Accounting_Account.objects.create(name='Receivable', code='AR', category=receivable)
+        self.revenue = Accounting_Account.objects.create(name='Sales', code='REV', category=sales)
+        self.customer = Customer.objects.create(customer_name='Acme', owner_name='Owner')
+
+    def deliver(self, amount, days_ago):
+        with self.settings(LEDGER_ACCOUNTS={'revenue': self.revenue.pk}):
+            delivery = Delivered.objects.create(account=self.account, customer=self.customer,
+                                                price_per_meter=amount, delivered=1)
+        Delivered.objects.filter(pk=delivery.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+
+    def pay(self, amount, days_ago=0):
+        with self.settings(LEDGER_ACCOUNTS={'revenue': self.revenue.pk}):
+            Payment.objects.create(account=self.account, customer=self.customer, amount=amount,
+                                   date=timezone.now() - timedelta(days=days_ago))
+
+    def test_payments_settle_oldest_deliveries_first(self):
+        self.deliver(100, days_ago=100)
+        self.deliver(50, days_ago=70)
+        self.deliver(30, days_ago=5)
+        self.pay(120)
+
+        [row] = receivables_aging().rows
+        self.assertEqual(row.buckets, [Decimal('30.00'), Decimal('0.00'), Decimal('30.00'), Decimal('0.00')])
+        self.assertEqual(row.total, Decimal('60.00'))
+
+    def test_as_of_date(self):
+        self.deliver(100, days_ago=40)
+        self.pay(100, days_ago=1)
+
+        self.assertEqual(receivables_aging().rows, [])
+        [row] = receivables_aging(timezone.localdate() - timedelta(days=10)).rows
+        self.assertEqual(row.buckets[0], Decimal('100.00'))
+
+    def test_overpayment_is_unapplied(self):
+        self.deliver(40, days_ago=3)
+        self.pay(100)
+
+        [row] = receivables_aging().rows
+        self.assertEqual(row.unapplied, Decimal('60.00'))
+        self.assertEqual(row.total, Decimal('-60.00'))
+
+
+class PayablesAgingTests(TestCase):
+
+    def test_supplier_payments_settle_oldest_bills_first(self):
+        payable = Accounting_Account.objects.create(
+            name='Payable', code='AP', category=Category.objects.create(name='Payable', category_type='L'))
+        purchase = Accounting_Account.objects.create(
+            name='Purchase', code='PUR', category=Category.objects.create(name='Purchase', category_type='X'))
+        supplier = Supplier.objects.create(company_name='Inks Ltd', product='Ink')
+
+        with self.settings(LEDGER_ACCOUNTS={'purchase': purchase.pk, 'payable': payable.pk}):
+            old = Bill.objects.create(account=payable, supplier=supplier, amount=80)
+            Bill.objects.create(account=payable, supplier=supplier, amount=40)
+            SupplierPayment.objects.create(account=payable, supplier=supplier, amount=100)
+        Bill.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=45))
+
+        [row] = payables_aging().rows
+        self.assertEqual(row.party, supplier)
+        self.assertEqual(row.buckets[:2], [Decimal('20.00'), Decimal('0.00')])
+
+
+class PostedDocumentTests(TestCase):
+
+    def setUp(self):
+        cash = Category.objects.create(name='Cash', category_type='A')
+        sales = Category.objects.create(name='Sale', category_type='I')
+        self.account = Accounting_Account.objects.create(name='Cash', code='CASH', category=cash)
+        self.revenue = Accounting_Account.objects.create(name='Sales', code='REV', category=sales)
+        self.customer = Customer.objects.create(customer_name='Acme', owner_name='Owner')
+
+    def test_editing_the_amount_moves_both_lines(self):
+        with self.settings(LEDGER_ACCOUNTS={'revenue': self.revenue.pk}):
+            payment = Payment.objects.create(account=self.account, customer=self.customer, amount=100,
+                                             date=timezone.now())
+            payment = Payment.objects.get(pk=payment.pk)
+            payment.amount = Decimal('75')
+            payment.save()
+
+        self.assertEqual(
+            sorted(Journal.objects.filter(transaction_id=payment.transaction_id).values_list('debit', 'credit')),
+            [(Decimal('0'), Decimal('75')), (Decimal('75'), Decimal('0'))],
+        )
+        self.assertEqual(AccountBalance.objects.get(account=self.account).balance, Decimal('75'))
+        self.assertEqual(AccountBalance.objects.get(account=self.revenue).balance, Decimal('75'))
+
+    def test_document_without_account_is_rejected(self):
+        with self.settings(LEDGER_ACCOUNTS={'revenue': self.revenue.pk}):
+            with self.assertRaisesMessage(ValidationError, 'journal line has no account'):
+                Payment.objects.create(customer=self.customer, amount=100, date=timezone.now())
+            with self.assertRaisesMessage(ValidationError, 'journal line has no account'):
+                Payment.bulk_post([Payment(customer=self.customer, amount=100, date=timezone.now())], 'date')
+        self.assertFalse(Transaction.objects.exists())
+        self.assertFalse(Payment.objects.exists())
+
+
+class CsvImportTests(TestCase):
+
+    def setUp(self):
+        cash = Category.objects.create(name='Cash', category_type='A')
+        sales = Category.objects.create(name='Sale', category_type='I')
+        self.cash = Accounting_Account.objects.create(name='Cash', code='CASH', category=cash)
+        self.receivable = Accounting_Account.objects.create(name='Receivable', code='AR', category=cash)
+        self.revenue = Accounting_Account.objects.create(name='Sales', code='REV', category=sales)
+        self.customer = Customer.objects.create(customer_name='Acme', owner_name='Owner', price_per_meter=3)
+        Customer.objects.create(customer_name='Twin', owner_name='One')
+        Customer.objects.create(customer_name='Twin', owner_name='Two')
+
+    def run_import(self, importer, text, chunk_size=2):
+        with self.settings(LEDGER_ACCOUNTS={'revenue': self.revenue.pk}):
+            return importer(chunk_size=chunk_size).run(io.StringIO(text))
+
+    def test_payments_are_posted_on_their_dates(self):
+        result = self.run_import(PaymentImporter, (
+            "date,customer,account,amount\n"
+            "2024-01-15,Acme,CASH,100.50\n"
+            f"2024-02-01 10:30,{self.customer.pk},CASH,20\n"
+            "2024-02-02,Nobody,CASH,5\n"
+            "2024-02-03,Twin,CASH,5\n"
+            "2024-02-04,acme,CASH,-5\n"
+            "2024-02-05,Acme,BANK,5\n"
+            "2024-02-30,Acme,CASH,5\n"
+        ))
+
+        self.assertEqual((result.rows, result.created, result.failed), (7, 2, 5))
+        self.assertEqual([line for line, _ in result.errors], [4, 5, 6, 7, 8])
+        self.assertIn('use the customer id', result.errors[1][1])
+
+        first = Payment.objects.get(amount=Decimal('100.50'))
+        self.assertEqual(first.transaction.date, date(2024, 1, 15))
+        self.assertEqual(first.transaction.customer_id, self.customer.pk)
+        self.assertEqual({timezone.localdate(j.date) for j in first.transaction.journal_entries.all()},
+                         {date(2024, 1, 15)})
+        self.assertEqual(Journal.objects.count(), 4)
+        self.assertEqual(AccountBalance.objects.get(account=self.cash).total_debit, Decimal('120.50'))
+
+    def test_deliveries_keep_their_dates_and_shift_snapshots(self):
+        AccountSnapshot.take(date(2024, 1, 31))
+        AccountSnapshot.take(date(2024, 2, 29))
+        result = self.run_import(DeliveryImporter, (
+            "date,customer,account,delivered,price_per_meter\n"
+            "2024-01-10,Acme,AR,10,\n"
+            "2024-02-10,Acme,AR,2,50\n"
+            "2024-02-11,Acme,AR,0,50\n"
+        ))
+
+        self.assertEqual((result.created, result.failed), (2, 1))
+        first, second = Delivered.objects.order_by('created_at')
+        self.assertEqual((first.amount, timezone.localdate(first.created_at)), (Decimal('30.00'), date(2024, 1, 10)))
+        self.assertEqual(second.amount, Decimal('100.00'))
+
+        totals = dict(AccountSnapshot.objects.filter(account=self.receivable).values_list('as_of', 'total_debit'))
+        self.assertEqual(totals, {date(2024, 1, 31): Decimal('30.00'), date(2024, 2, 29): Decimal('130.00')})
+        [row] = receivables_aging().rows
+        self.assertEqual(row.buckets[-1], Decimal('130.00'))
+
+    def test_missing_columns(self):
+        with self.assertRaisesMessage(ValueError, 'Missing columns: amount'):
+            self.run_import(PaymentImporter, "date,customer,account\n")
+
+
+class SyntheticLedgerTests(TestCase):
+
+    def test_generated_ledger_is_consistent(self):
+        call_command('generate_ledger', customers=20, suppliers=5, documents=300, chunk_size=100,
+                     stdout=io.StringIO())
+
+        self.assertEqual(Transaction.objects.count(), 300)
+        self.assertTrue(Accounting_Account.objects.filter(code='cash', category__name='Cash').exists())
+        totals = Journal.objects.aggregate(debit=Sum('debit'), credit=Sum('credit'))
+        self.assertEqual(totals['debit'], totals['credit'])
+        # The running balances moved with the bulk posting agree with a rebuild from the journals
+        before = dict(AccountBalance.objects.values_list('pk', 'balance'))
+        AccountBalance.rebuild()
+        self.assertEqual(dict(AccountBalance.objects.values_list('pk', 'balance')), before)
+        self.assertTrue(AccountSnapshot.objects.exists())
+
+        with self.assertRaisesMessage(CommandError, 'already has transactions'):
+            call_command('generate_ledger', documents=1, stdout=io.StringIO())
+
+    def test_benchmark_suite_writes_json(self):
+        call_command('generate_ledger', customers=5, suppliers=2, documents=50, no_snapshots=True,
+                     stdout=io.StringIO())
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            call_command('benchmark_suite', 'report', 'posting.payment_save', repeat=1, output=output,
+                         stdout=io.StringIO())
+            call_command('benchmark_suite', 'report', repeat=1, compare=output, threshold=100,
+                         stdout=io.StringIO())
+            with open(output) as f:
+                results = json.load(f)
+
+        self.assertEqual(results['dataset']['transactions'], 50)
+        self.assertIn('items_per_second', results['results']['posting.payment_save'])
+        self.assertIn('median_ms', results['results']['report.balance_sheet'])
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        assets = Category.objects.create(name='Cash', category_type='A')
+        sales = Category.objects.create(name='Sale', category_type='I')
+        self.account = Accounting_Account.objects.create(name='Cash', code='CASH', category=assets)
+        self.revenue = Accounting_Account.objects.create(name='Sales', code='REV', category=sales)
+        self.customer = Customer.objects.create(customer_name='Acme', owner_name='Owner')
+
+    def test_posting_is_counted_once_committed(self):
+        documents = DOCUMENTS_POSTED.totals().get(('Payment',), 0)
+        lines = JOURNAL_LINES.totals().get((), 0)
+        with self.settings(LEDGER_ACCOUNTS={'revenue': self.revenue.pk}):
+            with self.captureOnCommitCallbacks(execute=True):
+                Payment.objects.create(account=self.account, customer=self.customer, amount=100,
+                                       date=timezone.now())
+                self.assertEqual(DOCUMENTS_POSTED.totals().get(('Payment',), 0), documents)
+
+        self.assertEqual(DOCUMENTS_POSTED.totals()[('Payment',)], documents + 1)
+        self.assertEqual(JOURNAL_LINES.totals()[()], lines + 2)
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn(f'normerp_documents_posted_total{{type="Payment"}} {documents + 1}', body)
+        self.assertIn('# TYPE normerp_report_seconds histogram', body)
+
+    def test_short_lived_threads_leave_nothing_behind(self):
+        counter = Counter('test_thread_updates_total', 'Updates from short-lived threads', ['kind'])
+        self.addCleanup(REGISTRY.remove, counter)
+        threads = [threading.Thread(target=counter.inc, kwargs={'kind': 'request'}) for _ in range(200)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(counter.totals(), {('request',): 200})
+        self.assertEqual(len(counter.values), 1)
+
+    def test_token_is_required_when_set(self):
+        with self.settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+
+class StructuredLoggingTests(TestCase):
+
+    def test_records_are_json_with_request_id_and_fields(self):
+        record = logging.LogRecord('core.models', logging.DEBUG, __file__, 1, "Document %s", ('posted',), None)
+        record.amount = Decimal('12.50')
+        token = request_id.set('abc123')
+        try:
+            RequestIdFilter().filter(record)
+        finally:
+            request_id.reset(token)
+
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertEqual(entry['message'], 'Document posted')
+        self.assertEqual(entry['level'], 'DEBUG')
+        self.assertEqual(entry['logger'], 'core.models')
+        self.assertEqual(entry['request_id'], 'abc123')
+        self.assertEqual(entry['amount'], '12.50')
+
+    def test_request_id_is_returned_and_kept_from_the_proxy(self):
+        generated = self.client.get('/metrics')['X-Request-ID']
+        self.assertRegex(generated, r'^[0-9a-f]{32}$')
+        self.assertEqual(self.client.get('/metrics', HTTP_X_REQUEST_ID='edge-42')['X-Request-ID'], 'edge-42')
+        self.assertNotEqual(self.client.get('/metrics', HTTP_X_REQUEST_ID='bad id\n')['X-Request-ID'], 'bad id\n')
+
+    def test_background_handler_drops_records_when_the_queue_is_full(self):
+        stream = io.StringIO()
+        handler = BackgroundHandler(stream, queue_size=1)
+        handler.stop()  # nothing drains the queue
+        dropped = LOG_RECORDS_DROPPED.totals().get((), 0)
+        for n in range(3):
+            handler.handle(logging.LogRecord('test', logging.INFO, __file__, 1, "Event %d", (n,), None))
+        self.assertEqual(LOG_RECORDS_DROPPED.totals()[()], dropped + 2)
 
-# Create your tests here.
+        handler.start()
+        handler.stop()  # stopping flushes the queue
+        self.assertEqual(json.loads(stream.getvalue())['message'], 'Event 0')
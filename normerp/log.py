@@ -0,0 +1,136 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import uuid
+from datetime import datetime, timezone
+
+from normerp.metrics import LOG_RECORDS_DROPPED
+
+# Records waiting for the writer thread; when full, new records are dropped rather than block
+QUEUE_SIZE = 10_000
+# Request ids accepted from a proxy's X-Request-ID header, anything else is replaced
+REQUEST_ID = re.compile(r'[A-Za-z0-9._-]{1,64}')
+
+request_id = contextvars.ContextVar('request_id', default=None)
+
+# Attributes every LogRecord has; any other attribute came from extra= and is logged as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the id of the request being handled, on the thread logging them"""
+
+    def filter(self, record):
+        # django.request logs error responses after the middleware returned, with the request attached
+        record.request_id = request_id.get() or getattr(getattr(record, 'request', None), 'id', None)
+        return True
+
+
+class SampleFilter(logging.Filter):
+    """
+    Keep a share of the records below WARNING
+    With rate=0.01 one DEBUG or INFO event in a hundred is written; warnings and errors always are.
+    """
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request id and the extra= fields"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry and key != 'request_id':
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        # Decimals, dates and model instances are written as text
+        return json.dumps(entry, default=str)
+
+
+class BackgroundHandler(logging.handlers.QueueHandler):
+    """
+    Hand records to a thread that writes them as JSON lines, so a request never waits on stderr
+    Messages and tracebacks are turned into text here, on the logging thread, as the objects they
+    refer to may change afterwards; the JSON encoding and the write happen on the writer thread.
+    Records that do not fit in the queue are dropped and counted in normerp_log_records_dropped_total.
+    """
+
+    def __init__(self, stream=None, queue_size=QUEUE_SIZE):
+        super().__init__(queue.Queue(queue_size))
+        self.target = logging.StreamHandler(stream or sys.stderr)
+        self.target.setFormatter(JsonFormatter())
+        self.listener = None
+        self.start()
+        atexit.register(self.stop)
+        # A forked worker (e.g. gunicorn with --preload) has the queue but not the writer thread
+        os.register_at_fork(after_in_child=self.start)
+
+    def start(self):
+        self.listener = logging.handlers.QueueListener(self.queue, self.target)
+        self.listener.start()
+
+    def stop(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = self.target.formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+class RequestIdMiddleware:
+    """
+    Give every request an id, taken from X-Request-ID when a proxy sets one, for its log records
+    The id is returned in the X-Request-ID response header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        incoming = request.headers.get('X-Request-ID', '')
+        request.id = incoming if REQUEST_ID.fullmatch(incoming) else uuid.uuid4().hex
+        token = request_id.set(request.id)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_id.reset(token)
+        response['X-Request-ID'] = request.id
+        return response
@@ -0,0 +1,161 @@
+import bisect
+import functools
+import hmac
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Seconds, from a quick lookup to a report over years of journals
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Metrics of this process, served as text at /metrics. Each process (e.g. each gunicorn
+# worker) counts on its own; scrape them one by one or add them up in Prometheus.
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _label_text(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        # One lock per metric; an update holds it for a dictionary update, far less than
+        # the SQL write or PDF render being measured
+        self.lock = threading.Lock()
+        self.values = {}
+        REGISTRY.append(self)
+
+    def key(self, labels):
+        # Label values are turned into text when scraped, not on every update
+        return tuple([labels[name] for name in self.labels])
+
+    def lines(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def totals(self):
+        with self.lock:
+            items = list(self.values.items())
+        totals = {}
+        for key, value in items:
+            key = tuple(map(str, key))
+            totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def lines(self):
+        yield from super().lines()
+        for key, value in sorted(self.totals().items()):
+            yield f"{self.name}{_label_text(self.labels, key)} {_number(value)}"
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            # Per bucket counts (not cumulative), then the sum and the count
+            row = self.values.get(key)
+            if row is None:
+                row = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            row[bucket] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def time(self, **labels):
+        """Decorator timing every call of a function"""
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - started, **labels)
+            return wrapper
+        return decorator
+
+    def lines(self):
+        yield from super().lines()
+        with self.lock:
+            items = [(key, list(row)) for key, row in self.values.items()]
+        totals = {}
+        for key, row in items:
+            total = totals.setdefault(tuple(map(str, key)), [0] * len(row))
+            for n, value in enumerate(row):
+                total[n] += value
+        for key, row in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), row):
+                cumulative += count
+                le = bound if bound == '+Inf' else _number(float(bound))
+                yield f"{self.name}_bucket{_label_text(self.labels, key, [('le', le)])} {cumulative}"
+            yield f"{self.name}_sum{_label_text(self.labels, key)} {_number(row[-2])}"
+            yield f"{self.name}_count{_label_text(self.labels, key)} {row[-1]}"
+
+
+def exposition():
+    """All metrics in the Prometheus text format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.lines())
+    return '\n'.join(lines) + '\n'
+
+
+DOCUMENTS_POSTED = Counter('normerp_documents_posted_total', 'Documents posted to the ledger', ['type'])
+JOURNAL_LINES = Counter('normerp_journal_lines_total', 'Journal lines written by the posting service')
+REPORT_SECONDS = Histogram('normerp_report_seconds', 'Time to generate a financial report', ['report'])
+REPORT_CACHE = Counter('normerp_report_cache_requests_total', 'Report cache lookups', ['report', 'result'])
+PDF_RENDER_SECONDS = Histogram('normerp_pdf_render_seconds', 'Time to convert one HTML document to PDF',
+                               ['template'])
+LOG_RECORDS_DROPPED = Counter('normerp_log_records_dropped_total', 'Log records dropped because the log queue was full')
+
+
+def report_timer(function):
+    """Time a generate_* report function under its own name"""
+    return REPORT_SECONDS.time(report=function.__name__)(function)
+
+
+def metrics_view(request):
+    """
+    The metrics of the process answering, for Prometheus to scrape
+    With METRICS_TOKEN set, the scraper must send it as a bearer token.
+    """
+    token = settings.METRICS_TOKEN
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    response = HttpResponse(exposition(), content_type=CONTENT_TYPE)
+    response['X-Process-Id'] = str(os.getpid())
+    return response
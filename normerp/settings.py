@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -41,10 +44,15 @@ INSTALLED_APPS = [
     'accounting',
     'hrm',
     'api',
+    'reports',
     'rest_framework',
 ]
 
 MIDDLEWARE = [
+    # First, so every log record of the request carries its id
+    'normerp.log.RequestIdMiddleware',
+    # Next, so it sees every query of the request; does nothing unless QUERY_PROFILER is on
+    'core.profiling.QueryProfilerMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -77,14 +85,146 @@ WSGI_APPLICATION = 'normerp.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
+# Configured from the environment: DB_ENGINE=postgresql for production, SQLite otherwise.
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    # Needs psycopg 3, with the pool extra (psycopg[pool]) when DB_POOL is set
+    DB_POOL = os.environ.get('DB_POOL', '') not in ('', '0')
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'normerp'),
+            'USER': os.environ.get('DB_USER', 'normerp'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            # Persistent connections, checked before reuse so a restarted server is not an error;
+            # a pool manages its own connections and requires CONN_MAX_AGE = 0
+            'CONN_MAX_AGE': 0 if DB_POOL else int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+                    'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+                    'timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+                },
+            } if DB_POOL else {},
+        }
+    }
+elif DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # Seconds a writer waits for the lock instead of failing with "database is locked"
+                'timeout': int(os.environ.get('DB_SQLITE_TIMEOUT', 20)),
+                # Take the write lock when a transaction starts; upgrading a read lock midway
+                # fails at once, whatever the timeout
+                'transaction_mode': 'IMMEDIATE',
+                # WAL lets reports read while cashiers write; with synchronous=NORMAL a commit
+                # only waits for the WAL write, the database file is synced at checkpoints.
+                # mmap_size is in bytes, a negative cache_size in KiB per connection.
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    f"PRAGMA mmap_size={int(os.environ.get('DB_SQLITE_MMAP_SIZE', 256 * 1024 * 1024))};"
+                    f"PRAGMA cache_size={-int(os.environ.get('DB_SQLITE_CACHE_KB', 64 * 1024))};"
+                    'PRAGMA temp_store=MEMORY;'
+                ),
+            },
+        }
+    }
+else:
+    raise ImproperlyConfigured(f"DB_ENGINE must be 'postgresql' or 'sqlite', not {DB_ENGINE!r}")
+
+# Cache
+# Financial reports are cached and invalidated through ledger version counters kept in the
+# cache itself. With the default per-process LocMemCache a posting only bumps the counters of
+# the worker that handled it, so every deployment with more than one worker process must set
+# CACHE_BACKEND to a shared backend: redis (needs redis-py), memcached (needs pymemcache) or
+# database (run createcachetable first). `manage.py check --deploy` warns about LocMemCache.
+
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'normerp'),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://localhost:6379/1'),
+    'memcached': ('django.core.cache.backends.memcached.PyMemcacheCache', 'localhost:11211'),
+    'database': ('django.core.cache.backends.db.DatabaseCache', 'normerp_cache'),
+}
+
+if CACHE_BACKEND not in CACHE_BACKENDS:
+    raise ImproperlyConfigured(f"CACHE_BACKEND must be one of {', '.join(CACHE_BACKENDS)}, not {CACHE_BACKEND!r}")
 
-DATABASES = {
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': os.environ.get('CACHE_LOCATION', CACHE_BACKENDS[CACHE_BACKEND][1]),
     }
 }
 
+# Seconds a report covering today stays cached
+REPORT_CACHE_TIMEOUT = 300
+
+# Seconds a report of a closed period stays cached. Closed reports are only invalidated when a
+# backdated posting bumps the history version, which other workers never see in a per-process
+# cache; there they expire after an hour instead. None keeps them until the version changes.
+REPORT_CACHE_CLOSED_TIMEOUT = 3600 if CACHE_BACKEND == 'locmem' else None
+
+# Threads per process rendering PDF report jobs, see reports.jobs; 0 renders inside the request
+REPORT_JOB_WORKERS = 2
+
+
+# Query profiler, see core.profiling; per URL name stats at /api/profiler/queries/ (staff only)
+QUERY_PROFILER = os.environ.get('QUERY_PROFILER', '') not in ('', '0')
+QUERY_PROFILER_SLOW_MS = 500        # requests slower than this are logged
+QUERY_PROFILER_MAX_QUERIES = 50     # and those running more queries
+QUERY_PROFILER_DUPLICATES = 5       # and those repeating one statement this often (N+1)
+
+# Prometheus metrics of each process at /metrics, see normerp.metrics.
+# When set, scrapers must send "Authorization: Bearer <METRICS_TOKEN>".
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+
+# Logging
+# JSON lines on stderr, written by a background thread, see normerp.log. Every record of a
+# request carries its request_id. LOG_LEVEL=DEBUG shows the per-document and per-report events;
+# LOG_SAMPLE_RATE keeps that share of the DEBUG and INFO records (warnings and errors are all kept).
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', '1'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request_id': {'()': 'normerp.log.RequestIdFilter'},
+        'sample': {'()': 'normerp.log.SampleFilter', 'rate': LOG_SAMPLE_RATE},
+    },
+    'handlers': {
+        'json': {
+            '()': 'normerp.log.BackgroundHandler',
+            'filters': ['request_id', 'sample'],
+        },
+    },
+    'root': {'handlers': ['json'], 'level': LOG_LEVEL},
+    'loggers': {
+        # Instead of Django's plain text console output
+        'django': {'handlers': ['json'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+
+# Ledger
+# Counter accounts (by primary key) that documents post against, see core.models.PostedDocument
+
+LEDGER_ACCOUNTS = {
+    'revenue': 4,   # credited by deliveries and customer payments
+    'purchase': 1,  # debited by supplier bills
+    'payable': 8,   # debited by supplier payments
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -19,6 +19,8 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from normerp.metrics import metrics_view
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -26,4 +28,5 @@ urlpatterns = [
     path('acc/', include('accounting.urls')),
     path('api/', include('api.urls')),
     path('reports/', include('reports.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
@@ -0,0 +1,110 @@
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Callable
+
+from django.utils import timezone
+
+from accounting.financial_reports import generate_balance_sheet, generate_income_statement, generate_trial_balance
+from accounting.models import start_of_day
+from accounting.report_cache import cached_report
+from accounting.views import REPORTS_START, end_of_day
+from core.models import Customer
+from core.statements import customer_statement
+
+
+def no_params(params):
+    return {}
+
+
+@dataclass(frozen=True)
+class ReportSpec:
+    """
+    How to build and render one kind of PDF report
+    parse turns the raw request parameters (strings) into keyword arguments for build and raises
+    ValueError when they are invalid; build returns the template context.
+    """
+    template: str
+    build: Callable
+    parse: Callable = no_params
+    filename: str = 'report'
+
+
+def demo_report():
+    return {
+        'today': datetime.now().strftime('%Y-%m-%d'),
+        'title': 'My PDF Report',
+        'items': [
+            {'name': 'Product 1', 'quantity': 1, 'price': 9.99},
+            {'name': 'Product 2', 'quantity': 3, 'price': 4.99},
+            {'name': 'Product 3', 'quantity': 2, 'price': 7.99},
+        ]
+    }
+
+
+def _day(params, name):
+    """Optional YYYY-MM-DD parameter, raises ValueError when malformed"""
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name}: enter a date as YYYY-MM-DD")
+
+
+def as_of_params(params):
+    return {'as_of': _day(params, 'as_of')}
+
+
+def period_params(params):
+    return {'from_date': _day(params, 'from'), 'to_date': _day(params, 'to')}
+
+
+def customer_statement_params(params):
+    customer = params.get('customer', '')
+    if not customer.isdigit():
+        raise ValueError("customer: enter a customer id")
+    return {'customer_id': int(customer), **period_params(params)}
+
+
+# The builders go through cached_report with the same arguments as the HTML pages,
+# so a PDF of a page that was just viewed reuses its computed dictionary
+
+
+def balance_sheet_report(as_of=None):
+    return cached_report('balance_sheet', generate_balance_sheet,
+                         as_of_date=end_of_day(as_of or timezone.localdate()))
+
+
+def income_statement_report(from_date=None, to_date=None):
+    return cached_report('income_statement', generate_income_statement,
+                         from_date=start_of_day(from_date or REPORTS_START),
+                         to_date=end_of_day(to_date or timezone.localdate()),
+                         method='accrual')
+
+
+def trial_balance_report(from_date=None, to_date=None):
+    return cached_report('trial_balance', generate_trial_balance,
+                         from_date=start_of_day(from_date or REPORTS_START),
+                         to_date=end_of_day(to_date or timezone.localdate()))
+
+
+def customer_statement_report(customer_id=None, from_date=None, to_date=None, customer=None):
+    """Statement context with its lines read; pass customer when it is already loaded"""
+    customer = customer or Customer.objects.get(pk=customer_id)
+    # The date printed on the PDF is part of its content hash, so a file from an earlier day is not reused
+    statement = customer_statement(customer, from_date, to_date or timezone.localdate())
+    return {**statement, 'lines': list(statement['lines'])}
+
+
+REPORTS = {
+    'demo': ReportSpec('backend/reports/demo_report.html', demo_report, filename='invoice'),
+    'balance_sheet': ReportSpec('backend/reports/balance_sheet.html', balance_sheet_report,
+                                as_of_params, filename='balance-sheet'),
+    'income_statement': ReportSpec('backend/reports/income_statement.html', income_statement_report,
+                                   period_params, filename='income-statement'),
+    'trial_balance': ReportSpec('backend/reports/trial_balance.html', trial_balance_report,
+                                period_params, filename='trial-balance'),
+    'customer_statement': ReportSpec('backend/reports/customer_statement.html', customer_statement_report,
+                                     customer_statement_params, filename='customer-statement'),
+}
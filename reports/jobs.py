@@ -0,0 +1,104 @@
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, models
+from django.db.transaction import on_commit
+from django.utils import timezone
+
+from reports.catalog import REPORTS
+from reports.models import ReportJob
+from reports.pdf_utlis import render_pdf
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class _HashEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        if isinstance(o, models.Model):
+            # The loaded field values and related objects, never str(): that may query, and
+            # Accounting_Account.__str__ reads today's balance into the hash of a closed report
+            fields = {name: value for name, value in vars(o).items() if not name.startswith('_')}
+            return {'model': o._meta.label, 'pk': o.pk, 'fields': fields, 'related': o._state.fields_cache}
+        try:
+            return super().default(o)
+        except TypeError:
+            return repr(o)
+
+
+def content_hash(report, template, context):
+    """SHA-256 of everything that goes into a PDF, used as its file name"""
+    payload = json.dumps({'report': report, 'template': template, 'context': context},
+                         cls=_HashEncoder, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.REPORT_JOB_WORKERS,
+                                           thread_name_prefix='report-job')
+    return _executor
+
+
+def submit(report, params=None):
+    """
+    Queue a PDF report, rendered by a thread pool in this process (no broker needed)
+    With REPORT_JOB_WORKERS = 0 the job runs before submit returns.
+
+    :param report: Name of a report in reports.catalog.REPORTS
+    :param params: Raw parameters for the report's parse function
+    :raises KeyError: For an unknown report
+    :raises ValueError: When the parameters are invalid
+    :return: The ReportJob
+    """
+    spec = REPORTS[report]
+    params = params or {}
+    spec.parse(params)
+    job = ReportJob.objects.create(report=report, params=params)
+    if settings.REPORT_JOB_WORKERS:
+        # The worker's own connection can only see the job once it is committed
+        on_commit(lambda: _get_executor().submit(_run_in_thread, job.pk))
+    else:
+        run(job)
+    return job
+
+
+def _run_in_thread(job_id):
+    try:
+        run(ReportJob.objects.get(pk=job_id))
+    finally:
+        # Each worker thread opens its own connection
+        connection.close()
+
+
+def run(job):
+    """
+    Build the report data, then render it unless a PDF of identical data already exists
+    Failures are stored on the job instead of being raised.
+    """
+    spec = REPORTS[job.report]
+    job.status = ReportJob.RUNNING
+    job.save(update_fields=['status'])
+    try:
+        context = spec.build(**spec.parse(job.params))
+        digest = content_hash(job.report, spec.template, context)
+        name = f'reports/{digest}.pdf'
+        if not default_storage.exists(name):
+            name = default_storage.save(name, ContentFile(render_pdf(spec.template, context)))
+        job.content_hash = digest
+        job.file.name = name
+        job.status = ReportJob.DONE
+    except Exception as e:
+        job.status = ReportJob.FAILED
+        job.error = f"{type(e).__name__}: {e}"
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'content_hash', 'file', 'error', 'finished_at'])
+    return job
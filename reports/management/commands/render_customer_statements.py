@@ -0,0 +1,59 @@
+import os
+import time
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.text import slugify
+
+from core.models import Customer
+from reports.catalog import REPORTS, customer_statement_report
+from reports.pdf_utlis import PDFError, render_pdfs
+
+
+def _day(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"{value!r}: enter a date as YYYY-MM-DD")
+
+
+class Command(BaseCommand):
+    help = ("Write a PDF statement for every customer (or the given ones), e.g. at month end. "
+            "Statements are computed here and converted to PDF by a pool of processes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='from_date', type=_day, help='First day, YYYY-MM-DD')
+        parser.add_argument('--to', dest='to_date', type=_day, help='Last day, YYYY-MM-DD, defaults to today')
+        parser.add_argument('--customers', type=int, nargs='+', help='Customer ids, all customers by default')
+        parser.add_argument('--processes', type=int, help='Conversion processes, defaults to the CPU count')
+        parser.add_argument('--output', help='Directory for the PDFs, defaults to MEDIA_ROOT/reports/statements/<to>')
+
+    def handle(self, *args, **options):
+        to_date = options['to_date'] or timezone.localdate()
+        output = options['output'] or os.path.join(settings.MEDIA_ROOT, 'reports', 'statements',
+                                                   to_date.isoformat())
+        os.makedirs(output, exist_ok=True)
+
+        customers = Customer.objects.order_by('pk')
+        if options['customers']:
+            customers = customers.filter(pk__in=options['customers'])
+        customers = list(customers)
+
+        started = time.perf_counter()
+        contexts = (customer_statement_report(customer=customer, from_date=options['from_date'], to_date=to_date)
+                    for customer in customers)
+        try:
+            pdfs = render_pdfs(REPORTS['customer_statement'].template, contexts, options['processes'])
+            for customer, pdf in zip(customers, pdfs):
+                name = f"{customer.pk}-{slugify(customer.customer_name) or 'customer'}.pdf"
+                with open(os.path.join(output, name), 'wb') as f:
+                    f.write(pdf)
+        except PDFError as e:
+            raise CommandError(str(e))
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(customers)} statements to {output} in {elapsed:.1f}s"
+        ))
@@ -1,3 +1,37 @@
+import uuid
+
 from django.db import models
 
-# Create your models here.
+
+class ReportJob(models.Model):
+    """
+    A PDF report rendered in the background, see reports.jobs
+    Jobs whose report data hashes the same share one file under MEDIA_ROOT/reports/.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    status_choices = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    # Random so a download link cannot be guessed from another one
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    report = models.CharField(max_length=50)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=status_choices, default=QUEUED)
+    content_hash = models.CharField(max_length=64, blank=True)
+    file = models.FileField(upload_to='reports/', blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.report} ({self.status})"
@@ -1,13 +1,85 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from io import BytesIO
+
 from django.http import HttpResponse
 from django.template.loader import get_template
 from xhtml2pdf import pisa
 
-def render_to_pdf(template_src, context_dict={}):
-    template = get_template(template_src)
-    html  = template.render(context_dict)
+from normerp.metrics import PDF_RENDER_SECONDS
+
+
+class PDFError(Exception):
+    pass
+
+
+@lru_cache(maxsize=64)
+def compiled_template(template_src):
+    """
+    Template parsed once per process, whatever the loaders are
+    The cached loader is only enabled with DEBUG off; a batch of statements would otherwise
+    read and compile the same template for every document.
+    """
+    return get_template(template_src)
+
+
+def html_to_pdf(html):
+    """Convert an HTML document to PDF bytes, raises PDFError when xhtml2pdf reports errors"""
     result = BytesIO()
-    pdf = pisa.pisaDocument(BytesIO(html.encode("ISO-8859-1")), result)
-    if not pdf.err:
-        return HttpResponse(result.getvalue(), content_type='application/pdf')
-    return None
\ No newline at end of file
+    pdf = pisa.pisaDocument(BytesIO(html.encode('utf-8')), result, encoding='utf-8')
+    if pdf.err:
+        raise PDFError(f"xhtml2pdf reported {pdf.err} error(s)")
+    return result.getvalue()
+
+
+def timed_html_to_pdf(html):
+    """(PDF bytes, seconds taken); workers time themselves and the parent records the metric"""
+    started = time.perf_counter()
+    pdf = html_to_pdf(html)
+    return pdf, time.perf_counter() - started
+
+
+def render_pdf(template_src, context_dict=None):
+    """Render a template to PDF bytes"""
+    pdf, seconds = timed_html_to_pdf(compiled_template(template_src).render(context_dict or {}))
+    PDF_RENDER_SECONDS.observe(seconds, template=template_src)
+    return pdf
+
+
+def render_pdfs(template_src, contexts, processes=None):
+    """
+    Render many documents of one template, converting them to PDF in a pool of processes
+    The HTML is rendered here, where the database and the template are available, and only
+    strings cross to the workers; the conversion is CPU bound, so threads would not help.
+
+    :param contexts: Iterable of template contexts
+    :param processes: Worker processes, defaults to the CPU count; 1 renders in this process
+    :return: Iterator of PDF bytes in the order of contexts
+    """
+    template = compiled_template(template_src)
+    documents = (template.render(context) for context in contexts)
+    processes = processes or os.cpu_count() or 1
+    if processes == 1:
+        results = map(timed_html_to_pdf, documents)
+        yield from _observed(template_src, results)
+        return
+
+    # Spawned workers do not inherit the parent's database connections or threads
+    with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('spawn')) as pool:
+        yield from _observed(template_src, pool.map(timed_html_to_pdf, documents, chunksize=4))
+
+
+def _observed(template_src, results):
+    for pdf, seconds in results:
+        PDF_RENDER_SECONDS.observe(seconds, template=template_src)
+        yield pdf
+
+
+def render_to_pdf(template_src, context_dict={}):
+    try:
+        return HttpResponse(render_pdf(template_src, context_dict), content_type='application/pdf')
+    except PDFError:
+        return None
@@ -1,3 +1,147 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from accounting.balances import get_account_balances
+from accounting.models import Category, Accounting_Account
+from core.models import Customer, Delivered, Payment
+from reports import jobs
+from reports.models import ReportJob
+
+
+class MediaRootMixin:
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+@override_settings(REPORT_JOB_WORKERS=0)
+class ReportJobTests(MediaRootMixin, TestCase):
+
+    def test_job_renders_and_downloads(self):
+        response = self.client.post('/reports/jobs/', {'report': 'demo'})
+        self.assertEqual(response.status_code, 202)
+        job = response.json()
+        self.assertEqual(job['status'], 'done')
+
+        status = self.client.get(job['status_url']).json()
+        download = self.client.get(status['download_url'])
+        self.assertEqual(download['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(download.streaming_content).startswith(b'%PDF'))
+
+        etag = download['ETag']
+        self.assertEqual(self.client.get(status['download_url'], HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_identical_data_is_rendered_once(self):
+        with mock.patch('reports.jobs.render_pdf', wraps=jobs.render_pdf) as render:
+            first = jobs.submit('demo')
+            second = jobs.submit('demo')
+
+        self.assertEqual(render.call_count, 1)
+        self.assertNotEqual(first.pk, second.pk)
+        self.assertEqual(first.file.name, second.file.name)
+
+    def test_failures_are_reported(self):
+        with mock.patch('reports.jobs.render_pdf', side_effect=RuntimeError('boom')):
+            job = jobs.submit('demo')
+
+        self.assertEqual(job.status, ReportJob.FAILED)
+        response = self.client.get(f'/reports/jobs/{job.pk}/download/')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['error'], 'RuntimeError: boom')
+
+    def test_unknown_report(self):
+        self.assertEqual(self.client.post('/reports/jobs/', {'report': 'nope'}).status_code, 400)
+
+
+@override_settings(REPORT_JOB_WORKERS=0)
+class FinancialReportPdfTests(MediaRootMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        receivable = Category.objects.create(name='Receivable', category_type='A')
+        sales = Category.objects.create(name='Sale', category_type='I')
+        self.account = Accounting_Account.objects.create(name='Receivable', code='AR', category=receivable)
+        self.revenue = Accounting_Account.objects.create(name='Sales', code='REV', category=sales)
+        self.customer = Customer.objects.create(customer_name='Acme Mills', owner_name='Owner')
+        with self.settings(LEDGER_ACCOUNTS={'revenue': self.revenue.pk}):
+            Delivered.objects.create(account=self.account, customer=self.customer, price_per_meter=5, delivered=20)
+            Payment.objects.create(account=self.account, customer=self.customer, amount=40, date=timezone.now())
+
+    def test_reports_render(self):
+        for report, params in [('balance_sheet', {}), ('income_statement', {'from': '2024-01-01'}),
+                               ('trial_balance', {}), ('customer_statement', {'customer': str(self.customer.pk)})]:
+            with self.subTest(report=report):
+                job = jobs.submit(report, params)
+                self.assertEqual(job.status, ReportJob.DONE, job.error)
+                with job.file.open('rb') as f:
+                    self.assertTrue(f.read().startswith(b'%PDF'))
+
+    def test_open_ended_statement_is_rendered_again_the_next_day(self):
+        params = {'customer': str(self.customer.pk)}
+        today = jobs.submit('customer_statement', params)
+        self.assertEqual(jobs.submit('customer_statement', params).file.name, today.file.name)
+
+        with mock.patch('reports.catalog.timezone.localdate', return_value=timezone.localdate() + timedelta(days=1)):
+            tomorrow = jobs.submit('customer_statement', params)
+        self.assertEqual(tomorrow.status, ReportJob.DONE, tomorrow.error)
+        self.assertNotEqual(tomorrow.file.name, today.file.name)
+
+    def test_content_hash_of_accounts_runs_no_queries(self):
+        for n in range(30):
+            Accounting_Account.objects.create(name=f'Cash {n}', code=f'C{n:02}', category=self.account.category)
+        context = {'accounts': get_account_balances()}
+
+        with self.assertNumQueries(0):
+            digest = jobs.content_hash('balance_sheet', 'template.html', context)
+        self.assertEqual(jobs.content_hash('balance_sheet', 'template.html', context), digest)
+        # The rendered values are part of it
+        context['accounts'][0]['account'].name = 'Renamed'
+        self.assertNotEqual(jobs.content_hash('balance_sheet', 'template.html', context), digest)
+
+    def test_pdf_reuses_the_page_data(self):
+        self.client.get('/acc/balance-sheet/')
+        with mock.patch('reports.catalog.generate_balance_sheet') as generate:
+            job = jobs.submit('balance_sheet')
+        self.assertEqual(job.status, ReportJob.DONE, job.error)
+        generate.assert_not_called()
+
+    def test_invalid_params(self):
+        self.assertEqual(self.client.post('/reports/jobs/', {'report': 'customer_statement'}).status_code, 400)
+        response = self.client.post('/reports/jobs/', {'report': 'balance_sheet', 'as_of': '31/01/2024'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_statement_batch(self):
+        Customer.objects.create(customer_name='Second', owner_name='Owner')
+        output = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output)
+
+        call_command('render_customer_statements', '--output', output, '--processes', '1', stdout=open(os.devnull, 'w'))
+
+        files = sorted(os.listdir(output))
+        self.assertEqual(files, [f'{self.customer.pk}-acme-mills.pdf', f'{self.customer.pk + 1}-second.pdf'])
+
+
+@override_settings(REPORT_JOB_WORKERS=1)
+class BackgroundReportJobTests(MediaRootMixin, TransactionTestCase):
+
+    def test_job_runs_in_the_background(self):
+        job = jobs.submit('demo')
+
+        deadline = time.monotonic() + 30
+        while job.status not in (ReportJob.DONE, ReportJob.FAILED) and time.monotonic() < deadline:
+            time.sleep(0.05)
+            job.refresh_from_db()
+        self.assertEqual(job.status, ReportJob.DONE)
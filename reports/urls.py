@@ -1,7 +1,10 @@
 from django.urls import path, include
-from .views import generate_pdf
+from .views import generate_pdf, create_report_job, report_job, download_report_job
 urlpatterns = [
 
     path('demo/', generate_pdf, name='report_gen'),
+    path('jobs/', create_report_job, name='report_jobs'),
+    path('jobs/<uuid:pk>/', report_job, name='report_job'),
+    path('jobs/<uuid:pk>/download/', download_report_job, name='report_job_download'),
 
 ]
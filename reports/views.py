@@ -1,19 +1,17 @@
-from django.http import HttpResponse
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.views.decorators.http import etag, require_GET, require_POST
+
+from .catalog import REPORTS, demo_report
+from .jobs import submit
+from .models import ReportJob
 from .pdf_utlis import render_to_pdf
-from datetime import datetime
 
 
 def generate_pdf(request):
-    # Sample data
-    data = {
-        'today': datetime.now().strftime('%Y-%m-%d'),
-        'title': 'My PDF Report',
-        'items': [
-            {'name': 'Product 1', 'quantity': 1, 'price': 9.99},
-            {'name': 'Product 2', 'quantity': 3, 'price': 4.99},
-            {'name': 'Product 3', 'quantity': 2, 'price': 7.99},
-        ]
-    }
+    data = demo_report()
 
     pdf = render_to_pdf('backend/reports/demo_report.html', data)
 
@@ -23,4 +21,57 @@ def generate_pdf(request):
         content = "inline; filename=%s" % filename
         response['Content-Disposition'] = content
         return response
-    return HttpResponse("Error generating PDF", status=400)
\ No newline at end of file
+    return HttpResponse("Error generating PDF", status=400)
+
+
+def job_json(job):
+    data = {
+        'id': str(job.pk),
+        'report': job.report,
+        'status': job.status,
+        'created_at': job.created_at,
+        'finished_at': job.finished_at,
+        'status_url': reverse('report_job', args=[job.pk]),
+    }
+    if job.status == ReportJob.DONE:
+        data['download_url'] = reverse('report_job_download', args=[job.pk])
+    elif job.status == ReportJob.FAILED:
+        data['error'] = job.error
+    return data
+
+
+@require_POST
+def create_report_job(request):
+    """POST report=<name> plus the report's own parameters; answers 202 with the job's status URL"""
+    params = request.POST.dict()
+    report = params.pop('report', '')
+    if report not in REPORTS:
+        return JsonResponse({'report': f"Unknown report {report!r}"}, status=400)
+    try:
+        job = submit(report, params)
+    except ValueError as e:
+        return JsonResponse({'detail': str(e)}, status=400)
+    return JsonResponse(job_json(job), status=202)
+
+
+@require_GET
+def report_job(request, pk):
+    return JsonResponse(job_json(get_object_or_404(ReportJob, pk=pk)))
+
+
+def job_etag(request, pk):
+    # Files are named by their content hash, so it doubles as the ETag
+    return ReportJob.objects.filter(pk=pk, status=ReportJob.DONE).values_list('content_hash', flat=True).first()
+
+
+@require_GET
+@etag(job_etag)
+def download_report_job(request, pk):
+    job = get_object_or_404(ReportJob, pk=pk)
+    if job.status != ReportJob.DONE:
+        return JsonResponse(job_json(job), status=409)
+    if not default_storage.exists(job.file.name):
+        return JsonResponse({'detail': 'The file is gone, submit the report again.'}, status=410)
+    filename = f"{REPORTS[job.report].filename}.pdf" if job.report in REPORTS else 'report.pdf'
+    return FileResponse(job.file.open('rb'), as_attachment=True, filename=filename,
+                        content_type='application/pdf')
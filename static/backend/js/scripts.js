@@ -24,3 +24,18 @@ window.addEventListener('DOMContentLoaded', event => {
     }
 
 });
+
+// Walk a cursor-paginated API list, handing each page's rows to onPage
+function fetchAllPages(url, onPage, onError) {
+    $.ajax({
+        type: 'GET',
+        url: url,
+        success: function(response) {
+            onPage(response.results);
+            if (response.next) {
+                fetchAllPages(response.next, onPage, onError);
+            }
+        },
+        error: onError
+    });
+}